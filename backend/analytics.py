@@ -0,0 +1,325 @@
+"""
+Revenue, booking and instructor utilization analytics for the admin UI
+
+Figures are computed from columnar projections of bookings, paid payments and
+instructor schedules, one calendar month at a time, into two small frames of
+per-day partial sums:
+
+    sales        (day, spot, course_type) -> revenue, payments, bookings,
+                 booked_value, cancelled, completed, no_shows
+    instructors  (day, instructor_id) -> scheduled_hours, booked_hours,
+                 bookings, completed, no_shows
+
+Revenue is the amount of payments marked paid on the day, attributed to the
+paid booking's spot and course type; booking counts are by booking_date.
+Cancelled bookings count only towards `cancelled`. A query for any date range
+concatenates the months it covers, filters to the range and groups by the
+requested dimensions (spot, course_type, day, week, month) with pandas.
+
+Month partials are cached per worker. Every booking and payment change bumps
+`updated_at` of the daily_stats rollup for its date (see rollups.py), so each
+query first reads those stamps for its range and recomputes only the months
+whose latest stamp changed; that invalidates across workers. Schedule and
+instructor assignment changes do not touch the rollups, so partials are also
+recomputed after ANALYTICS_TTL seconds.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from availability_rules import effective_schedules
+from catalog import course_catalog
+from projections import fields_projection
+
+ANALYTICS_TTL = float(os.environ.get("ANALYTICS_TTL", "300"))
+ANALYTICS_CACHE_MONTHS = int(os.environ.get("ANALYTICS_CACHE_MONTHS", "60"))
+MAX_ANALYTICS_DAYS = 731
+
+DIMENSIONS = ("spot", "course_type", "day", "week", "month")
+SALES_COLUMNS = ["revenue", "payments", "bookings", "booked_value", "cancelled", "completed", "no_shows"]
+INSTRUCTOR_COLUMNS = ["scheduled_hours", "booked_hours", "bookings", "completed", "no_shows"]
+COUNT_COLUMNS = ["payments", "bookings", "cancelled", "completed", "no_shows"]
+UNKNOWN = "unknown"
+
+Partial = Dict[str, pd.DataFrame]
+
+class AnalyticsError(ValueError):
+    """An invalid date range or grouping"""
+
+def months_between(date_from: str, date_to: str) -> List[str]:
+    """YYYY-MM of every month touching the range"""
+    year, month = int(date_from[:4]), int(date_from[5:7])
+    months = []
+    while f"{year:04d}-{month:02d}" <= date_to[:7]:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def _next_month(month: str) -> str:
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year + 1:04d}-01-01" if number == 12 else f"{year:04d}-{number + 1:02d}-01"
+
+def _hours(start: pd.Series, end: pd.Series) -> pd.Series:
+    """Length in hours of HH:MM time ranges"""
+    def minutes(times: pd.Series) -> pd.Series:
+        times = times.astype(str)
+        return pd.to_numeric(times.str[:2], errors="coerce") * 60 + pd.to_numeric(times.str[3:5], errors="coerce")
+    return ((minutes(end) - minutes(start)) / 60).clip(lower=0).fillna(0)
+
+def _column(records: List[Dict[str, Any]], path: str) -> List[Any]:
+    if "." not in path:
+        return [record.get(path) for record in records]
+    parent, field = path.split(".", 1)
+    return [(record.get(parent) or {}).get(field) for record in records]
+
+def _frame(records: List[Dict[str, Any]], columns: Sequence[str]) -> pd.DataFrame:
+    """Columns (dotted paths for nested fields) of projected documents"""
+    return pd.DataFrame({column: _column(records, column) for column in columns})
+
+def _course_types(course_ids: pd.Series) -> pd.Series:
+    types = {
+        course_id: (course_catalog.get(course_id) or {}).get('course_type', UNKNOWN)
+        for course_id in course_ids.dropna().unique()
+    }
+    return course_ids.map(types).fillna(UNKNOWN)
+
+def _status_counts(bookings: pd.DataFrame) -> pd.DataFrame:
+    status = bookings['status']
+    return pd.DataFrame({
+        "bookings": (status != "cancelled").astype(int),
+        "cancelled": (status == "cancelled").astype(int),
+        "completed": (status == "completed").astype(int),
+        "no_shows": (status == "no_show").astype(int),
+    }, index=bookings.index)
+
+def month_partial(
+    bookings: List[Dict[str, Any]],
+    payments: List[Dict[str, Any]],
+    paid_bookings: List[Dict[str, Any]],
+    schedules: List[Dict[str, Any]]
+) -> Partial:
+    """Per-day partial sums for one month's source documents"""
+    b = _frame(bookings, [
+        "course_id", "instructor_id", "booking_date", "spot", "status", "total_price",
+        "time_slot.start_time", "time_slot.end_time"
+    ])
+    b['course_type'] = _course_types(b['course_id'])
+    b = b.join(_status_counts(b))
+    b['booked_value'] = b['total_price'].fillna(0).astype(float) * b['bookings']
+    b['hours'] = _hours(b['time_slot.start_time'], b['time_slot.end_time']) * b['bookings']
+    b = b.rename(columns={"booking_date": "day"})
+
+    p = _frame(payments, ["booking_id", "amount", "paid_at"])
+    paid = _frame(paid_bookings, ["id", "spot", "course_id"]).drop_duplicates("id").set_index("id")
+    p = p.join(paid, on="booking_id")
+    p['spot'] = p['spot'].fillna(UNKNOWN)
+    p['course_type'] = _course_types(p['course_id'])
+    p['day'] = p['paid_at'].astype(str).str[:10]
+    p['revenue'] = p['amount'].fillna(0).astype(float)
+    p['payments'] = 1
+
+    keys = ["day", "spot", "course_type"]
+    sales = pd.concat([
+        b.groupby(keys)[["bookings", "booked_value", "cancelled", "completed", "no_shows"]].sum(),
+        p.groupby(keys)[["revenue", "payments"]].sum()
+    ], axis=1).fillna(0)
+
+    s = _frame(
+        [
+            {"day": schedule['date'], "instructor_id": schedule['instructor_id'],
+             "start_time": slot['start_time'], "end_time": slot['end_time']}
+            for schedule in schedules for slot in schedule.get('available_slots', [])
+        ],
+        ["day", "instructor_id", "start_time", "end_time"]
+    )
+    s['scheduled_hours'] = _hours(s['start_time'], s['end_time'])
+    assigned = b[b['instructor_id'].notna()].rename(columns={"hours": "booked_hours"})
+    instructors = pd.concat([
+        s.groupby(["day", "instructor_id"])[["scheduled_hours"]].sum(),
+        assigned.groupby(["day", "instructor_id"])[["booked_hours", "bookings", "completed", "no_shows"]].sum()
+    ], axis=1).fillna(0)
+
+    return {
+        "sales": sales.reindex(columns=SALES_COLUMNS, fill_value=0),
+        "instructors": instructors.reindex(columns=INSTRUCTOR_COLUMNS, fill_value=0)
+    }
+
+async def load_month(db, month: str) -> Partial:
+    """Read one month's bookings, paid payments and schedules and sum them per day"""
+    first, end = f"{month}-01", _next_month(month)
+    last = (date.fromisoformat(end) - timedelta(days=1)).isoformat()
+
+    bookings, payments, schedules = await asyncio.gather(
+        db.bookings.find(
+            {"booking_date": {"$gte": first, "$lte": last}},
+            fields_projection(
+                "id", "course_id", "instructor_id", "booking_date", "spot", "status", "total_price",
+                "time_slot.start_time", "time_slot.end_time"
+            )
+        ).to_list(None),
+        db.payments.find(
+            {"status": "paid", "paid_at": {"$gte": first, "$lt": end}},
+            fields_projection("booking_id", "amount", "paid_at")
+        ).to_list(None),
+        effective_schedules(db, first, last)
+    )
+
+    # Payments for bookings outside the month need their booking's spot and course
+    known = {booking['id']: booking for booking in bookings}
+    missing = list({payment['booking_id'] for payment in payments} - set(known))
+    paid_bookings = [known[payment['booking_id']] for payment in payments if payment['booking_id'] in known]
+    if missing:
+        paid_bookings += await db.bookings.find(
+            {"id": {"$in": missing}}, fields_projection("id", "spot", "course_id")
+        ).to_list(None)
+
+    # A busy month is a few hundred milliseconds of pandas work; keep it off the event loop
+    return await asyncio.get_running_loop().run_in_executor(
+        None, month_partial, bookings, payments, paid_bookings, schedules
+    )
+
+async def _month_stamps(db, months: List[str]) -> Dict[str, Any]:
+    """Latest daily_stats `updated_at` per month"""
+    stamps: Dict[str, Any] = {}
+    async for doc in db.daily_stats.find(
+        {"date": {"$gte": f"{months[0]}-01", "$lt": _next_month(months[-1])}},
+        fields_projection("date", "updated_at")
+    ):
+        month, stamp = doc['date'][:7], doc.get('updated_at')
+        if stamp is not None and (month not in stamps or stamp > stamps[month]):
+            stamps[month] = stamp
+    return stamps
+
+class AnalyticsCache:
+    """Month partials, reused until the month's data changes or the TTL passes"""
+
+    def __init__(self, ttl: float = ANALYTICS_TTL, size: int = ANALYTICS_CACHE_MONTHS):
+        self.ttl = ttl
+        self.size = size
+        # month -> (loaded at, daily_stats stamp, partial)
+        self._months: "OrderedDict[str, Tuple[float, Any, Partial]]" = OrderedDict()
+
+    async def partials(self, db, months: List[str]) -> List[Partial]:
+        await course_catalog.ensure_fresh(db)
+        stamps = await _month_stamps(db, months)
+        now = time.monotonic()
+
+        stale = []
+        for month in months:
+            entry = self._months.get(month)
+            if entry is None or now - entry[0] >= self.ttl or entry[1] != stamps.get(month):
+                stale.append(month)
+        for month, partial in zip(stale, await asyncio.gather(*(load_month(db, month) for month in stale))):
+            self._months[month] = (now, stamps.get(month), partial)
+
+        result = []
+        for month in months:
+            self._months.move_to_end(month)
+            result.append(self._months[month][2])
+        while len(self._months) > self.size:
+            self._months.popitem(last=False)
+        return result
+
+    def invalidate(self, month: Optional[str] = None) -> None:
+        if month is None:
+            self._months.clear()
+        else:
+            self._months.pop(month, None)
+
+analytics_cache = AnalyticsCache()
+
+def date_range(date_from: Optional[str], date_to: Optional[str]) -> Tuple[str, str]:
+    """Validated range, defaulting to the year up to today"""
+    try:
+        end = date.fromisoformat(date_to) if date_to else datetime.utcnow().date()
+        start = date.fromisoformat(date_from) if date_from else end - timedelta(days=364)
+    except ValueError:
+        raise AnalyticsError("Dates must be in YYYY-MM-DD format")
+    if start > end:
+        raise AnalyticsError("date_from is after date_to")
+    if (end - start).days >= MAX_ANALYTICS_DAYS:
+        raise AnalyticsError(f"Date range is limited to {MAX_ANALYTICS_DAYS} days")
+    return start.isoformat(), end.isoformat()
+
+def parse_dimensions(by: str, allowed: Sequence[str] = DIMENSIONS) -> List[str]:
+    dimensions = [dimension.strip() for dimension in by.split(",") if dimension.strip()]
+    unknown = [dimension for dimension in dimensions if dimension not in allowed]
+    if unknown:
+        raise AnalyticsError(f"Cannot group by {', '.join(unknown)}; expected any of: {', '.join(allowed)}")
+    return dimensions
+
+def _in_range(frames: List[pd.DataFrame], date_from: str, date_to: str) -> pd.DataFrame:
+    frame = pd.concat(frames).reset_index()
+    # Months without data have float (all-NaN) keys
+    frame['day'] = frame['day'].astype(str)
+    frame = frame[(frame['day'] >= date_from) & (frame['day'] <= date_to)].copy()
+    days = pd.to_datetime(frame['day'])
+    frame['week'] = (days - pd.to_timedelta(days.dt.weekday, unit="D")).dt.strftime("%Y-%m-%d")
+    frame['month'] = frame['day'].str[:7]
+    return frame
+
+def _ratio(numerator: pd.Series, denominator: pd.Series) -> pd.Series:
+    """numerator / denominator, missing where the denominator is 0"""
+    return numerator / denominator.where(denominator > 0)
+
+def _records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """JSON-ready rows: counts as ints, figures rounded, missing ratios as None"""
+    frame = frame.round(4).astype({column: int for column in COUNT_COLUMNS if column in frame})
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+def _sales_rates(frame: pd.DataFrame) -> pd.DataFrame:
+    frame['no_show_rate'] = _ratio(frame['no_shows'], frame['completed'] + frame['no_shows'])
+    frame['cancellation_rate'] = _ratio(frame['cancelled'], frame['bookings'] + frame['cancelled'])
+    return frame
+
+def sales_breakdown(partials: List[Partial], date_from: str, date_to: str, by: List[str]) -> Dict[str, Any]:
+    """Revenue and booking figures grouped by `by`, plus range totals"""
+    frame = _in_range([partial['sales'] for partial in partials], date_from, date_to)
+    totals = _sales_rates(frame[SALES_COLUMNS].sum().to_frame().T)
+    rows = frame.groupby(by)[SALES_COLUMNS].sum().reset_index() if by else totals
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "by": by,
+        "totals": _records(totals)[0],
+        "rows": _records(_sales_rates(rows))
+    }
+
+def instructor_breakdown(partials: List[Partial], date_from: str, date_to: str, by: List[str]) -> Dict[str, Any]:
+    """Scheduled and booked hours, utilization and no-show rate per instructor"""
+    frame = _in_range([partial['instructors'] for partial in partials], date_from, date_to)
+    rows = frame.groupby(["instructor_id", *by])[INSTRUCTOR_COLUMNS].sum().reset_index()
+    totals = frame[INSTRUCTOR_COLUMNS].sum().to_frame().T
+    for figures in (rows, totals):
+        figures['utilization'] = _ratio(figures['booked_hours'], figures['scheduled_hours'])
+        figures['no_show_rate'] = _ratio(figures['no_shows'], figures['completed'] + figures['no_shows'])
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "by": by,
+        "totals": _records(totals)[0],
+        "rows": _records(rows)
+    }
+
+async def sales_report(db, date_from: str, date_to: str, by: List[str]) -> Dict[str, Any]:
+    partials = await analytics_cache.partials(db, months_between(date_from, date_to))
+    return sales_breakdown(partials, date_from, date_to, by)
+
+async def instructor_report(db, date_from: str, date_to: str, by: List[str]) -> Dict[str, Any]:
+    partials = await analytics_cache.partials(db, months_between(date_from, date_to))
+    report = instructor_breakdown(partials, date_from, date_to, by)
+    names = {
+        user['id']: f"{user['first_name']} {user['last_name']}"
+        async for user in db.users.find(
+            {"id": {"$in": list({row['instructor_id'] for row in report['rows']})}},
+            fields_projection("id", "first_name", "last_name")
+        )
+    }
+    for row in report['rows']:
+        row['instructor_name'] = names.get(row['instructor_id'])
+    return report
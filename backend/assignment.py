@@ -0,0 +1,405 @@
+"""
+Instructor assignment
+
+Chooses which free instructor takes a booking so that work is spread evenly
+and instructors keep their free time in contiguous blocks, instead of giving
+every booking to whoever sorts first.
+
+Both modes score an (instructor, start time) pair against a `DayOccupancy`,
+the instructor-day structure of scheduled and booked start times:
+
+    cost = ASSIGNMENT_LOAD_WEIGHT * booked / scheduled
+         + ASSIGNMENT_FRAGMENT_WEIGHT * fragmentation
+
+where fragmentation is 1 when the slot would split a free block in two, 0.5
+when it trims the edge of a block and 0 when it fills an isolated gap.
+
+    online   create_booking ranks the candidates from the slot inventory by
+             cost (`rank_candidates`) and reserves the cheapest one still
+             free. The occupancy comes from the slot inventory, which already
+             holds every free instructor slot, plus the day's bookings.
+    batch    `reoptimize_day` reassigns a whole day: start times are taken in
+             order and each one is solved as a minimum-cost bipartite matching
+             of its bookings to the instructors free then, so no instructor is
+             double-booked and the total cost is minimal for that time. Moving
+             a booking costs ASSIGNMENT_MOVE_PENALTY so equal-cost shuffles are
+             avoided. Only today and later days can be reassigned.
+
+Reassign a day from the command line (dry run without --apply):
+
+    python assignment.py --reoptimize YYYY-MM-DD [--apply]
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from availability import ACTIVE_BOOKING_STATUSES
+from availability_rules import effective_schedules
+from models import SpotLocation
+
+ASSIGNMENT_LOAD_WEIGHT = float(os.environ.get("ASSIGNMENT_LOAD_WEIGHT", "1.0"))
+ASSIGNMENT_FRAGMENT_WEIGHT = float(os.environ.get("ASSIGNMENT_FRAGMENT_WEIGHT", "1.0"))
+ASSIGNMENT_MOVE_PENALTY = float(os.environ.get("ASSIGNMENT_MOVE_PENALTY", "0.01"))
+# Cost of an infeasible pairing; finite so the matching stays well defined
+INFEASIBLE = 1e9
+
+class AssignmentError(ValueError):
+    """A day that cannot be reassigned"""
+
+class DayOccupancy:
+    """Scheduled and booked start times per instructor on one day"""
+
+    def __init__(self):
+        # instructor -> start time -> spots scheduled at that time
+        self.slots: Dict[str, Dict[str, Set[str]]] = {}
+        # instructor -> booked start times
+        self.booked: Dict[str, Set[str]] = {}
+        self._order: Dict[str, List[str]] = {}
+
+    def add_slot(self, instructor_id: str, start_time: str, spot: str) -> None:
+        self.slots.setdefault(instructor_id, {}).setdefault(start_time, set()).add(spot)
+        self._order.pop(instructor_id, None)
+
+    def book(self, instructor_id: str, start_time: str) -> None:
+        self.booked.setdefault(instructor_id, set()).add(start_time)
+
+    def clear_bookings(self) -> None:
+        self.booked = {}
+
+    def _starts(self, instructor_id: str) -> List[str]:
+        starts = self._order.get(instructor_id)
+        if starts is None:
+            starts = self._order[instructor_id] = sorted(self.slots.get(instructor_id, {}))
+        return starts
+
+    def is_free(self, instructor_id: str, start_time: str, spot: Optional[str] = None) -> bool:
+        spots = self.slots.get(instructor_id, {}).get(start_time)
+        return bool(spots) and (spot is None or spot in spots) \
+            and start_time not in self.booked.get(instructor_id, ())
+
+    def utilization(self, instructor_id: str) -> float:
+        scheduled = len(self.slots.get(instructor_id, ()))
+        return len(self.booked.get(instructor_id, ())) / scheduled if scheduled else 1.0
+
+    def fragmentation(self, instructor_id: str, start_time: str) -> float:
+        """How much taking the slot would break up the instructor's free time"""
+        starts = self._starts(instructor_id)
+        booked = self.booked.get(instructor_id, ())
+        try:
+            k = starts.index(start_time)
+        except ValueError:
+            return 1.0
+        left = k > 0 and starts[k - 1] not in booked
+        right = k + 1 < len(starts) and starts[k + 1] not in booked
+        return (left + right) / 2
+
+    def cost(self, instructor_id: str, start_time: str) -> float:
+        return (
+            ASSIGNMENT_LOAD_WEIGHT * self.utilization(instructor_id)
+            + ASSIGNMENT_FRAGMENT_WEIGHT * self.fragmentation(instructor_id, start_time)
+        )
+
+    def metrics(self) -> Dict[str, Any]:
+        """Load spread and free-time fragmentation over all instructors"""
+        loads = np.array([len(self.booked.get(i, ())) for i in self.slots], dtype=float)
+        utilization = np.array([self.utilization(i) for i in self.slots], dtype=float)
+        free_blocks = 0
+        for instructor_id in self.slots:
+            booked = self.booked.get(instructor_id, ())
+            previous_free = False
+            for start_time in self._starts(instructor_id):
+                free = start_time not in booked
+                free_blocks += free and not previous_free
+                previous_free = free
+        return {
+            "instructors": len(self.slots),
+            "bookings": int(loads.sum()) if loads.size else 0,
+            "max_load": int(loads.max()) if loads.size else 0,
+            "utilization_max": round(float(utilization.max()), 3) if loads.size else 0.0,
+            "utilization_stddev": round(float(utilization.std()), 3) if loads.size else 0.0,
+            "free_blocks": free_blocks
+        }
+
+async def _load_bookings(db, day: str, instructor_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    query: Dict[str, Any] = {"booking_date": day, "status": {"$in": ACTIVE_BOOKING_STATUSES}}
+    if instructor_ids is not None:
+        query["instructor_id"] = {"$in": instructor_ids}
+    return await db.bookings.find(
+        query, {"_id": 0, "id": 1, "instructor_id": 1, "spot": 1, "time_slot.start_time": 1}
+    ).to_list(None)
+
+async def occupancy_from_inventory(db, day: str, instructor_ids: List[str]) -> DayOccupancy:
+    """Occupancy of the given instructors from the slot inventory and bookings"""
+    occupancy = DayOccupancy()
+    wanted = set(instructor_ids)
+    async for doc in db.slot_inventory.find(
+        {"spot": {"$in": [spot.value for spot in SpotLocation]}, "date": day,
+         "free_instructors.id": {"$in": instructor_ids}},
+        {"_id": 0, "spot": 1, "start_time": 1, "free_instructors.id": 1}
+    ):
+        for instructor in doc['free_instructors']:
+            if instructor['id'] in wanted:
+                occupancy.add_slot(instructor['id'], doc['start_time'], doc['spot'])
+    for booking in await _load_bookings(db, day, instructor_ids):
+        start_time = booking['time_slot']['start_time']
+        occupancy.add_slot(booking['instructor_id'], start_time, booking['spot'])
+        occupancy.book(booking['instructor_id'], start_time)
+    return occupancy
+
+def rank_candidates(occupancy: DayOccupancy, candidate_ids: Iterable[str], start_time: str) -> List[str]:
+    """Candidates ordered by assignment cost, cheapest first (stable on ties)"""
+    return sorted(candidate_ids, key=lambda instructor_id: occupancy.cost(instructor_id, start_time))
+
+def min_cost_assignment(cost: np.ndarray) -> np.ndarray:
+    """Column assigned to each row of a rows <= columns cost matrix
+
+    Hungarian algorithm with shortest augmenting paths, O(rows^2 * columns).
+    """
+    rows, columns = cost.shape
+    u = np.zeros(rows + 1)
+    v = np.zeros(columns + 1)
+    row_of = np.zeros(columns + 1, dtype=np.int64)  # column -> 1-based row, 0 if free
+    way = np.zeros(columns + 1, dtype=np.int64)
+
+    for row in range(1, rows + 1):
+        row_of[0] = row
+        column = 0
+        min_slack = np.full(columns + 1, np.inf)
+        used = np.zeros(columns + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current_row = row_of[column]
+            free = ~used[1:]
+            slack = cost[current_row - 1] - u[current_row] - v[1:]
+            better = free & (slack < min_slack[1:])
+            min_slack[1:][better] = slack[better]
+            way[1:][better] = column
+            candidates = np.where(free, min_slack[1:], np.inf)
+            next_column = int(np.argmin(candidates)) + 1
+            delta = candidates[next_column - 1]
+            u[row_of[used]] += delta
+            v[used] -= delta
+            min_slack[1:][free] -= delta
+            column = next_column
+            if row_of[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            row_of[column] = row_of[previous]
+            column = previous
+
+    assigned = np.full(rows, -1, dtype=np.int64)
+    for column in range(1, columns + 1):
+        if row_of[column]:
+            assigned[row_of[column] - 1] = column - 1
+    return assigned
+
+def reoptimize(occupancy: DayOccupancy, bookings: List[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+    """New instructor per booking id, solving one matching per start time
+
+    `occupancy` must hold the day's schedules; its bookings are replaced by
+    the new assignment. A booking keeps its instructor when no feasible
+    alternative exists (e.g. its instructor's schedule was removed).
+    """
+    occupancy.clear_bookings()
+    instructors = list(occupancy.slots)
+    column_of = {instructor_id: n for n, instructor_id in enumerate(instructors)}
+    by_start: Dict[str, List[Dict[str, Any]]] = {}
+    for booking in bookings:
+        by_start.setdefault(booking['time_slot']['start_time'], []).append(booking)
+
+    assignment: Dict[str, Optional[str]] = {}
+    for start_time in sorted(by_start):
+        group = by_start[start_time]
+        cost = np.full((len(group), len(instructors) + len(group)), INFEASIBLE)
+        for row, booking in enumerate(group):
+            current = booking.get('instructor_id')
+            for instructor_id in instructors:
+                if occupancy.is_free(instructor_id, start_time, booking['spot']) or instructor_id == current:
+                    cost[row, column_of[instructor_id]] = occupancy.cost(instructor_id, start_time) + (
+                        0.0 if instructor_id == current else ASSIGNMENT_MOVE_PENALTY
+                    )
+            # A private fallback column per booking keeps the matrix feasible
+            cost[row, len(instructors) + row] = INFEASIBLE / 2
+
+        for row, column in enumerate(min_cost_assignment(cost)):
+            booking = group[row]
+            if column < len(instructors):
+                instructor_id = instructors[column]
+            else:
+                instructor_id = booking.get('instructor_id')
+            assignment[booking['id']] = instructor_id
+            if instructor_id is not None:
+                occupancy.book(instructor_id, start_time)
+    return assignment
+
+async def _occupancy_from_schedules(db, day: str) -> DayOccupancy:
+    instructor_ids = [
+        instructor['id'] async for instructor in db.users.find(
+            {"role": "instructor", "is_active": True}, {"_id": 0, "id": 1}
+        )
+    ]
+    occupancy = DayOccupancy()
+    for schedule in await effective_schedules(db, day, day, instructor_ids=instructor_ids):
+        for slot in schedule.get('available_slots', []):
+            occupancy.add_slot(schedule['instructor_id'], slot['start_time'], schedule['spot'])
+    return occupancy
+
+async def _park(db, day: str, booking: Dict[str, Any]) -> None:
+    """Move a booking's reservation to a placeholder, creating it if missing"""
+    await db.slot_reservations.update_one(
+        {"booking_id": booking['id']},
+        {
+            "$set": {"instructor_id": f"reassigning:{booking['id']}"},
+            "$setOnInsert": {
+                "date": day,
+                "start_time": booking['time_slot']['start_time'],
+                "spot": booking['spot'],
+                "created_at": datetime.utcnow()
+            }
+        },
+        upsert=True
+    )
+
+async def _take(db, booking_id: str, instructor_id: str) -> bool:
+    """Point a parked reservation at an instructor, unless the slot is taken"""
+    try:
+        await db.slot_reservations.update_one(
+            {"booking_id": booking_id}, {"$set": {"instructor_id": instructor_id}}
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+async def _move_reservations(
+    db, day: str, moves: List[Dict[str, Any]], bookings: Dict[str, Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Point the moved bookings' reservations at their new instructors
+
+    Reservations are first parked on a per-booking placeholder so swaps
+    between instructors never collide on the unique index; a booking without
+    a reservation (never backfilled) gets one. A booking whose new slot was
+    taken concurrently goes back to its original instructor, taking that slot
+    back from the move that claimed it, which then goes back in turn. Returns
+    the moves that were not applied, with `held_by`, the instructor whose slot
+    the booking holds. It is None only when a concurrent booking took the
+    original slot as well: the placeholder is removed, the booking keeps its
+    original instructor without a reservation and needs resolving by hand.
+    """
+    moves_by_id = {move['booking_id']: move for move in moves}
+
+    def slot(booking_id: str, instructor_id: str):
+        return instructor_id, bookings[booking_id]['time_slot']['start_time']
+
+    for move in moves:
+        await _park(db, day, bookings[move['booking_id']])
+
+    held_by: Dict[str, Optional[str]] = {}
+    taken_by_move: Dict[Any, str] = {}  # (instructor_id, start_time) -> booking_id
+    returning = []
+    for move in moves:
+        if await _take(db, move['booking_id'], move['to']):
+            held_by[move['booking_id']] = move['to']
+            taken_by_move[slot(move['booking_id'], move['to'])] = move['booking_id']
+        else:
+            returning.append(move['booking_id'])
+
+    while returning:
+        booking_id = returning.pop()
+        original = slot(booking_id, moves_by_id[booking_id]['from'])
+        holder = taken_by_move.pop(original, None)
+        if holder is not None:
+            # A move in this batch claimed the slot; it goes back as well
+            await _park(db, day, bookings[holder])
+            returning.append(holder)
+        if await _take(db, booking_id, moves_by_id[booking_id]['from']):
+            held_by[booking_id] = moves_by_id[booking_id]['from']
+        else:
+            await db.slot_reservations.delete_one(
+                {"booking_id": booking_id, "instructor_id": f"reassigning:{booking_id}"}
+            )
+            held_by[booking_id] = None
+
+    return [
+        {**move, "held_by": held_by[move['booking_id']]}
+        for move in moves if held_by[move['booking_id']] != move['to']
+    ]
+
+async def reoptimize_day(db, day: str, apply: bool = False) -> Dict[str, Any]:
+    """Reassign every active booking on `day`, optionally applying the result"""
+    from slot_inventory import rebuild
+
+    if day < datetime.utcnow().date().isoformat():
+        raise AssignmentError(f"Cannot reassign instructors on a past day ({day})")
+
+    occupancy = await _occupancy_from_schedules(db, day)
+    bookings = [booking for booking in await _load_bookings(db, day) if booking.get('instructor_id')]
+    for booking in bookings:
+        start_time = booking['time_slot']['start_time']
+        occupancy.add_slot(booking['instructor_id'], start_time, booking['spot'])
+        occupancy.book(booking['instructor_id'], start_time)
+    before = occupancy.metrics()
+
+    assignment = reoptimize(occupancy, bookings)
+    moves = [
+        {"booking_id": booking['id'], "from": booking.get('instructor_id'), "to": assignment[booking['id']]}
+        for booking in bookings
+        if assignment[booking['id']] != booking.get('instructor_id')
+    ]
+
+    conflicts: List[Dict[str, Any]] = []
+    if apply and moves:
+        conflicts = await _move_reservations(db, day, moves, {booking['id']: booking for booking in bookings})
+        failed = {move['booking_id'] for move in conflicts}
+        applied = [move for move in moves if move['booking_id'] not in failed]
+        if applied:
+            await db.bookings.bulk_write([
+                UpdateOne({"id": move['booking_id']}, {"$set": {"instructor_id": move['to']}})
+                for move in applied
+            ], ordered=False)
+        await rebuild(db, day, to_date=day)
+
+    return {
+        "date": day,
+        "applied": apply,
+        "before": before,
+        "after": occupancy.metrics(),
+        "moves": moves,
+        "conflicts": conflicts
+    }
+
+async def main(day: str, apply: bool) -> int:
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from database import connect_to_mongo, get_database, close_mongo_connection
+
+    load_dotenv(Path(__file__).parent / '.env')
+    await connect_to_mongo()
+    try:
+        result = await reoptimize_day(await get_database(), day, apply=apply)
+    except AssignmentError as exc:
+        print(exc)
+        await close_mongo_connection()
+        return 1
+    for label in ("before", "after"):
+        print(f"{label:>6}: " + ", ".join(f"{k}={v}" for k, v in result[label].items()))
+    print(f"{len(result['moves'])} bookings moved" + ("" if apply else " (dry run)"))
+    if result['conflicts']:
+        print(f"{len(result['conflicts'])} moves skipped, slot taken concurrently")
+        unresolved = [move['booking_id'] for move in result['conflicts'] if move['held_by'] is None]
+        if unresolved:
+            print(f"! Bookings whose slot was also taken, left without a reservation: {', '.join(unresolved)}")
+    await close_mongo_connection()
+    return 0
+
+if __name__ == "__main__":
+    if "--reoptimize" not in sys.argv:
+        print(__doc__)
+        sys.exit(1)
+    sys.exit(asyncio.run(main(sys.argv[sys.argv.index("--reoptimize") + 1], "--apply" in sys.argv)))
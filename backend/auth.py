@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
@@ -11,7 +13,18 @@ SECRET_KEY = os.environ.get("SECRET_KEY", "kiteschool-pro-secret-key-change-in-p
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24  # 30 days
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get("PASSWORD_HASH_QUEUE_LIMIT", "64"))
+
+# Hashes below BCRYPT_ROUNDS are flagged for re-hashing on the next login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
 security = HTTPBearer()
 
 def verify_password(plain_password, hashed_password):
@@ -20,6 +33,44 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs bcrypt in a dedicated, size-limited thread pool
+
+    bcrypt releases the GIL, so hashing in worker threads keeps the event loop
+    free. Once `queue_limit` operations are in flight new ones are rejected
+    with 503 instead of piling up behind the pool.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._queue_limit = queue_limit
+        self._in_flight = 0
+
+    async def _run(self, fn, *args):
+        if self._in_flight >= self._queue_limit:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-in requests, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self._in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password, returning a replacement hash if its cost is outdated"""
+        return await self._run(pwd_context.verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
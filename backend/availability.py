@@ -0,0 +1,79 @@
+"""
+Batched availability engine
+
+Computes free instructor slots for a date and spot with a fixed number of
+queries regardless of how many instructors or slots exist: one for the active
+instructors, one `$in` query for their schedules (recurring rules plus per-day
+overrides, see availability_rules.py) and one for conflicting bookings. The
+results are joined in memory.
+"""
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+from availability_rules import effective_schedules
+
+# Booking statuses that occupy an instructor's slot
+ACTIVE_BOOKING_STATUSES = ["pending", "confirmed"]
+
+async def find_available_slots(
+    db,
+    booking_date: str,
+    spot: str,
+    start_time: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Return free slots for every active instructor on a date at a spot
+
+    Slots are ordered by instructor (in `users` order) and then by the order
+    in the instructor's schedule. Pass `start_time` to only consider slots
+    starting at that time.
+    """
+    instructors = await db.users.find(
+        {"role": "instructor", "is_active": True},
+        {"_id": 0, "id": 1, "first_name": 1, "last_name": 1}
+    ).to_list(None)
+    if not instructors:
+        return []
+
+    instructor_ids = [instructor['id'] for instructor in instructors]
+
+    schedules = await effective_schedules(
+        db, booking_date, booking_date, instructor_ids=instructor_ids, spot=spot
+    )
+    if not schedules:
+        return []
+
+    slots_by_instructor: Dict[str, List[Dict[str, Any]]] = {}
+    for schedule in schedules:
+        slots_by_instructor.setdefault(schedule['instructor_id'], []).extend(
+            schedule.get('available_slots', [])
+        )
+
+    booking_query = {
+        "instructor_id": {"$in": list(slots_by_instructor)},
+        "booking_date": booking_date,
+        "status": {"$in": ACTIVE_BOOKING_STATUSES}
+    }
+    if start_time is not None:
+        booking_query["time_slot.start_time"] = start_time
+    booked = await db.bookings.find(
+        booking_query,
+        {"_id": 0, "instructor_id": 1, "time_slot.start_time": 1}
+    ).to_list(None)
+    taken: Set[Tuple[str, str]] = {
+        (booking['instructor_id'], booking['time_slot']['start_time']) for booking in booked
+    }
+
+    available_slots = []
+    for instructor in instructors:
+        for slot in slots_by_instructor.get(instructor['id'], []):
+            if start_time is not None and slot['start_time'] != start_time:
+                continue
+            if (instructor['id'], slot['start_time']) in taken:
+                continue
+            available_slots.append({
+                "instructor_id": instructor['id'],
+                "instructor_name": f"{instructor['first_name']} {instructor['last_name']}",
+                "time_slot": slot,
+                "available": True
+            })
+
+    return available_slots
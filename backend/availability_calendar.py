@@ -0,0 +1,132 @@
+"""
+Month-view availability calendar
+
+Summarises free instructor slots for every day in a date range at a spot
+with three queries in total: the active instructors, their schedules over the
+range (recurring rules plus per-day overrides) and the active bookings over
+the range. Slots are then counted per day
+with numpy instead of one availability check per day.
+
+Results are cached per (spot, from, to) for CALENDAR_CACHE_TTL seconds; the
+calendar is only a guide for picking a day, and check-availability /
+booking creation still read live availability.
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from availability import ACTIVE_BOOKING_STATUSES
+from availability_rules import effective_schedules
+
+CALENDAR_CACHE_SIZE = int(os.environ.get("CALENDAR_CACHE_SIZE", "256"))
+CALENDAR_CACHE_TTL = float(os.environ.get("CALENDAR_CACHE_TTL", "30"))
+MAX_CALENDAR_DAYS = 62
+
+CalendarKey = Tuple[str, str, str]  # (spot, from, to)
+
+class CalendarCache:
+    """Size-limited LRU cache of calendar summaries expiring after `ttl` seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[CalendarKey, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+
+    def get(self, key: CalendarKey) -> Optional[List[Dict[str, Any]]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, days = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return days
+
+    def put(self, key: CalendarKey, days: List[Dict[str, Any]]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, days)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+calendar_cache = CalendarCache(CALENDAR_CACHE_SIZE, CALENDAR_CACHE_TTL)
+
+async def compute_calendar(db, spot: str, date_from: date, date_to: date) -> List[Dict[str, Any]]:
+    """Free slot counts for each day from `date_from` to `date_to` inclusive
+
+    Each day reports `free_slots` (free instructor/slot pairs) and
+    `start_times` (distinct start times with at least one free instructor).
+    """
+    days = [
+        (date_from + timedelta(days=offset)).isoformat()
+        for offset in range((date_to - date_from).days + 1)
+    ]
+    free_slots = np.zeros(len(days), dtype=np.int64)
+    start_times = np.zeros(len(days), dtype=np.int64)
+
+    instructor_ids = [
+        instructor['id'] async for instructor in db.users.find(
+            {"role": "instructor", "is_active": True}, {"_id": 0, "id": 1}
+        )
+    ]
+    date_range = {"$gte": days[0], "$lte": days[-1]}
+
+    # One row per scheduled (instructor, date, start_time)
+    slot_keys: List[str] = []
+    slot_days: List[int] = []
+    slot_starts: List[str] = []
+    if instructor_ids:
+        day_index = {day: i for i, day in enumerate(days)}
+        for schedule in await effective_schedules(
+            db, days[0], days[-1], instructor_ids=instructor_ids, spot=spot
+        ):
+            for slot in schedule.get('available_slots', []):
+                slot_keys.append(f"{schedule['instructor_id']}|{schedule['date']}|{slot['start_time']}")
+                slot_days.append(day_index[schedule['date']])
+                slot_starts.append(slot['start_time'])
+
+    if slot_keys:
+        # Bookings at any spot occupy the instructor, as in find_available_slots
+        taken = [
+            f"{booking['instructor_id']}|{booking['booking_date']}|{booking['time_slot']['start_time']}"
+            async for booking in db.bookings.find(
+                {
+                    "instructor_id": {"$in": instructor_ids},
+                    "booking_date": date_range,
+                    "status": {"$in": ACTIVE_BOOKING_STATUSES}
+                },
+                {"_id": 0, "instructor_id": 1, "booking_date": 1, "time_slot.start_time": 1}
+            )
+        ]
+        keys = np.array(slot_keys, dtype=object)
+        free = ~np.isin(keys, np.array(taken, dtype=object)) if taken else np.ones(len(keys), dtype=bool)
+
+        free_days = np.array(slot_days, dtype=np.int64)[free]
+        free_slots = np.bincount(free_days, minlength=len(days))
+        if free_days.size:
+            distinct = np.unique(np.stack([
+                free_days,
+                np.unique(np.array(slot_starts, dtype=object)[free], return_inverse=True)[1].ravel()
+            ]), axis=1)
+            start_times = np.bincount(distinct[0], minlength=len(days))
+
+    return [
+        {"date": day, "free_slots": int(free_slots[i]), "start_times": int(start_times[i])}
+        for i, day in enumerate(days)
+    ]
+
+async def availability_calendar(db, spot: str, date_from: date, date_to: date) -> List[Dict[str, Any]]:
+    """Cached per-day summary for a spot and date range"""
+    key = (spot, date_from.isoformat(), date_to.isoformat())
+    days = calendar_cache.get(key)
+    if days is None:
+        days = await compute_calendar(db, spot, date_from, date_to)
+        calendar_cache.put(key, days)
+    return days
@@ -0,0 +1,204 @@
+"""
+Recurring instructor availability
+
+An availability rule describes when an instructor works at a spot without a
+document per day:
+
+    {"id": ..., "instructor_id": ..., "spot": "sylt",
+     "start_date": "2025-05-01", "end_date": "2025-09-30",  # end_date optional
+     "weekdays": [0, 1, 2, 3, 4], "exceptions": ["2025-06-12"],
+     "available_slots": [{"start_time": "09:00", "end_time": "11:00"}]}
+
+Rules are expanded lazily, one day at a time, into the same shape as
+instructor_schedules documents. Several rules matching the same instructor,
+spot and day are merged (slots unioned by start time). Per-day documents in
+instructor_schedules still work and override the rules for their
+(instructor, date, spot), so a single day can be changed, or switched off with
+`is_available: False`, without touching the rule.
+
+The active rules are few and held in memory (reloaded after
+AVAILABILITY_RULES_TTL seconds, or straight away by the worker that changes
+them), and expansions are cached per day for the most recently asked
+AVAILABILITY_RULES_CACHE_SIZE days. `effective_schedules` is the one read
+path for availability, booking checks, the calendar, the slot inventory and
+the admin schedule listing.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from models import AvailabilityRule, InstructorSchedule
+from projections import model_projection
+
+AVAILABILITY_RULES_TTL = float(os.environ.get("AVAILABILITY_RULES_TTL", "30"))
+AVAILABILITY_RULES_CACHE_SIZE = int(os.environ.get("AVAILABILITY_RULES_CACHE_SIZE", "1024"))
+# Open-ended queries expand rules at most this many days past their start
+RULE_HORIZON_DAYS = 366
+
+ScheduleKey = Tuple[str, str, str]  # (instructor_id, date, spot)
+
+class AvailabilityRuleError(ValueError):
+    """A rule that cannot be stored"""
+
+def _parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise AvailabilityRuleError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+
+def validate_rule(rule: Dict[str, Any]) -> None:
+    """Raise AvailabilityRuleError if the rule's dates or weekdays are invalid"""
+    start = _parse_date(rule['start_date'])
+    if rule.get('end_date') is not None and _parse_date(rule['end_date']) < start:
+        raise AvailabilityRuleError("Rule end_date is before start_date")
+    if any(weekday not in range(7) for weekday in rule['weekdays']):
+        raise AvailabilityRuleError("Rule weekdays must be 0 (Monday) to 6 (Sunday)")
+    for exception in rule.get('exceptions', []):
+        _parse_date(exception)
+
+def applies_on(rule: Dict[str, Any], day: str, weekday: int) -> bool:
+    """Whether the rule puts its instructor at its spot on `day`"""
+    return (
+        rule['start_date'] <= day
+        and (rule.get('end_date') is None or day <= rule['end_date'])
+        and weekday in rule['weekdays']
+        and day not in rule.get('exceptions', ())
+    )
+
+def day_range(date_from: str, date_to: str) -> List[str]:
+    start, end = date.fromisoformat(date_from), date.fromisoformat(date_to)
+    return [(start + timedelta(days=n)).isoformat() for n in range((end - start).days + 1)]
+
+class RuleSet:
+    """Active availability rules with per-day expansions cached"""
+
+    def __init__(self, ttl: float = AVAILABILITY_RULES_TTL, cache_size: int = AVAILABILITY_RULES_CACHE_SIZE):
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._rules: List[Dict[str, Any]] = []
+        # date -> expanded schedules for that day
+        self._days: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+
+    async def ensure_fresh(self, db) -> None:
+        """Load the active rules if not loaded or older than the TTL"""
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if not self._is_fresh():
+                rules = await db.availability_rules.find(
+                    {"is_active": True}, model_projection(AvailabilityRule)
+                ).to_list(None)
+                self._rules = rules
+                self._days.clear()
+                self._loaded_at = time.monotonic()
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def schedules_on(self, day: str) -> List[Dict[str, Any]]:
+        """Every rule's schedule for `day`, one per (instructor, spot)"""
+        schedules = self._days.get(day)
+        if schedules is not None:
+            self._days.move_to_end(day)
+            return schedules
+
+        weekday = date.fromisoformat(day).weekday()
+        merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for rule in self._rules:
+            if not applies_on(rule, day, weekday):
+                continue
+            key = (rule['instructor_id'], rule['spot'])
+            schedule = merged.get(key)
+            if schedule is None:
+                merged[key] = {
+                    "id": f"{rule['id']}:{day}",
+                    "instructor_id": rule['instructor_id'],
+                    "date": day,
+                    "spot": rule['spot'],
+                    "available_slots": list(rule['available_slots']),
+                    "is_available": True,
+                    "rule_id": rule['id'],
+                    "created_at": rule['created_at']
+                }
+            else:
+                starts = {slot['start_time'] for slot in schedule['available_slots']}
+                schedule['available_slots'] += [
+                    slot for slot in rule['available_slots'] if slot['start_time'] not in starts
+                ]
+        schedules = list(merged.values())
+        for schedule in schedules:
+            schedule['available_slots'].sort(key=lambda slot: slot['start_time'])
+
+        self._days[day] = schedules
+        if len(self._days) > self.cache_size:
+            self._days.popitem(last=False)
+        return schedules
+
+availability_rules = RuleSet()
+
+async def effective_schedules(
+    db,
+    date_from: str,
+    date_to: Optional[str] = None,
+    instructor_ids: Optional[Iterable[str]] = None,
+    spot: Optional[str] = None,
+    include_unavailable: bool = False
+) -> List[Dict[str, Any]]:
+    """Schedules from `date_from` to `date_to` (inclusive), rules plus overrides
+
+    Without `date_to`, per-day documents are read without an upper bound and
+    rules are expanded RULE_HORIZON_DAYS ahead. Schedules switched off with
+    `is_available: False` are left out unless `include_unavailable` is set.
+    Results are ordered by date, then spot and instructor; expanded schedules
+    are shared with the cache, so do not modify them.
+    """
+    await availability_rules.ensure_fresh(db)
+    if instructor_ids is not None:
+        instructor_ids = set(instructor_ids)
+        if not instructor_ids:
+            return []
+
+    date_query: Dict[str, Any] = {"$gte": date_from}
+    if date_to is not None:
+        date_query["$lte"] = date_to
+    query: Dict[str, Any] = {"date": date_query}
+    if instructor_ids is not None:
+        query["instructor_id"] = {"$in": list(instructor_ids)}
+    if spot is not None:
+        query["spot"] = spot
+
+    schedules: Dict[ScheduleKey, Dict[str, Any]] = {}
+    last_day = date_to or (date.fromisoformat(date_from) + timedelta(days=RULE_HORIZON_DAYS)).isoformat()
+    for day in day_range(date_from, last_day):
+        for schedule in availability_rules.schedules_on(day):
+            if spot is not None and schedule['spot'] != spot:
+                continue
+            if instructor_ids is not None and schedule['instructor_id'] not in instructor_ids:
+                continue
+            schedules[(schedule['instructor_id'], day, schedule['spot'])] = schedule
+
+    # Per-day documents override the rules
+    async for override in db.instructor_schedules.find(query, model_projection(InstructorSchedule)):
+        schedules[(override['instructor_id'], override['date'], override['spot'])] = override
+
+    return sorted(
+        (
+            schedule for schedule in schedules.values()
+            if include_unavailable or schedule.get('is_available', True)
+        ),
+        key=lambda schedule: (schedule['date'], schedule['spot'], schedule['instructor_id'])
+    )
+
+def rule_window(rule: Dict[str, Any], today: str) -> Optional[Tuple[str, str]]:
+    """First and last dates from `today` on that the rule can affect, or None"""
+    first = max(rule['start_date'], today)
+    last = rule.get('end_date') or (date.fromisoformat(first) + timedelta(days=RULE_HORIZON_DAYS)).isoformat()
+    return (first, last) if first <= last else None
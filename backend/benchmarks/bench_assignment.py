@@ -0,0 +1,108 @@
+"""
+Benchmark: instructor assignment strategies for one busy day
+
+Simulates a day with 50 instructors on mixed shifts across both spots and 400
+booking requests arriving in random order (popular start times requested
+more often), then compares:
+
+    first-fit   the first free instructor in users order (the old behaviour)
+    online      assignment.rank_candidates against a DayOccupancy kept up to
+                date as bookings arrive, as create_booking does
+    +batch      assignment.reoptimize run over the resulting day, as the
+                admin re-optimize operation does
+
+Reported per strategy: accepted bookings, the busiest instructor's load, the
+standard deviation of utilization (booked / scheduled slots), free blocks
+(contiguous runs of free slots over all instructors; fewer means less
+fragmented free time), bookings moved and the time taken. Each booking holds
+one start time, so acceptance is the same for every strategy; the difference
+is in how the work is spread. No database is needed:
+
+    python -m benchmarks.bench_assignment
+"""
+import random
+import time
+from typing import Dict, List, Tuple
+
+from assignment import DayOccupancy, rank_candidates, reoptimize
+
+INSTRUCTORS = 50
+BOOKINGS = 400
+SPOTS = ["sylt", "romo"]
+START_TIMES = [f"{hour:02d}:00" for hour in range(8, 18)]
+# Relative demand per start time: late morning and early afternoon are busiest
+DEMAND = [1, 2, 4, 5, 4, 3, 4, 4, 3, 1]
+SEED = 7
+
+def make_day(rng: random.Random) -> Tuple[Dict[str, List[Tuple[str, str]]], List[Dict[str, str]]]:
+    """Schedules (instructor -> [(start_time, spot)]) and booking requests"""
+    schedules = {}
+    for n in range(INSTRUCTORS):
+        spot = SPOTS[n % len(SPOTS)]
+        shift = n % 5
+        if shift < 3:
+            starts = START_TIMES  # full day
+        elif shift == 3:
+            starts = START_TIMES[:8]  # early shift
+        else:
+            starts = START_TIMES[2:]  # late shift
+        schedules[f"instructor-{n:02d}"] = [(start_time, spot) for start_time in starts]
+
+    requests = [
+        {"id": f"booking-{n:03d}", "spot": rng.choice(SPOTS),
+         "start_time": rng.choices(START_TIMES, weights=DEMAND)[0]}
+        for n in range(BOOKINGS)
+    ]
+    return schedules, requests
+
+def empty_occupancy(schedules) -> DayOccupancy:
+    occupancy = DayOccupancy()
+    for instructor_id, slots in schedules.items():
+        for start_time, spot in slots:
+            occupancy.add_slot(instructor_id, start_time, spot)
+    return occupancy
+
+def assign_online(schedules, requests, ranked: bool):
+    """Assign requests one by one; returns occupancy, accepted bookings, seconds"""
+    occupancy = empty_occupancy(schedules)
+    instructors = list(schedules)
+    accepted = []
+    started = time.perf_counter()
+    for request in requests:
+        candidates = [
+            instructor_id for instructor_id in instructors
+            if occupancy.is_free(instructor_id, request['start_time'], request['spot'])
+        ]
+        if not candidates:
+            continue
+        if ranked:
+            candidates = rank_candidates(occupancy, candidates, request['start_time'])
+        occupancy.book(candidates[0], request['start_time'])
+        accepted.append({
+            "id": request['id'], "instructor_id": candidates[0], "spot": request['spot'],
+            "time_slot": {"start_time": request['start_time']}
+        })
+    return occupancy, accepted, time.perf_counter() - started
+
+def row(name: str, metrics: Dict, accepted: int, seconds: float, moves: int = 0) -> str:
+    return (f"{name:<18} | {accepted:>8} | {metrics['max_load']:>8} | {metrics['utilization_stddev']:>7.3f} | "
+            f"{metrics['free_blocks']:>11} | {moves:>5} | {seconds * 1000:>8.2f}")
+
+def main():
+    schedules, requests = make_day(random.Random(SEED))
+    print(f"{INSTRUCTORS} instructors, {sum(len(s) for s in schedules.values())} slots, {BOOKINGS} requests\n")
+    print(f"{'strategy':<18} | {'accepted':>8} | {'max load':>8} | {'util sd':>7} | "
+          f"{'free blocks':>11} | {'moves':>5} | {'ms':>8}")
+
+    for name, ranked in (("first-fit", False), ("online", True)):
+        occupancy, accepted, seconds = assign_online(schedules, requests, ranked)
+        print(row(name, occupancy.metrics(), len(accepted), seconds))
+
+        started = time.perf_counter()
+        assignment = reoptimize(occupancy, accepted)
+        seconds = time.perf_counter() - started
+        moves = sum(assignment[booking['id']] != booking['instructor_id'] for booking in accepted)
+        print(row(f"{name} +batch", occupancy.metrics(), len(accepted), seconds, moves))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark: /bookings/check-availability implementations
+
+Seeds a throwaway database with a growing number of instructors (8 slots
+each, a quarter of them booked) and times the old 1+N+N×M query loop against
+availability.find_available_slots and the slot_inventory read. Run from the
+backend directory against a local mongod:
+
+    python -m benchmarks.bench_availability
+"""
+import asyncio
+import os
+import time
+import uuid
+from pathlib import Path
+from statistics import mean
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from availability import find_available_slots
+from indexes import ensure_indexes
+from slot_inventory import read_available_slots, rebuild as rebuild_slot_inventory
+
+load_dotenv(Path(__file__).parent.parent / '.env')
+
+INSTRUCTOR_COUNTS = [5, 10, 20, 40, 80]
+SLOTS_PER_DAY = 8
+ITERATIONS = 20
+BENCH_DATE = "2025-07-01"
+BENCH_SPOT = "sylt"
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to the server"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+async def legacy_available_slots(db, booking_date, spot):
+    """The original per-instructor, per-slot query loop"""
+    instructors = await db.users.find({"role": "instructor", "is_active": True}).to_list(1000)
+    available_slots = []
+    for instructor in instructors:
+        schedule = await db.instructor_schedules.find_one({
+            "instructor_id": instructor['id'],
+            "date": booking_date,
+            "spot": spot,
+            "is_available": True
+        })
+        if schedule:
+            for slot in schedule.get('available_slots', []):
+                existing_booking = await db.bookings.find_one({
+                    "instructor_id": instructor['id'],
+                    "booking_date": booking_date,
+                    "time_slot.start_time": slot['start_time'],
+                    "status": {"$in": ["pending", "confirmed"]}
+                })
+                if not existing_booking:
+                    available_slots.append({
+                        "instructor_id": instructor['id'],
+                        "time_slot": slot,
+                    })
+    return available_slots
+
+async def seed(db, instructor_count):
+    """Reset the benchmark database with `instructor_count` scheduled instructors"""
+    for name in ["users", "instructor_schedules", "bookings", "slot_inventory"]:
+        await db[name].delete_many({})
+
+    slots = [
+        {"start_time": f"{8 + i:02d}:00", "end_time": f"{9 + i:02d}:00"}
+        for i in range(SLOTS_PER_DAY)
+    ]
+    users, schedules, bookings = [], [], []
+    for n in range(instructor_count):
+        instructor_id = str(uuid.uuid4())
+        users.append({
+            "id": instructor_id,
+            "email": f"instructor{n}@bench.local",
+            "first_name": "Bench",
+            "last_name": f"Instructor{n}",
+            "role": "instructor",
+            "is_active": True
+        })
+        schedules.append({
+            "id": str(uuid.uuid4()),
+            "instructor_id": instructor_id,
+            "date": BENCH_DATE,
+            "spot": BENCH_SPOT,
+            "available_slots": slots,
+            "is_available": True
+        })
+        for slot in slots[::4]:
+            bookings.append({
+                "id": str(uuid.uuid4()),
+                "instructor_id": instructor_id,
+                "booking_date": BENCH_DATE,
+                "time_slot": slot,
+                "status": "confirmed"
+            })
+
+    await db.users.insert_many(users)
+    await db.instructor_schedules.insert_many(schedules)
+    await db.bookings.insert_many(bookings)
+    await rebuild_slot_inventory(db, BENCH_DATE)
+
+async def measure(fn, db, counter):
+    """Mean latency (ms) and commands per call over ITERATIONS runs"""
+    timings = []
+    counter.count = 0
+    for _ in range(ITERATIONS):
+        started = time.perf_counter()
+        await fn(db, BENCH_DATE, BENCH_SPOT)
+        timings.append((time.perf_counter() - started) * 1000)
+    return mean(timings), counter.count / ITERATIONS
+
+async def main():
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL'), event_listeners=[counter])
+    db_name = os.environ.get('BENCH_DB_NAME', 'kiteschool_pro_bench')
+    db = client[db_name]
+    await ensure_indexes(db)
+
+    implementations = [
+        ("legacy", legacy_available_slots),
+        ("batched", find_available_slots),
+        ("inventory", read_available_slots),
+    ]
+    print(f"{'instructors':>11} | " + " | ".join(f"{name + ' ms':>12} | {name + ' cmds':>14}" for name, _ in implementations))
+    for instructor_count in INSTRUCTOR_COUNTS:
+        await seed(db, instructor_count)
+        row = []
+        for _, fn in implementations:
+            ms, cmds = await measure(fn, db, counter)
+            row.append(f"{ms:>12.2f} | {cmds:>14.0f}")
+        print(f"{instructor_count:>11} | " + " | ".join(row))
+
+    await client.drop_database(db_name)
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
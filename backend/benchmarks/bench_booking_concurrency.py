@@ -0,0 +1,131 @@
+"""
+Concurrency check: hundreds of simultaneous bookings for one slot
+
+Seeds a few instructors who are all free at the same slot, then fires
+BOOKINGS concurrent POST /api/bookings/ requests for it through the app
+in-process. Exactly one booking per instructor must succeed and no instructor
+may end up double-booked; throughput is reported alongside. Run from the
+backend directory against a local mongod:
+
+    python -m benchmarks.bench_booking_concurrency
+"""
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent.parent / '.env')
+os.environ['DB_NAME'] = os.environ.get('BENCH_DB_NAME', 'kiteschool_pro_bench')
+
+from auth import create_access_token
+from catalog import course_catalog
+from database import connect_to_mongo, close_mongo_connection, get_database
+from indexes import ensure_indexes
+from models import Course, CourseType, SpotLocation, User, UserRole, InstructorSchedule, TimeSlot
+from server import app
+from slot_inventory import rebuild as rebuild_slot_inventory
+
+BOOKINGS = 300
+INSTRUCTORS = 5
+CUSTOMERS = 50
+BENCH_DATE = "2025-07-01"
+SLOT = TimeSlot(start_time="10:00", end_time="12:00")
+
+async def seed(db):
+    for name in ["users", "courses", "instructor_schedules", "bookings", "slot_reservations", "slot_inventory"]:
+        await db[name].delete_many({})
+    await ensure_indexes(db)
+
+    course = Course(
+        name="Bench Lesson",
+        course_type=CourseType.PRIVATE_KITESURF,
+        description="Concurrency benchmark course",
+        duration_hours=2.0,
+        max_students=1,
+        base_price=100.0,
+        spots=[SpotLocation.SYLT]
+    )
+    await db.courses.insert_one(course.model_dump())
+    course_catalog.invalidate()
+
+    for n in range(INSTRUCTORS):
+        instructor = User(
+            email=f"instructor{n}@bench.kiteschoolpro.com",
+            first_name="Bench",
+            last_name=f"Instructor{n}",
+            role=UserRole.INSTRUCTOR
+        )
+        await db.users.insert_one(instructor.model_dump())
+        schedule = InstructorSchedule(
+            instructor_id=instructor.id,
+            date=BENCH_DATE,
+            available_slots=[SLOT],
+            spot=SpotLocation.SYLT
+        )
+        await db.instructor_schedules.insert_one(schedule.model_dump())
+    await rebuild_slot_inventory(db, BENCH_DATE)
+
+    tokens = []
+    for n in range(CUSTOMERS):
+        customer = User(
+            email=f"customer{n}@bench.kiteschoolpro.com",
+            first_name="Bench",
+            last_name=f"Customer{n}",
+            role=UserRole.CUSTOMER
+        )
+        await db.users.insert_one(customer.model_dump())
+        tokens.append(create_access_token({"sub": customer.id, "role": customer.role}))
+    return course, tokens
+
+async def main():
+    await connect_to_mongo()
+    db = await get_database()
+    course, tokens = await seed(db)
+
+    payload = {
+        "course_id": course.id,
+        "booking_date": BENCH_DATE,
+        "time_slot": SLOT.model_dump(),
+        "spot": SpotLocation.SYLT.value,
+        "number_of_students": 1
+    }
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def book(n):
+            headers = {"Authorization": f"Bearer {tokens[n % len(tokens)]}"}
+            response = await client.post("/api/bookings/", json=payload, headers=headers)
+            return response.status_code
+
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(book(n) for n in range(BOOKINGS)))
+        elapsed = time.perf_counter() - started
+
+    succeeded = statuses.count(200)
+    rejected = statuses.count(400)
+    double_booked = await db.bookings.aggregate([
+        {"$match": {"status": {"$in": ["pending", "confirmed"]}}},
+        {"$group": {
+            "_id": {"instructor": "$instructor_id", "date": "$booking_date", "start": "$time_slot.start_time"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ]).to_list(None)
+
+    print(f"requests:      {BOOKINGS}")
+    print(f"succeeded:     {succeeded} (expected {INSTRUCTORS})")
+    print(f"rejected:      {rejected}")
+    print(f"other status:  {BOOKINGS - succeeded - rejected}")
+    print(f"double-booked: {len(double_booked)}")
+    print(f"throughput:    {BOOKINGS / elapsed:.0f} req/s ({elapsed * 1000:.0f} ms total)")
+
+    await close_mongo_connection()
+    ok = succeeded == INSTRUCTORS and not double_booked
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,287 @@
+"""
+Benchmark suite: latency, throughput and Mongo commands of the hot endpoints
+
+Seeds a data set of the chosen size, drives the FastAPI app in-process and
+measures, per endpoint:
+
+    check_availability    POST /api/bookings/check-availability
+    create_booking        POST /api/bookings/
+    get_my_bookings       GET  /api/bookings/my-bookings (first page, as a customer)
+    get_dashboard_stats   GET  /api/admin/dashboard
+
+p50 and p99 latency, throughput with BENCH_CONCURRENCY requests in flight,
+Mongo commands per request (from mongo_monitoring.command_stats) and the
+number of non-2xx responses. Data set sizes:
+
+    small     10 instructors,    500 customers,    10,000 bookings
+    medium    50 instructors,  5,000 customers,   100,000 bookings
+    large    200 instructors, 50,000 customers, 1,000,000 bookings
+
+Past bookings (a season ending yesterday, generated by
+synthetic_data.Generator with its status and payment mix) load the read
+endpoints; new bookings are made over the coming BOOKING_DAYS days, where
+every instructor works four slots a day at their home spot from an
+availability rule. Each size is seeded once into its own database
+(`<BENCH_DB_NAME>_<size>`) and reused by later runs; --reseed rebuilds it.
+
+Results are compared with the stored baseline (benchmarks/baseline.json, or
+--baseline PATH) for the same database backend and size. The run exits 1 if
+an endpoint's p50 or p99 is more than BENCH_REGRESSION_PCT percent (and over
+1 ms) slower, or it issues more Mongo commands per request or returns more
+errors, than in the baseline; --save-baseline stores this run as the new
+baseline. Run from the backend directory against a local mongod:
+
+    python -m benchmarks.bench_endpoints [--size small,medium,large] [--reseed]
+                                         [--save-baseline] [--baseline PATH]
+
+or with --memory against an in-memory mongomock-motor database (small sizes
+only; it emits no command events and lacks the aggregation operators the
+dashboard uses, so commands are not counted and the dashboard errors there).
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from statistics import median, quantiles
+from typing import Any, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent.parent / '.env')
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+from auth import create_access_token
+from availability_rules import availability_rules
+from catalog import course_catalog
+from database import connect_to_mongo, close_mongo_connection, database
+from indexes import ensure_indexes
+from models import AvailabilityRule, SpotLocation, TimeSlot
+from mongo_monitoring import command_stats
+from principal import principal_cache
+from rollups import rebuild_daily_stats
+from server import app
+from slot_inventory import rebuild as rebuild_slot_inventory
+from synthetic_data import Generator, generate
+
+SIZES = {
+    "small": {"instructors": 10, "customers": 500, "bookings": 10_000},
+    "medium": {"instructors": 50, "customers": 5_000, "bookings": 100_000},
+    "large": {"instructors": 200, "customers": 50_000, "bookings": 1_000_000},
+}
+REQUESTS = int(os.environ.get("BENCH_REQUESTS", "200"))
+CONCURRENCY = int(os.environ.get("BENCH_CONCURRENCY", "8"))
+REGRESSION_PCT = float(os.environ.get("BENCH_REGRESSION_PCT", "25"))
+# Latency changes smaller than this are noise whatever the percentage
+REGRESSION_MIN_MS = 1.0
+DB_NAME = os.environ.get("BENCH_DB_NAME", "kiteschool_pro_bench")
+BASELINE = Path(__file__).parent / "baseline.json"
+
+SEED = 42
+WARMUP = 10
+HISTORY_DAYS = 180
+BOOKING_DAYS = 30
+SLOTS = [TimeSlot(start_time=f"{hour:02d}:00", end_time=f"{hour + 2:02d}:00") for hour in (9, 11, 13, 15)]
+
+def _iso(day: datetime) -> str:
+    return day.date().isoformat()
+
+def _generator(size: str, today: datetime) -> Generator:
+    """Past season of the size's data set, ending yesterday"""
+    counts = SIZES[size]
+    generator = Generator(SEED, counts['customers'], counts['instructors'], counts['bookings'],
+                          start=today.date(), days=HISTORY_DAYS, today=today.date())
+    # The generator lengthens the season to fit the bookings; keep it in the past
+    return Generator(SEED, counts['customers'], counts['instructors'], counts['bookings'],
+                     start=(today - timedelta(days=generator.days)).date(), days=generator.days,
+                     today=today.date())
+
+async def seed(db, size: str, memory: bool) -> None:
+    for name in await db.list_collection_names():
+        await db.drop_collection(name)
+    await ensure_indexes(db)
+
+    today = datetime.utcnow()
+    generator = _generator(size, today)
+    await generate(db, generator)
+    await db.availability_rules.insert_many([
+        AvailabilityRule(
+            instructor_id=instructor_id, spot=spot, start_date=_iso(today), available_slots=SLOTS
+        ).model_dump()
+        for instructor_id, spot in generator.instructor_spots().items()
+    ])
+    if not memory:
+        # mongomock cannot run the rollup aggregation; the dashboard falls back
+        await rebuild_daily_stats(db)
+    await db.bench_meta.insert_one({"size": size, "counts": SIZES[size], "seeded_at": today})
+
+async def ensure_seeded(db, size: str, reseed: bool, memory: bool) -> None:
+    meta = await db.bench_meta.find_one({"size": size}, {"_id": 0})
+    if reseed or meta is None or meta['counts'] != SIZES[size]:
+        started = time.perf_counter()
+        await seed(db, size, memory)
+        print(f"seeded {size} in {time.perf_counter() - started:.1f} s")
+    today = datetime.utcnow()
+    # Booking days start tomorrow; drop bookings made by earlier runs there
+    first, last = _iso(today + timedelta(days=1)), _iso(today + timedelta(days=BOOKING_DAYS))
+    await db.bookings.delete_many({"booking_date": {"$gte": first}})
+    await db.slot_reservations.delete_many({"date": {"$gte": first}})
+    await rebuild_slot_inventory(db, first, to_date=last)
+
+def _command_count() -> int:
+    return sum(stats['count'] for stats in command_stats.snapshot().values())
+
+async def measure(client, request_factory, memory: bool) -> Dict[str, Any]:
+    """Run REQUESTS requests, CONCURRENCY at a time, after a short warm-up"""
+    for n in range(WARMUP):
+        await client.request(**request_factory(-1 - n))
+
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(n):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(**request_factory(n))
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += response.status_code >= 300
+
+    commands = _command_count()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(REQUESTS)))
+    elapsed = time.perf_counter() - started
+    commands = _command_count() - commands
+
+    percentiles = quantiles(latencies, n=100)
+    return {
+        "p50_ms": round(median(latencies), 2),
+        "p99_ms": round(percentiles[98], 2),
+        "throughput": round(REQUESTS / elapsed, 1),
+        "commands_per_request": None if memory else round(commands / REQUESTS, 2),
+        "errors": errors,
+    }
+
+async def run_size(db, size: str, memory: bool) -> Dict[str, Dict[str, Any]]:
+    course_catalog.invalidate()
+    principal_cache.clear()
+    availability_rules.invalidate()
+
+    rng = random.Random(SEED)
+    course_ids = [doc['id'] async for doc in db.courses.find({}, {"_id": 0, "id": 1})]
+    customers = await db.users.find({"role": "customer"}, {"_id": 0, "id": 1}).limit(2000).to_list(None)
+    admin = await db.users.find_one({"role": "admin"}, {"_id": 0, "id": 1})
+    customer_tokens = [create_access_token({"sub": doc['id'], "role": "customer"}) for doc in customers]
+    admin_headers = {"Authorization": f"Bearer {create_access_token({'sub': admin['id'], 'role': 'admin'})}"}
+    today = datetime.utcnow()
+    days = [_iso(today + timedelta(days=n)) for n in range(1, BOOKING_DAYS + 1)]
+    spots = [spot.value for spot in SpotLocation]
+
+    def customer_headers():
+        return {"Authorization": f"Bearer {rng.choice(customer_tokens)}"}
+
+    def check_availability(n):
+        return {"method": "POST", "url": "/api/bookings/check-availability", "json": {
+            "course_id": rng.choice(course_ids), "booking_date": rng.choice(days),
+            "spot": rng.choice(spots), "number_of_students": 1
+        }}
+
+    # Walk the booking days slot by slot so requests find free instructors
+    booking_slots = [(day, spot, slot) for day in days for slot in SLOTS for spot in spots]
+
+    def create_booking(n):
+        day, spot, slot = booking_slots[n % len(booking_slots)]
+        return {"method": "POST", "url": "/api/bookings/", "headers": customer_headers(), "json": {
+            "course_id": rng.choice(course_ids), "booking_date": day, "time_slot": slot.model_dump(),
+            "spot": spot, "number_of_students": 1
+        }}
+
+    def get_my_bookings(n):
+        return {"method": "GET", "url": "/api/bookings/my-bookings", "headers": customer_headers()}
+
+    def get_dashboard_stats(n):
+        return {"method": "GET", "url": "/api/admin/dashboard", "headers": admin_headers}
+
+    results = {}
+    # Server errors count as errors instead of aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for factory in (check_availability, create_booking, get_my_bookings, get_dashboard_stats):
+            results[factory.__name__] = await measure(client, factory, memory)
+    return results
+
+def compare(result: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> List[str]:
+    """Regressions of one endpoint against its baseline"""
+    if not baseline:
+        return []
+    regressions = []
+    for metric in ("p50_ms", "p99_ms"):
+        slower = result[metric] - baseline[metric]
+        if slower > REGRESSION_MIN_MS and slower > baseline[metric] * REGRESSION_PCT / 100:
+            regressions.append(f"{metric} {baseline[metric]} -> {result[metric]}")
+    commands, baseline_commands = result['commands_per_request'], baseline.get('commands_per_request')
+    if commands is not None and baseline_commands is not None and commands > baseline_commands:
+        regressions.append(f"commands/request {baseline_commands} -> {commands}")
+    if result['errors'] > baseline.get('errors', 0):
+        regressions.append(f"errors {baseline.get('errors', 0)} -> {result['errors']}")
+    return regressions
+
+def report(size: str, results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any]) -> int:
+    counts = SIZES[size]
+    print(f"\n{size}: {counts['instructors']} instructors, {counts['customers']} customers, "
+          f"{counts['bookings']} bookings, {REQUESTS} requests at concurrency {CONCURRENCY}")
+    print(f"{'endpoint':<20} | {'p50 ms':>8} | {'p99 ms':>8} | {'req/s':>7} | {'cmds/req':>8} | "
+          f"{'errors':>6} | vs baseline")
+    regressions = 0
+    for endpoint, result in results.items():
+        if endpoint not in baseline:
+            verdict = "no baseline"
+        else:
+            problems = compare(result, baseline[endpoint])
+            regressions += bool(problems)
+            verdict = "REGRESSED: " + "; ".join(problems) if problems else "ok"
+        commands = "-" if result['commands_per_request'] is None else f"{result['commands_per_request']:.2f}"
+        print(f"{endpoint:<20} | {result['p50_ms']:>8.2f} | {result['p99_ms']:>8.2f} | "
+              f"{result['throughput']:>7.1f} | {commands:>8} | {result['errors']:>6} | {verdict}")
+    return regressions
+
+async def main(sizes: List[str], memory: bool, reseed: bool, save: bool, baseline_path: Path) -> int:
+    backend = "memory" if memory else "mongod"
+    baselines = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    if memory:
+        from mongomock_motor import AsyncMongoMockClient
+        database.client = AsyncMongoMockClient()
+    else:
+        await connect_to_mongo()
+
+    regressions = 0
+    for size in sizes:
+        db = database.db = database.client[f"{DB_NAME}_{size}"]
+        await ensure_seeded(db, size, reseed, memory)
+        results = await run_size(db, size, memory)
+        key = f"{backend}:{size}"
+        regressions += report(size, results, baselines.get(key, {}))
+        if save:
+            baselines[key] = results
+
+    if save:
+        baseline_path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"\n✓ Saved baseline to {baseline_path}")
+    if not memory:
+        await close_mongo_connection()
+    return 1 if regressions and not save else 0
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sizes = args[args.index("--size") + 1].split(",") if "--size" in args else ["small"]
+    if any(size not in SIZES for size in sizes):
+        print(__doc__)
+        sys.exit(1)
+    baseline_path = Path(args[args.index("--baseline") + 1]) if "--baseline" in args else BASELINE
+    sys.exit(asyncio.run(main(sizes, "--memory" in args, "--reseed" in args, "--save-baseline" in args, baseline_path)))
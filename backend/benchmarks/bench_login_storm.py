@@ -0,0 +1,95 @@
+"""
+Benchmark: /api/health latency during a login storm
+
+Drives the FastAPI app in-process and fires bursts of concurrent logins while
+polling /api/health, once with bcrypt running inline on the event loop (the
+old behaviour) and once through the bounded password hashing pool. Reports
+p50/p99 health check latency for both. Run from the backend directory against
+a local mongod:
+
+    python -m benchmarks.bench_login_storm
+"""
+import asyncio
+import os
+import time
+from pathlib import Path
+from statistics import quantiles, median
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent.parent / '.env')
+os.environ['DB_NAME'] = os.environ.get('BENCH_DB_NAME', 'kiteschool_pro_bench')
+
+import auth
+from auth import pwd_context, get_password_hash
+from database import connect_to_mongo, close_mongo_connection, get_database
+from models import User, UserRole
+from routes import auth_routes
+from server import app
+
+LOGINS = 200
+HEALTH_CHECKS = 200
+HEALTH_INTERVAL = 0.005
+PASSWORD = "storm-password"
+
+class InlineHasher:
+    """Hashes on the event loop thread, like the handlers used to"""
+
+    async def hash(self, password):
+        return pwd_context.hash(password)
+
+    async def verify_and_update(self, password, hashed_password):
+        return pwd_context.verify_and_update(password, hashed_password)
+
+async def seed_user(db):
+    await db.users.delete_many({"email": "storm@bench.kiteschoolpro.com"})
+    user = User(email="storm@bench.kiteschoolpro.com", first_name="Login", last_name="Storm", role=UserRole.CUSTOMER)
+    user_doc = user.model_dump()
+    user_doc['hashed_password'] = get_password_hash(PASSWORD)
+    await db.users.insert_one(user_doc)
+
+async def run_storm(client):
+    """Return health check latencies (ms) measured while LOGINS logins run"""
+    latencies = []
+
+    async def login():
+        await client.post("/api/auth/login", json={"email": "storm@bench.kiteschoolpro.com", "password": PASSWORD})
+
+    async def health():
+        # Latency is measured from each probe's scheduled send time, so time
+        # spent waiting for a blocked event loop is counted too
+        started = time.perf_counter()
+        for n in range(HEALTH_CHECKS):
+            scheduled = started + n * HEALTH_INTERVAL
+            await asyncio.sleep(max(0, scheduled - time.perf_counter()))
+            await client.get("/api/health")
+            latencies.append((time.perf_counter() - scheduled) * 1000)
+
+    await asyncio.gather(health(), *(login() for _ in range(LOGINS)))
+    return latencies
+
+def summarize(label, latencies):
+    p99 = quantiles(latencies, n=100)[98]
+    print(f"{label:>8} | p50 {median(latencies):8.2f} ms | p99 {p99:8.2f} ms")
+
+async def main():
+    await connect_to_mongo()
+    db = await get_database()
+    await seed_user(db)
+
+    # Allow the whole storm through so both runs do the same amount of work
+    pooled = auth.PasswordHasher(auth.PASSWORD_HASH_WORKERS, LOGINS + 1)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for label, hasher in [("inline", InlineHasher()), ("pooled", pooled)]:
+            auth_routes.password_hasher = hasher
+            summarize(label, await run_storm(client))
+
+    pooled.shutdown()
+    await db.users.delete_many({"email": "storm@bench.kiteschoolpro.com"})
+    await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
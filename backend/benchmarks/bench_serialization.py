@@ -0,0 +1,133 @@
+"""
+Micro-benchmark: BookingDetails response serialization
+
+Times the two ways a list of booking details can be turned into a response
+body, starting from the raw documents the loader holds:
+
+    pydantic  build BookingDetails models, validate them against the
+              response_model and encode with the stdlib json module, as
+              FastAPI does for a returned list of models
+    orjson    shape the documents with responses.shape and encode them with
+              responses.DocumentResponse in one pass
+
+Both bodies are decoded and compared, so a difference in output fails the
+run. No database is needed:
+
+    python -m benchmarks.bench_serialization
+"""
+import asyncio
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from statistics import median
+from typing import List
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from models import Booking, BookingDetails, Course, User, Payment
+from responses import DocumentResponse, shape
+
+SIZES = [1, 100, 1000]
+ITERATIONS = 50
+
+def make_documents(count):
+    """Booking, course, user and payment documents as Mongo returns them"""
+    now = datetime(2025, 7, 1, 9, 30, 15, 123000)
+    course = {
+        "_id": ObjectId(), "id": str(uuid.uuid4()), "name": "Private Kitesurf Lesson",
+        "course_type": "private_kitesurf", "description": "One-to-one lesson",
+        "duration_hours": 2.0, "max_students": 1, "base_price": 189.0,
+        "spots": ["sylt", "romo"], "skill_level_required": "beginner",
+        "equipment_included": ["kite", "board", "wetsuit"], "created_at": now, "is_active": True
+    }
+    customer = {
+        "id": str(uuid.uuid4()), "email": "customer@bench.kiteschoolpro.com", "first_name": "Bench",
+        "last_name": "Customer", "phone": None, "role": "customer",
+        "language_preference": "de", "created_at": now, "is_active": True
+    }
+    instructor = {**customer, "id": str(uuid.uuid4()), "email": "instructor@bench.kiteschoolpro.com",
+                  "last_name": "Instructor", "role": "instructor"}
+
+    rows = []
+    for n in range(count):
+        booking = {
+            "_id": ObjectId(), "id": str(uuid.uuid4()), "customer_id": customer['id'],
+            "course_id": course['id'], "instructor_id": instructor['id'],
+            "booking_date": (now + timedelta(days=n % 60)).date().isoformat(),
+            "time_slot": {"start_time": "10:00", "end_time": "12:00"}, "spot": "sylt",
+            "number_of_students": 1, "student_names": ["Bench Customer"],
+            "student_details": {"weight": 80, "experience": "none"},
+            "total_price": 189.0, "deposit_amount": 56.7, "status": "confirmed",
+            "payment_status": "partial", "amount_paid": 56.7, "paid_payment_ids": [],
+            "notes": None, "created_at": now, "updated_at": now
+        }
+        payments = [{
+            "_id": ObjectId(), "id": str(uuid.uuid4()), "booking_id": booking['id'],
+            "stripe_payment_intent_id": f"pi_{uuid.uuid4().hex[:24]}", "amount": 56.7,
+            "currency": "EUR", "payment_type": "deposit", "status": "paid",
+            "created_at": now, "paid_at": now.isoformat()
+        }]
+        rows.append((booking, course, customer, instructor, payments))
+    return rows
+
+async def pydantic_body(rows, field) -> bytes:
+    details = [
+        BookingDetails(
+            booking=Booking(**booking),
+            course=Course(**course),
+            customer=User(**customer),
+            instructor=User(**instructor),
+            payments=[Payment(**payment) for payment in payments]
+        )
+        for booking, course, customer, instructor, payments in rows
+    ]
+    content = await serialize_response(field=field, response_content=details)
+    return JSONResponse(content).body
+
+def orjson_body(rows) -> bytes:
+    return DocumentResponse([
+        {
+            "booking": shape(Booking, booking),
+            "course": shape(Course, course),
+            "customer": shape(User, customer),
+            "instructor": shape(User, instructor),
+            "payments": [shape(Payment, payment) for payment in payments]
+        }
+        for booking, course, customer, instructor, payments in rows
+    ]).body
+
+async def measure(fn, iterations: int) -> float:
+    """Median milliseconds per call"""
+    timings: List[float] = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = fn()
+        if asyncio.iscoroutine(result):
+            await result
+        timings.append((time.perf_counter() - started) * 1000)
+    return median(timings)
+
+async def main() -> int:
+    field = create_response_field(name="response", type_=List[BookingDetails])
+    print(f"{'items':>6} | {'pydantic ms':>11} | {'orjson ms':>9} | {'speedup':>7} | {'bytes':>9}")
+    for size in SIZES:
+        rows = make_documents(size)
+        legacy, fast = await pydantic_body(rows, field), orjson_body(rows)
+        if json.loads(legacy) != json.loads(fast):
+            print(f"Output differs at {size} items")
+            return 1
+
+        iterations = max(5, ITERATIONS // max(1, size // 100))
+        pydantic_ms = await measure(lambda: pydantic_body(rows, field), iterations)
+        orjson_ms = await measure(lambda: orjson_body(rows), iterations)
+        print(f"{size:>6} | {pydantic_ms:>11.3f} | {orjson_ms:>9.3f} | "
+              f"{pydantic_ms / orjson_ms:>6.1f}x | {len(fast):>9}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
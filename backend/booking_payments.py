@@ -0,0 +1,114 @@
+"""
+Running payment totals on bookings
+
+A booking carries `amount_paid`, the sum of its paid payments, and
+`paid_payment_ids`, the payments already counted in that sum. Applying a
+payment is a single pipeline update on the booking, guarded on the payment id
+not being in `paid_payment_ids`: it adds the amount, records the id and
+derives `payment_status` and `status` from the new total in the same atomic
+write. Confirming the same payment twice, or deposit and balance
+concurrently, therefore counts each payment exactly once without rereading
+the booking's payments.
+
+Only active (pending or confirmed) bookings have their `status` derived: a
+late or replayed payment never brings back a cancelled, completed or no-show
+booking, whose slot may have been sold again since.
+
+Totals for bookings paid before these fields existed can be filled in with:
+
+    python booking_payments.py --backfill
+"""
+import asyncio
+import sys
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from availability import ACTIVE_BOOKING_STATUSES
+
+def _derive_statuses() -> Dict[str, Any]:
+    return {"$set": {
+        "payment_status": {"$switch": {
+            "branches": [
+                {"case": {"$gte": ["$amount_paid", "$total_price"]}, "then": "paid"},
+                {"case": {"$gte": ["$amount_paid", "$deposit_amount"]}, "then": "partial"}
+            ],
+            "default": "pending"
+        }},
+        "status": {"$cond": [
+            {"$in": ["$status", ACTIVE_BOOKING_STATUSES]},
+            {"$cond": [{"$gte": ["$amount_paid", "$deposit_amount"]}, "confirmed", "pending"]},
+            "$status"
+        ]}
+    }}
+
+def status_after_payment(booking_before: Dict[str, Any], amount: float) -> str:
+    """Booking status set by apply_payment, from the booking before the update"""
+    if booking_before['status'] not in ACTIVE_BOOKING_STATUSES:
+        return booking_before['status']
+    amount_paid = booking_before.get('amount_paid', 0) + amount
+    return "confirmed" if amount_paid >= booking_before['deposit_amount'] else "pending"
+
+async def apply_payment(db, booking_id: str, payment_id: str, amount: float) -> Optional[Dict[str, Any]]:
+    """Add a paid payment to its booking's total, returning the booking before it
+
+    The returned document is the booking as it was *before* this payment was
+    added (callers derive the new statuses with `status_after_payment`), or
+    None if the payment was already counted or the booking does not exist.
+    """
+    return await db.bookings.find_one_and_update(
+        {"id": booking_id, "paid_payment_ids": {"$ne": payment_id}},
+        [
+            {"$set": {
+                "amount_paid": {"$add": [{"$ifNull": ["$amount_paid", 0]}, amount]},
+                "paid_payment_ids": {"$concatArrays": [{"$ifNull": ["$paid_payment_ids", []]}, [payment_id]]},
+                "updated_at": datetime.utcnow()
+            }},
+            _derive_statuses()
+        ],
+        projection={"_id": 0, "id": 1, "booking_date": 1, "status": 1, "amount_paid": 1, "deposit_amount": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+
+async def backfill_amount_paid(db) -> int:
+    """Set amount_paid and paid_payment_ids from paid payments"""
+    totals: Dict[str, Dict[str, Any]] = {}
+    async for payment in db.payments.find(
+        {"status": "paid"}, {"_id": 0, "id": 1, "booking_id": 1, "amount": 1}
+    ):
+        total = totals.setdefault(payment['booking_id'], {"amount_paid": 0, "paid_payment_ids": []})
+        total['amount_paid'] += payment['amount']
+        total['paid_payment_ids'].append(payment['id'])
+
+    operations = [
+        UpdateOne({"id": booking_id}, {"$set": total})
+        for booking_id, total in totals.items()
+    ]
+    updated = 0
+    for i in range(0, len(operations), 1000):
+        result = await db.bookings.bulk_write(operations[i:i + 1000], ordered=False)
+        updated += result.modified_count
+    # Bookings without any paid payment start from zero
+    result = await db.bookings.update_many(
+        {"amount_paid": {"$exists": False}},
+        {"$set": {"amount_paid": 0, "paid_payment_ids": []}}
+    )
+    return updated + result.modified_count
+
+async def main():
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from database import connect_to_mongo, get_database, close_mongo_connection
+
+    load_dotenv(Path(__file__).parent / '.env')
+    await connect_to_mongo()
+    updated = await backfill_amount_paid(await get_database())
+    print(f"✓ Backfilled payment totals on {updated} bookings")
+    await close_mongo_connection()
+
+if __name__ == "__main__":
+    if "--backfill" not in sys.argv:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+"""
+In-memory course catalog
+
+The catalog has a handful of rows and rarely changes, so it is held in memory
+with the active list and per-type / per-spot indexes prebuilt and their JSON
+bodies serialized once per version. `create_course` adds to it directly;
+other worker processes pick up changes when their copy expires after
+CATALOG_TTL seconds.
+
+ETags are derived from the serialized body, so every worker returns the same
+tag for the same content and clients can revalidate with If-None-Match.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, Request, Response, status
+
+from models import Course
+from responses import dumps
+from projections import model_projection
+
+CATALOG_TTL = float(os.environ.get("CATALOG_TTL", "60"))
+CATALOG_MAX_AGE = int(os.environ.get("CATALOG_MAX_AGE", "60"))
+CACHE_CONTROL = f"public, max-age={CATALOG_MAX_AGE}"
+
+ACTIVE_VIEW = "active"
+
+def type_view(course_type: str) -> str:
+    return f"type:{course_type}"
+
+def spot_view(spot: str) -> str:
+    return f"spot:{spot}"
+
+class CourseCatalog:
+    """Serialized courses plus active, per-type and per-spot views"""
+
+    def __init__(self, ttl: float = CATALOG_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        # (pagination cursor, JSON-ready course) in insertion order
+        self._entries: List[Tuple[str, Dict[str, Any]]] = []
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._views: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        self._bodies: Dict[str, Tuple[bytes, str]] = {}
+
+    async def ensure_fresh(self, db) -> None:
+        """Load the catalog if it is empty or older than the TTL"""
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if not self._is_fresh():
+                docs = await db.courses.find(
+                    {}, model_projection(Course, with_id=True)
+                ).sort("_id", 1).to_list(None)
+                self._rebuild([(str(doc['_id']), doc) for doc in docs])
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def add(self, course: Course, object_id: ObjectId) -> None:
+        """Add a newly inserted course and bump the version"""
+        if self._loaded_at is None:
+            # Not loaded yet; the next read loads everything including this one
+            return
+        loaded_at = self._loaded_at
+        self._rebuild(self._entries + [(str(object_id), course.model_dump(mode="json"))])
+        self._loaded_at = loaded_at
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def _rebuild(self, docs: List[Tuple[str, Dict[str, Any]]]) -> None:
+        entries = [(cursor, Course(**doc).model_dump(mode="json")) for cursor, doc in docs]
+
+        views: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {ACTIVE_VIEW: []}
+        for entry in entries:
+            course = entry[1]
+            if not course['is_active']:
+                continue
+            views[ACTIVE_VIEW].append(entry)
+            views.setdefault(type_view(course['course_type']), []).append(entry)
+            for spot in course['spots']:
+                views.setdefault(spot_view(spot), []).append(entry)
+
+        if entries != self._entries:
+            self.version += 1
+            self._bodies = {}
+        self._entries = entries
+        self._by_id = {course['id']: course for _, course in entries}
+        self._views = views
+        self._loaded_at = time.monotonic()
+
+    def get(self, course_id: str) -> Optional[Dict[str, Any]]:
+        """Course by id (active or not) as a JSON-ready dict"""
+        return self._by_id.get(course_id)
+
+    def courses(self, view: str) -> List[Dict[str, Any]]:
+        return [course for _, course in self._views.get(view, [])]
+
+    def render(
+        self, view: str, after: Optional[str] = None, limit: Optional[int] = None
+    ) -> Tuple[bytes, str, Optional[str]]:
+        """JSON body, ETag and next-page cursor for a page of a view"""
+        entries = self._views.get(view, [])
+        if after is not None:
+            if not ObjectId.is_valid(after):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid pagination cursor"
+                )
+            # Lowercase ObjectId hex strings sort in creation order
+            after = str(ObjectId(after))
+            entries = [entry for entry in entries if entry[0] > after]
+
+        next_cursor = None
+        if limit is not None and len(entries) > limit:
+            entries = entries[:limit]
+            next_cursor = entries[-1][0]
+
+        if after is None and next_cursor is None:
+            # Whole view: serialize once per catalog version
+            if view not in self._bodies:
+                self._bodies[view] = _serialize([course for _, course in entries])
+            body, etag = self._bodies[view]
+        else:
+            body, etag = _serialize([course for _, course in entries])
+        return body, etag, next_cursor
+
+def _serialize(data: Any) -> Tuple[bytes, str]:
+    body = dumps(data)
+    return body, f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+def render_object(data: Dict[str, Any]) -> Tuple[bytes, str]:
+    """JSON body and ETag for a single catalog entry"""
+    return _serialize(data)
+
+def cached_response(request: Request, body: bytes, etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """200 with the body, or 304 if the client already holds this ETag"""
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+course_catalog = CourseCatalog()
@@ -0,0 +1,543 @@
+"""
+Bulk import and export of bookings, users and schedules
+
+Datasets are exported as CSV or Parquet with one column per model field.
+Nested models are flattened into dotted columns (`time_slot.start_time`), and
+list and dict fields such as `student_names` or `available_slots` are written
+as JSON text, so both formats have the same columns and a file exported from
+one deployment imports into another unchanged.
+
+Export streams from a Motor cursor in EXPORT_CHUNK_SIZE documents at a time:
+each chunk becomes a block of CSV lines or one Parquet row group, so memory
+use does not grow with the collection. Users are exported without password
+hashes; schedules are the per-day instructor_schedules documents (recurring
+availability rules are not included).
+
+Import reads IMPORT_CHUNK_SIZE rows at a time, decodes the JSON columns and
+validates the whole chunk against the model in one pydantic call. Invalid rows
+are reported with their 1-based row number and skipped; valid rows are written
+with one unordered `insert_many` (mode "insert", existing ids are reported as
+errors) or `bulk_write` of upserts on `id` (mode "upsert"; fields not in the
+model, such as a user's password hash, are kept). A users file may carry a
+`hashed_password` column so new accounts can log in.
+
+Active bookings go through the same double-booking guard as the booking
+route: their slots are reserved in `slot_reservations` before the chunk is
+written, and a row whose instructor slot is held by another booking is
+reported as an error. Upserted bookings that leave an active status or move
+to another slot release their old reservation. Afterwards the derived data
+the imported rows feed (slot inventory, dashboard rollups) is refreshed for
+their dates only.
+
+From the command line:
+
+    python data_transfer.py --export bookings bookings.parquet
+    python data_transfer.py --import users users.csv [--upsert]
+"""
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple, Type, Union, get_args, get_origin
+
+import pandas as pd
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from availability import ACTIVE_BOOKING_STATUSES
+from models import Booking, InstructorSchedule, User, UserRole
+from pagination import chunked
+from projections import model_projection
+from responses import shape
+
+EXPORT_CHUNK_SIZE = int(os.environ.get("DATA_EXPORT_CHUNK_SIZE", "5000"))
+IMPORT_CHUNK_SIZE = int(os.environ.get("DATA_IMPORT_CHUNK_SIZE", "5000"))
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+IMPORT_MODES = ("insert", "upsert")
+
+class DataTransferError(ValueError):
+    """An unknown dataset, format or mode, or an unreadable file"""
+
+def _unwrap(annotation: Any) -> Any:
+    """Optional[X] -> X"""
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+def _kind(annotation: Any) -> str:
+    annotation = _unwrap(annotation)
+    if get_origin(annotation) in (list, dict) or annotation in (list, dict):
+        return "json"
+    if isinstance(annotation, type):
+        if issubclass(annotation, bool):
+            return "bool"
+        if issubclass(annotation, Enum) or issubclass(annotation, str):
+            return "string"
+        if issubclass(annotation, datetime):
+            return "datetime"
+        if issubclass(annotation, float):
+            return "float"
+        if issubclass(annotation, int):
+            return "int"
+    # str subtypes such as EmailStr and any other scalar stay plain text
+    return "string"
+
+def _columns(model: Type[BaseModel]) -> Tuple[List[str], Dict[str, str]]:
+    """Flat column names and their kinds; nested models become dotted columns"""
+    columns, kinds = [], {}
+    for name, field in model.model_fields.items():
+        annotation = _unwrap(field.annotation)
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            for sub_name, sub_field in annotation.model_fields.items():
+                column = f"{name}.{sub_name}"
+                columns.append(column)
+                kinds[column] = _kind(sub_field.annotation)
+        else:
+            columns.append(name)
+            kinds[name] = _kind(field.annotation)
+    return columns, kinds
+
+class Dataset:
+    """A collection that can be imported and exported, and its model"""
+
+    def __init__(self, collection: str, model: Type[BaseModel], import_only: Tuple[str, ...] = ()):
+        self.collection = collection
+        self.model = model
+        # Columns accepted on import but never exported
+        self.import_only = import_only
+        self.columns, self.kinds = _columns(model)
+        self.adapter = TypeAdapter(List[model])
+
+DATASETS: Dict[str, Dataset] = {
+    "bookings": Dataset("bookings", Booking),
+    "users": Dataset("users", User, import_only=("hashed_password",)),
+    "schedules": Dataset("instructor_schedules", InstructorSchedule),
+}
+
+def dataset(name: str) -> Dataset:
+    if name not in DATASETS:
+        raise DataTransferError(f"Unknown dataset {name!r}, expected one of: {', '.join(DATASETS)}")
+    return DATASETS[name]
+
+def file_format(fmt: Optional[str], filename: Optional[str] = None) -> str:
+    """The requested format, or the one implied by the file extension"""
+    if fmt is None and filename:
+        fmt = filename.rsplit(".", 1)[-1].lower() if "." in filename else None
+    if fmt not in FORMATS:
+        raise DataTransferError(f"Unknown format {fmt!r}, expected one of: {', '.join(FORMATS)}")
+    if fmt == "parquet":
+        _pyarrow()
+    return fmt
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise DataTransferError("Parquet support requires the pyarrow package")
+    return pyarrow
+
+# Export
+
+def _frame(data: Dataset, docs: List[Dict[str, Any]]) -> pd.DataFrame:
+    """One row per document in the flat column layout"""
+    rows = []
+    for doc in docs:
+        doc = shape(data.model, doc)
+        row = {}
+        for column in data.columns:
+            name, _, sub_name = column.partition(".")
+            value = doc.get(name)
+            if sub_name:
+                value = value.get(sub_name) if isinstance(value, dict) else None
+            if data.kinds[column] == "json":
+                value = json.dumps(value, default=str)
+            elif isinstance(value, Enum):
+                value = value.value
+            row[column] = value
+        rows.append(row)
+    return pd.DataFrame(rows, columns=data.columns)
+
+def _arrow_schema(data: Dataset):
+    pa = _pyarrow()
+    types = {
+        "string": pa.string(), "json": pa.string(), "bool": pa.bool_(), "int": pa.int64(),
+        "float": pa.float64(), "datetime": pa.timestamp("ms")
+    }
+    return pa.schema([(column, types[data.kinds[column]]) for column in data.columns])
+
+class _ChunkSink:
+    """Write-only file handing out what was written since the last take()"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+async def export_chunks(db, name: str, fmt: str, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Encoded file contents for a dataset, one chunk of documents at a time"""
+    data = dataset(name)
+    cursor = db[data.collection].find({}, model_projection(data.model)).sort("_id", 1).batch_size(chunk_size)
+
+    if fmt == "csv":
+        header = True
+        async for docs in chunked(cursor, chunk_size):
+            yield _frame(data, docs).to_csv(index=False, header=header).encode()
+            header = False
+        if header:
+            yield pd.DataFrame(columns=data.columns).to_csv(index=False).encode()
+        return
+
+    pa = _pyarrow()
+    schema = _arrow_schema(data)
+    sink = _ChunkSink()
+    with pa.parquet.ParquetWriter(sink, schema) as writer:
+        async for docs in chunked(cursor, chunk_size):
+            writer.write_table(pa.Table.from_pandas(_frame(data, docs), schema=schema, preserve_index=False))
+            yield sink.take()
+    yield sink.take()
+
+# Import
+
+def read_frames(source, fmt: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Chunks of rows from a CSV or Parquet file object or path"""
+    try:
+        if fmt == "csv":
+            yield from pd.read_csv(source, chunksize=chunk_size, dtype=str, keep_default_na=False)
+            return
+        parquet = _pyarrow().parquet.ParquetFile(source)
+        for batch in parquet.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    except (ValueError, OSError, pd.errors.ParserError) as exc:
+        raise DataTransferError(f"Could not read {fmt} file: {exc}")
+
+def _decode_json(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        # Left as text so validation reports it against the field
+        return value
+
+def validate_frame(
+    data: Dataset, frame: pd.DataFrame, first_row: int
+) -> Tuple[List[Dict[str, Any]], List[int], List[Dict[str, Any]]]:
+    """Validate a chunk of rows in one pass
+
+    Returns the valid documents, their row numbers and an error per invalid
+    row (`first_row` is the row number of the chunk's first row).
+    """
+    known = [column for column in frame.columns if column in data.kinds or column in data.import_only]
+    frame = frame[known].astype(object)
+    # Empty cells are missing values, so model defaults apply
+    frame = frame.where(frame.notna() & (frame != ""), None)
+    for column in known:
+        if data.kinds.get(column) == "json":
+            frame[column] = frame[column].map(_decode_json)
+
+    records = []
+    for row in frame.to_dict("records"):
+        record: Dict[str, Any] = {}
+        for column, value in row.items():
+            if value is None:
+                continue
+            if isinstance(value, pd.Timestamp):
+                value = value.to_pydatetime()
+            name, _, sub_name = column.partition(".")
+            if sub_name:
+                record.setdefault(name, {})[sub_name] = value
+            else:
+                record[name] = value
+        records.append(record)
+
+    errors: Dict[int, List[str]] = {}
+    try:
+        models = data.adapter.validate_python(records)
+    except ValidationError as exc:
+        for error in exc.errors():
+            index, *field = error['loc']
+            errors.setdefault(index, []).append(f"{'.'.join(map(str, field)) or 'row'}: {error['msg']}")
+        valid = [i for i in range(len(records)) if i not in errors]
+        models = data.adapter.validate_python([records[i] for i in valid])
+    else:
+        valid = list(range(len(records)))
+
+    documents = []
+    for i, model in zip(valid, models):
+        document = model.model_dump()
+        for column in data.import_only:
+            if records[i].get(column) is not None:
+                document[column] = records[i][column]
+        documents.append(document)
+    return (
+        documents,
+        [first_row + i for i in valid],
+        [{"row": first_row + i, "errors": messages} for i, messages in sorted(errors.items())]
+    )
+
+async def write_documents(
+    db, data: Dataset, documents: List[Dict[str, Any]], rows: List[int], mode: str
+) -> Tuple[int, List[Dict[str, Any]]]:
+    """Write one chunk; returns the number written and an error per failed row"""
+    if not documents:
+        return 0, []
+    collection = db[data.collection]
+    try:
+        if mode == "insert":
+            result = await collection.insert_many(documents, ordered=False)
+            return len(result.inserted_ids), []
+        result = await collection.bulk_write(
+            [UpdateOne({"id": document['id']}, {"$set": document}, upsert=True) for document in documents],
+            ordered=False
+        )
+        return result.upserted_count + result.matched_count, []
+    except BulkWriteError as exc:
+        write_errors = exc.details.get('writeErrors', [])
+        written = len(documents) - len(write_errors)
+        return written, [
+            {"row": rows[error['index']], "errors": [error['errmsg']]} for error in write_errors
+        ]
+
+def _slot(booking: Dict[str, Any]) -> Optional[Tuple[str, str, str]]:
+    """(instructor_id, date, start_time) an imported booking holds, if active"""
+    if booking['status'] not in ACTIVE_BOOKING_STATUSES or booking.get('instructor_id') is None:
+        return None
+    return booking['instructor_id'], booking['booking_date'], booking['time_slot']['start_time']
+
+def _slot_query(slot: Tuple[str, str, str]) -> Dict[str, str]:
+    return {"instructor_id": slot[0], "date": slot[1], "start_time": slot[2]}
+
+async def _reserve_slots(
+    db, documents: List[Dict[str, Any]]
+) -> Tuple[Set[int], Dict[int, str]]:
+    """Reserve the slots of active bookings in one unordered insert
+
+    Returns the indexes of the documents whose reservation was created here,
+    and an error message per index whose slot another booking holds. A
+    booking re-imported onto the slot it already holds is neither.
+    """
+    now = datetime.utcnow()
+    wanted = [(i, slot) for i, slot in enumerate(map(_slot, documents)) if slot]
+    if not wanted:
+        return set(), {}
+    reservations = [
+        {**_slot_query(slot), "spot": documents[i]['spot'], "booking_id": documents[i]['id'], "created_at": now}
+        for i, slot in wanted
+    ]
+    created = {i for i, _ in wanted}
+    try:
+        await db.slot_reservations.insert_many(reservations, ordered=False)
+    except BulkWriteError as exc:
+        for error in exc.details.get('writeErrors', []):
+            created.discard(wanted[error['index']][0])
+
+    collided = [(i, slot) for i, slot in wanted if i not in created]
+    if not collided:
+        return created, {}
+    holders = {}
+    async for reservation in db.slot_reservations.find(
+        {"$or": [_slot_query(slot) for _, slot in collided]},
+        {"_id": 0, "instructor_id": 1, "date": 1, "start_time": 1, "booking_id": 1}
+    ):
+        holders[(reservation['instructor_id'], reservation['date'], reservation['start_time'])] = \
+            reservation['booking_id']
+    conflicts = {}
+    for i, slot in collided:
+        holder = holders.get(slot)
+        if holder != documents[i]['id']:
+            conflicts[i] = (f"time_slot: instructor {slot[0]} is already booked on {slot[1]} "
+                            f"at {slot[2]} (booking {holder})")
+    return created, conflicts
+
+async def write_bookings(
+    db, data: Dataset, documents: List[Dict[str, Any]], rows: List[int], mode: str
+) -> Tuple[int, List[Dict[str, Any]], Set[str]]:
+    """write_documents for bookings, keeping slot reservations in step
+
+    Also returns the booking dates the chunk touched, including the dates
+    upserted bookings were moved away from.
+    """
+    previous: Dict[str, str] = {}
+    if mode == "upsert" and documents:
+        async for booking in db.bookings.find(
+            {"id": {"$in": [document['id'] for document in documents]}}, {"_id": 0, "id": 1, "booking_date": 1}
+        ):
+            previous[booking['id']] = booking['booking_date']
+
+    created, conflicts = await _reserve_slots(db, documents)
+    keep = [i for i in range(len(documents)) if i not in conflicts]
+    written, errors = await write_documents(
+        db, data, [documents[i] for i in keep], [rows[i] for i in keep], mode
+    )
+    errors += [{"row": rows[i], "errors": [message]} for i, message in conflicts.items()]
+
+    failed_rows = {error['row'] for error in errors}
+    failed = [i for i in keep if rows[i] in failed_rows]
+    # Reservations taken for rows that were not written are given back
+    rollback = [
+        {**_slot_query(_slot(documents[i])), "booking_id": documents[i]['id']} for i in failed if i in created
+    ]
+    if rollback:
+        await db.slot_reservations.delete_many({"$or": rollback})
+
+    stored = [documents[i] for i in keep if rows[i] not in failed_rows]
+    if mode == "upsert" and stored:
+        slots = {document['id']: _slot(document) for document in stored}
+        stale = []
+        async for reservation in db.slot_reservations.find(
+            {"booking_id": {"$in": list(slots)}},
+            {"_id": 1, "booking_id": 1, "instructor_id": 1, "date": 1, "start_time": 1}
+        ):
+            slot = (reservation['instructor_id'], reservation['date'], reservation['start_time'])
+            if slots[reservation['booking_id']] != slot:
+                stale.append(reservation['_id'])
+        if stale:
+            await db.slot_reservations.delete_many({"_id": {"$in": stale}})
+
+    dates = {document['booking_date'] for document in stored}
+    dates |= {previous[document['id']] for document in stored if document['id'] in previous}
+    return written, errors, dates
+
+async def _refresh_derived(db, name: str, documents: List[Dict[str, Any]], booking_dates: Set[str]) -> None:
+    """Bring derived collections up to date with imported documents"""
+    from principal import principal_cache
+    from rollups import refresh_booking_counts
+    from slot_inventory import rebuild
+
+    today = datetime.utcnow().date().isoformat()
+    if name == "bookings":
+        await refresh_booking_counts(db, booking_dates)
+        dates = [date for date in booking_dates if date >= today]
+    elif name == "schedules":
+        dates = [document['date'] for document in documents if document['date'] >= today]
+    else:
+        for document in documents:
+            principal_cache.invalidate(document['id'])
+        # Imported instructors gain (or lose) their upcoming slots
+        instructors = any(document['role'] == UserRole.INSTRUCTOR for document in documents)
+        dates = [today] if instructors else []
+        if dates:
+            await rebuild(db, today)
+            return
+    if dates:
+        await rebuild(db, min(dates), to_date=max(dates))
+
+async def import_frames(db, name: str, frames, mode: str = "insert", run=None) -> Dict[str, Any]:
+    """Validate and write chunks of rows, returning a per-row error report
+
+    `frames` is an iterator of DataFrames; `run(fn, *args)` runs blocking
+    parsing and validation off the event loop when given.
+    """
+    data = dataset(name)
+    if mode not in IMPORT_MODES:
+        raise DataTransferError(f"Unknown mode {mode!r}, expected one of: {', '.join(IMPORT_MODES)}")
+
+    async def call(fn, *args):
+        return await run(fn, *args) if run else fn(*args)
+
+    rows = written = failed = 0
+    errors: List[Dict[str, Any]] = []
+    imported: List[Dict[str, Any]] = []
+    booking_dates: Set[str] = set()
+    while True:
+        frame = await call(next, frames, None)
+        if frame is None:
+            break
+        documents, valid_rows, invalid = await call(validate_frame, data, frame, rows + 1)
+        rows += len(frame)
+        if name == "bookings":
+            count, write_errors, dates = await write_bookings(db, data, documents, valid_rows, mode)
+            booking_dates |= dates
+        else:
+            count, write_errors = await write_documents(db, data, documents, valid_rows, mode)
+        written += count
+        failed += len(invalid) + len(write_errors)
+        errors += (invalid + write_errors)[:max(0, MAX_REPORTED_ERRORS - len(errors))]
+        failed_rows = {error['row'] for error in write_errors}
+        imported += [
+            {key: document[key] for key in ("id", "booking_date", "date", "role") if key in document}
+            for document, row in zip(documents, valid_rows) if row not in failed_rows
+        ]
+
+    if imported:
+        await _refresh_derived(db, name, imported, booking_dates)
+    return {
+        "dataset": name,
+        "mode": mode,
+        "rows": rows,
+        "written": written,
+        "failed": failed,
+        "errors": sorted(errors, key=lambda error: error['row'])
+    }
+
+async def main(action: str, name: str, path: str, mode: str) -> int:
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from database import connect_to_mongo, get_database, close_mongo_connection
+
+    try:
+        dataset(name)
+        fmt = file_format(None, path)
+    except DataTransferError as exc:
+        print(exc)
+        return 1
+
+    load_dotenv(Path(__file__).parent / '.env')
+    await connect_to_mongo()
+    db = await get_database()
+    try:
+        if action == "--export":
+            with open(path, "wb") as out:
+                async for chunk in export_chunks(db, name, fmt):
+                    out.write(chunk)
+            print(f"✓ Exported {name} to {path}")
+            return 0
+        report = await import_frames(db, name, read_frames(path, fmt), mode)
+    except DataTransferError as exc:
+        print(exc)
+        return 1
+    finally:
+        await close_mongo_connection()
+
+    print(f"✓ Imported {report['written']} of {report['rows']} {name} rows")
+    for error in report['errors']:
+        print(f"  row {error['row']}: {'; '.join(error['errors'])}")
+    if report['failed'] > len(report['errors']):
+        print(f"  ... and {report['failed'] - len(report['errors'])} more failed rows")
+    return 1 if report['failed'] else 0
+
+if __name__ == "__main__":
+    action = next((arg for arg in sys.argv if arg in ("--export", "--import")), None)
+    args = sys.argv[sys.argv.index(action) + 1:] if action else []
+    if len(args) < 2:
+        print(__doc__)
+        sys.exit(1)
+    sys.exit(asyncio.run(main(action, args[0], args[1], "upsert" if "--upsert" in sys.argv else "insert")))
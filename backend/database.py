@@ -1,6 +1,16 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+import importlib.util
+import logging
 import os
-from typing import Optional
+from typing import Any, Dict, Optional
+
+from mongo_monitoring import pool_stats, command_stats
+from metrics import request_command_listener
+
+logger = logging.getLogger(__name__)
+
+# Wire compressor -> module it needs
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
 
 class Database:
     client: Optional[AsyncIOMotorClient] = None
@@ -11,13 +21,53 @@ database = Database()
 async def get_database():
     return database.db
 
+def _int_setting(name: str) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+def _compressors(setting: str) -> str:
+    """Configured compressors whose libraries are installed, in order"""
+    available = []
+    for name in (item.strip() for item in setting.split(",")):
+        if not name:
+            continue
+        module = COMPRESSOR_MODULES.get(name)
+        if module and importlib.util.find_spec(module):
+            available.append(name)
+        else:
+            logger.warning("MongoDB compressor %r is not available, skipping", name)
+    return ",".join(available)
+
+def client_options() -> Dict[str, Any]:
+    """Motor client settings from the environment (.env)"""
+    options: Dict[str, Any] = {
+        "maxPoolSize": _int_setting("MONGO_MAX_POOL_SIZE"),
+        "minPoolSize": _int_setting("MONGO_MIN_POOL_SIZE"),
+        "maxIdleTimeMS": _int_setting("MONGO_MAX_IDLE_TIME_MS"),
+        "waitQueueTimeoutMS": _int_setting("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        "serverSelectionTimeoutMS": _int_setting("MONGO_SERVER_SELECTION_TIMEOUT_MS"),
+        "connectTimeoutMS": _int_setting("MONGO_CONNECT_TIMEOUT_MS"),
+        "socketTimeoutMS": _int_setting("MONGO_SOCKET_TIMEOUT_MS"),
+        "readPreference": os.environ.get("MONGO_READ_PREFERENCE") or None,
+        "appname": os.environ.get("MONGO_APP_NAME", "kiteschool-pro-api"),
+    }
+    compressors = _compressors(os.environ.get("MONGO_COMPRESSORS", ""))
+    if compressors:
+        options["compressors"] = compressors
+    # Unset values fall back to the driver defaults
+    return {key: value for key, value in options.items() if value is not None}
+
 async def connect_to_mongo():
     """Create database connection"""
     mongo_url = os.environ.get('MONGO_URL')
-    database.client = AsyncIOMotorClient(mongo_url)
+    options = client_options()
+    database.client = AsyncIOMotorClient(
+        mongo_url, event_listeners=[pool_stats, command_stats, request_command_listener], **options
+    )
     database.db = database.client[os.environ.get('DB_NAME', 'kiteschool_pro')]
+    logger.info("MongoDB client options: %s", options)
 
 async def close_mongo_connection():
     """Close database connection"""
     if database.client:
-        database.client.close()
\ No newline at end of file
+        database.client.close()
@@ -0,0 +1,131 @@
+"""
+In-process fake of the Stripe PaymentIntent API for offline load testing
+
+Implements just enough of /v1/payment_intents for payment_provider.StripeClient.
+Use it in-process with STRIPE_FAKE=1, or run it as a server and point
+STRIPE_API_BASE at it:
+
+    uvicorn fake_stripe:app --port 12111
+
+FAKE_STRIPE_LATENCY_MS adds a fixed delay to every response,
+FAKE_STRIPE_FAILURE_RATE makes that fraction of requests return 503 (to
+exercise retries), and FAKE_STRIPE_AUTO_SUCCEED=1 creates intents that have
+already succeeded so the payment flow can run without a browser. Set
+FAKE_STRIPE_WEBHOOK_URL (e.g. http://localhost:8001/api/payments/webhook) to
+have succeeded intents delivered as `payment_intent.succeeded` events signed
+with STRIPE_WEBHOOK_SECRET, FAKE_STRIPE_WEBHOOK_DELAY_MS after the change
+(so the app has saved its payment record first).
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from typing import Dict, Any, Set
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import JSONResponse
+
+LATENCY_MS = float(os.environ.get("FAKE_STRIPE_LATENCY_MS", "0"))
+FAILURE_RATE = float(os.environ.get("FAKE_STRIPE_FAILURE_RATE", "0"))
+AUTO_SUCCEED = os.environ.get("FAKE_STRIPE_AUTO_SUCCEED", "1") == "1"
+WEBHOOK_URL = os.environ.get("FAKE_STRIPE_WEBHOOK_URL")
+WEBHOOK_DELAY_MS = float(os.environ.get("FAKE_STRIPE_WEBHOOK_DELAY_MS", "500"))
+
+app = FastAPI(title="Fake Stripe")
+
+# intent id -> intent, and idempotency key -> intent id
+payment_intents: Dict[str, Dict[str, Any]] = {}
+idempotency_keys: Dict[str, str] = {}
+# Webhook deliveries in flight; the loop only keeps weak references to tasks
+deliveries: Set[asyncio.Task] = set()
+
+@app.middleware("http")
+async def simulate_network(request: Request, call_next):
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    if FAILURE_RATE and random.random() < FAILURE_RATE:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"error": {"message": "Simulated outage", "type": "api_error"}},
+        )
+    return await call_next(request)
+
+def _not_found(intent_id: str):
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail={"message": f"No such payment_intent: '{intent_id}'", "type": "invalid_request_error"},
+    )
+
+@app.exception_handler(HTTPException)
+async def stripe_error(request: Request, exc: HTTPException):
+    return JSONResponse(status_code=exc.status_code, content={"error": exc.detail})
+
+async def _deliver_succeeded(intent: Dict[str, Any]):
+    from stripe_events import sign_payload
+
+    await asyncio.sleep(WEBHOOK_DELAY_MS / 1000)
+    event = {
+        "id": f"evt_{uuid.uuid4().hex[:24]}",
+        "object": "event",
+        "type": "payment_intent.succeeded",
+        "created": int(time.time()),
+        "data": {"object": intent},
+    }
+    payload = json.dumps(event).encode()
+    headers = {
+        "Content-Type": "application/json",
+        "Stripe-Signature": sign_payload(payload, os.environ.get("STRIPE_WEBHOOK_SECRET", "")),
+    }
+    async with httpx.AsyncClient() as client:
+        await client.post(WEBHOOK_URL, content=payload, headers=headers)
+
+def _succeeded(intent: Dict[str, Any]):
+    intent["status"] = "succeeded"
+    if WEBHOOK_URL:
+        task = asyncio.get_running_loop().create_task(_deliver_succeeded(dict(intent)))
+        deliveries.add(task)
+        task.add_done_callback(deliveries.discard)
+
+@app.post("/v1/payment_intents")
+async def create_payment_intent(request: Request):
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key in idempotency_keys:
+        return payment_intents[idempotency_keys[idempotency_key]]
+
+    form = await request.form()
+    intent_id = f"pi_{uuid.uuid4().hex[:24]}"
+    intent = {
+        "id": intent_id,
+        "object": "payment_intent",
+        "amount": int(form["amount"]),
+        "currency": form["currency"],
+        "client_secret": f"{intent_id}_secret_{uuid.uuid4().hex[:16]}",
+        "status": "requires_payment_method",
+        "metadata": {
+            key[len("metadata["):-1]: value
+            for key, value in form.items() if key.startswith("metadata[")
+        },
+    }
+    payment_intents[intent_id] = intent
+    if idempotency_key:
+        idempotency_keys[idempotency_key] = intent_id
+    if AUTO_SUCCEED:
+        _succeeded(intent)
+    return intent
+
+@app.get("/v1/payment_intents/{intent_id}")
+async def retrieve_payment_intent(intent_id: str):
+    if intent_id not in payment_intents:
+        _not_found(intent_id)
+    return payment_intents[intent_id]
+
+@app.post("/v1/payment_intents/{intent_id}/confirm")
+async def confirm_payment_intent(intent_id: str):
+    if intent_id not in payment_intents:
+        _not_found(intent_id)
+    if payment_intents[intent_id]["status"] != "succeeded":
+        _succeeded(payment_intents[intent_id])
+    return payment_intents[intent_id]
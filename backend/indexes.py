@@ -0,0 +1,192 @@
+"""
+MongoDB index registry for KiteSchool Pro
+
+Every index the application relies on is declared here. The server lifespan
+applies the registry on startup, and running this module directly prints a
+report of missing, undeclared and unused indexes so they can be checked
+before a deploy:
+
+    python indexes.py            # report only
+    python indexes.py --apply    # create missing indexes, then report
+"""
+import asyncio
+import logging
+import sys
+from typing import Dict, List, Any
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# collection name -> declared indexes
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel(
+            [("role", ASCENDING), ("is_active", ASCENDING), ("_id", ASCENDING)],
+            name="role_active",
+        ),
+    ],
+    "courses": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("is_active", ASCENDING), ("course_type", ASCENDING)], name="active_type"),
+        IndexModel([("spots", ASCENDING), ("is_active", ASCENDING)], name="spots_active"),
+    ],
+    "bookings": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Slot conflict lookup in booking_routes
+        IndexModel(
+            [
+                ("instructor_id", ASCENDING),
+                ("booking_date", ASCENDING),
+                ("time_slot.start_time", ASCENDING),
+                ("status", ASCENDING),
+            ],
+            name="instructor_date_slot_status",
+        ),
+        # Keyset pagination of a customer's / instructor's bookings
+        IndexModel([("customer_id", ASCENDING), ("_id", ASCENDING)], name="customer_page"),
+        IndexModel([("instructor_id", ASCENDING), ("_id", ASCENDING)], name="instructor_page"),
+        IndexModel([("booking_date", ASCENDING), ("status", ASCENDING)], name="date_status"),
+    ],
+    "instructor_schedules": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [("instructor_id", ASCENDING), ("date", ASCENDING), ("spot", ASCENDING)],
+            name="instructor_date_spot",
+            unique=True,
+        ),
+        IndexModel(
+            [("date", ASCENDING), ("spot", ASCENDING), ("is_available", ASCENDING)],
+            name="date_spot_available",
+        ),
+    ],
+    "availability_rules": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("instructor_id", ASCENDING), ("is_active", ASCENDING)], name="instructor_active"),
+    ],
+    "slot_reservations": [
+        # One active booking per instructor slot; see reservations.py
+        IndexModel(
+            [("instructor_id", ASCENDING), ("date", ASCENDING), ("start_time", ASCENDING)],
+            name="instructor_date_start_unique",
+            unique=True,
+        ),
+        IndexModel([("booking_id", ASCENDING)], name="booking"),
+    ],
+    "slot_inventory": [
+        IndexModel(
+            [("spot", ASCENDING), ("date", ASCENDING), ("start_time", ASCENDING)],
+            name="spot_date_start_unique",
+            unique=True,
+        ),
+        # Removing one instructor from their slots (see slot_inventory.py)
+        IndexModel([("free_instructors.id", ASCENDING), ("date", ASCENDING)], name="instructor_date"),
+    ],
+    "daily_stats": [
+        IndexModel([("date", ASCENDING)], name="date_unique", unique=True),
+    ],
+    "payments": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("booking_id", ASCENDING)], name="booking"),
+        IndexModel([("status", ASCENDING), ("paid_at", ASCENDING)], name="status_paid_at"),
+        IndexModel([("stripe_payment_intent_id", ASCENDING)], name="stripe_payment_intent"),
+    ],
+    "stripe_events": [
+        # Each webhook event is stored once
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Unprocessed events picked up on startup and by --replay
+        IndexModel([("processed_at", ASCENDING), ("received_at", ASCENDING)], name="processed_received"),
+    ],
+}
+
+async def ensure_indexes(db) -> List[str]:
+    """Create all declared indexes, returning the names of any that failed"""
+    failed = []
+    for collection_name, models in INDEXES.items():
+        for model in models:
+            try:
+                await db[collection_name].create_indexes([model])
+            except OperationFailure as e:
+                # Typically duplicate data under a unique index; keep the app up
+                # and let the check report surface it
+                name = model.document["name"]
+                logger.error(f"Could not create index {collection_name}.{name}: {e}")
+                failed.append(f"{collection_name}.{name}")
+    return failed
+
+async def check_indexes(db) -> Dict[str, Dict[str, List[str]]]:
+    """Compare declared indexes with the ones present in the database
+
+    Returns, per collection, the declared indexes that are missing, the ones
+    present but not declared here, and the ones with no recorded accesses
+    since the server started.
+    """
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        declared = {model.document["name"]: model.document["key"] for model in models}
+
+        existing = {}
+        async for index in collection.list_indexes():
+            existing[index["name"]] = dict(index["key"])
+
+        missing = [
+            name for name, key in declared.items()
+            if name not in existing or existing[name] != dict(key)
+        ]
+        undeclared = [name for name in existing if name != "_id_" and name not in declared]
+
+        unused = []
+        try:
+            async for stats in collection.aggregate([{"$indexStats": {}}]):
+                if stats["name"] != "_id_" and stats["accesses"]["ops"] == 0:
+                    unused.append(stats["name"])
+        except OperationFailure as e:
+            logger.warning(f"$indexStats unavailable for {collection_name}: {e}")
+
+        report[collection_name] = {
+            "missing": missing,
+            "undeclared": undeclared,
+            "unused": sorted(unused),
+        }
+    return report
+
+def format_report(report: Dict[str, Dict[str, List[str]]]) -> str:
+    """Render a check_indexes report for the console"""
+    lines = []
+    for collection_name, sections in report.items():
+        lines.append(f"{collection_name}:")
+        for section, names in sections.items():
+            lines.append(f"  {section}: {', '.join(names) if names else '-'}")
+    return "\n".join(lines)
+
+def has_problems(report: Dict[str, Dict[str, Any]]) -> bool:
+    """True when any declared index is missing"""
+    return any(sections["missing"] for sections in report.values())
+
+async def main(apply: bool = False) -> int:
+    """Check (and optionally apply) the index registry against the configured database"""
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from database import connect_to_mongo, get_database, close_mongo_connection
+
+    load_dotenv(Path(__file__).parent / '.env')
+    await connect_to_mongo()
+    db = await get_database()
+
+    if apply:
+        failed = await ensure_indexes(db)
+        for name in failed:
+            print(f"✗ Failed to create {name}")
+
+    report = await check_indexes(db)
+    print(format_report(report))
+
+    await close_mongo_connection()
+    return 1 if has_problems(report) else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(apply="--apply" in sys.argv)))
@@ -0,0 +1,80 @@
+"""
+Request-scoped batch loader for booking related data
+
+Collects the course, user and payment keys referenced by a page of bookings
+and fetches each collection once with `$in`, instead of one query per key per
+booking. Create one loader per request; documents already loaded are reused
+across calls.
+"""
+from typing import List, Dict, Any, Optional, Iterable
+
+from models import Booking, Course, User, Payment
+from responses import shape
+from projections import model_projection
+
+class BookingRelationsLoader:
+    """Loads and caches the courses, users and payments behind bookings"""
+
+    def __init__(self, db):
+        self.db = db
+        self.courses: Dict[str, Dict[str, Any]] = {}
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.payments: Dict[str, List[Dict[str, Any]]] = {}
+
+    async def load(self, bookings: Iterable[Dict[str, Any]]) -> None:
+        """Fetch every related document not yet loaded for these bookings"""
+        course_ids, user_ids, booking_ids = set(), set(), set()
+        for booking in bookings:
+            course_ids.add(booking['course_id'])
+            user_ids.add(booking['customer_id'])
+            if booking.get('instructor_id'):
+                user_ids.add(booking['instructor_id'])
+            booking_ids.add(booking['id'])
+
+        course_ids -= self.courses.keys()
+        user_ids -= self.users.keys()
+        booking_ids -= self.payments.keys()
+
+        if course_ids:
+            async for course in self.db.courses.find(
+                {"id": {"$in": list(course_ids)}}, model_projection(Course)
+            ):
+                self.courses[course['id']] = course
+
+        if user_ids:
+            async for user in self.db.users.find(
+                {"id": {"$in": list(user_ids)}}, model_projection(User)
+            ):
+                self.users[user['id']] = user
+
+        if booking_ids:
+            for booking_id in booking_ids:
+                self.payments[booking_id] = []
+            async for payment in self.db.payments.find(
+                {"booking_id": {"$in": list(booking_ids)}}, model_projection(Payment)
+            ):
+                self.payments[payment['booking_id']].append(payment)
+
+    def course(self, course_id: str) -> Optional[Dict[str, Any]]:
+        return self.courses.get(course_id)
+
+    def user(self, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self.users.get(user_id) if user_id else None
+
+    def payments_for(self, booking_id: str) -> List[Dict[str, Any]]:
+        return self.payments.get(booking_id, [])
+
+    async def booking_documents(self, bookings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """BookingDetails-shaped documents for each booking, for DocumentResponse"""
+        await self.load(bookings)
+
+        return [
+            {
+                "booking": shape(Booking, booking),
+                "course": shape(Course, self.course(booking['course_id'])),
+                "customer": shape(User, self.user(booking['customer_id'])),
+                "instructor": shape(User, self.user(booking.get('instructor_id'))),
+                "payments": [shape(Payment, payment) for payment in self.payments_for(booking['id'])]
+            }
+            for booking in bookings
+        ]
@@ -0,0 +1,233 @@
+"""
+Per-route request metrics in Prometheus text format
+
+`MetricsMiddleware` records, per method and route template:
+
+    http_requests_total               requests by status code
+    http_request_duration_seconds     latency histogram, until the last body chunk
+    http_request_mongo_commands       Mongo commands issued per request (histogram)
+    http_request_mongo_seconds        time spent in those commands per request
+    http_requests_in_flight           requests currently being handled
+
+Mongo commands are attributed to the request through a context variable: the
+middleware puts a fresh `RequestMongoStats` in `current_mongo_stats`, and
+`RequestCommandListener` (registered on the Motor client) adds every command
+that completes in that context to it. An endpoint with an N+1 query pattern
+shows up directly as a high command count for its route.
+
+`render()` produces the `/metrics` body, including the connection pool and
+per-command totals from mongo_monitoring.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from mongo_monitoring import pool_stats, command_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+UNMATCHED_ROUTE = "unmatched"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels: Labels, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name, self.help_text = name, help_text
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines += [f"{self.name}{_labels(labels)} {_number(value)}" for labels, value in self._values.items()]
+        return lines
+
+class Gauge(Counter):
+    def dec(self, labels: Labels, amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...]):
+        self.name, self.help_text, self.buckets = name, help_text, buckets
+        # labels -> (per-bucket counts, sum, count)
+        self._values: Dict[Labels, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            entry = self._values.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_labels(labels, [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+requests_total = Counter("http_requests_total", "HTTP requests by method, route and status code")
+request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route", LATENCY_BUCKETS
+)
+request_mongo_commands = Histogram(
+    "http_request_mongo_commands", "MongoDB commands issued per HTTP request", COMMAND_COUNT_BUCKETS
+)
+request_mongo_seconds = Histogram(
+    "http_request_mongo_seconds", "Time spent in MongoDB commands per HTTP request", LATENCY_BUCKETS
+)
+requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being handled")
+
+class RequestMongoStats:
+    """Mongo commands completed on behalf of one request"""
+
+    def __init__(self):
+        self.commands = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self.commands += 1
+            self.seconds += seconds
+
+current_mongo_stats: ContextVar[Optional[RequestMongoStats]] = ContextVar("current_mongo_stats", default=None)
+
+class RequestCommandListener(monitoring.CommandListener):
+    """Adds each completed command to the current request's stats"""
+
+    def started(self, event):
+        pass
+
+    def _record(self, event):
+        stats = current_mongo_stats.get()
+        if stats is not None:
+            stats.add(event.duration_micros / 1_000_000)
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+request_command_listener = RequestCommandListener()
+
+class MetricsMiddleware:
+    """ASGI middleware recording the request metrics above"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestMongoStats()
+        token = current_mongo_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+        recorded = False
+
+        def record():
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            route = scope.get("route")
+            labels = (("method", scope["method"]), ("route", getattr(route, "path", UNMATCHED_ROUTE)))
+            requests_total.inc(labels + (("status", str(status_code)),))
+            request_duration.observe(labels, time.perf_counter() - started)
+            request_mongo_commands.observe(labels, stats.commands)
+            request_mongo_seconds.observe(labels, stats.seconds)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        requests_in_flight.inc(())
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            record()
+            requests_in_flight.dec(())
+            current_mongo_stats.reset(token)
+
+def _mongo_lines() -> List[str]:
+    pool = pool_stats.snapshot()
+    commands = command_stats.snapshot()
+    series = [
+        ("mongo_pool_connections_open", "gauge", "Open connections per server",
+         [((("server", server),), stats["open"]) for server, stats in pool.items()]),
+        ("mongo_pool_connections_checked_out", "gauge", "Connections checked out per server",
+         [((("server", server),), stats["checked_out"]) for server, stats in pool.items()]),
+        ("mongo_pool_checkouts_total", "counter", "Connection checkouts per server",
+         [((("server", server),), stats["checkouts"]) for server, stats in pool.items()]),
+        ("mongo_pool_checkout_failures_total", "counter", "Failed connection checkouts per server",
+         [((("server", server),), stats["checkout_failures"]) for server, stats in pool.items()]),
+        ("mongo_pool_checkout_wait_seconds_total", "counter", "Time spent waiting for a connection",
+         [((("server", server),), stats["checkout_wait_seconds_total"]) for server, stats in pool.items()]),
+        ("mongo_pool_checkout_wait_seconds_max", "gauge", "Longest wait for a connection",
+         [((("server", server),), stats["checkout_wait_seconds_max"]) for server, stats in pool.items()]),
+        ("mongo_commands_total", "counter", "MongoDB commands by name",
+         [((("command", name),), stats["count"]) for name, stats in commands.items()]),
+        ("mongo_command_failures_total", "counter", "Failed MongoDB commands by name",
+         [((("command", name),), stats["failures"]) for name, stats in commands.items()]),
+        ("mongo_command_seconds_total", "counter", "Time spent in MongoDB commands by name",
+         [((("command", name),), stats["seconds_total"]) for name, stats in commands.items()]),
+        ("mongo_command_seconds_max", "gauge", "Slowest MongoDB command by name",
+         [((("command", name),), stats["seconds_max"]) for name, stats in commands.items()]),
+    ]
+    lines = []
+    for name, kind, help_text, values in series:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        lines += [f"{name}{_labels(labels)} {_number(value)}" for labels, value in values]
+    return lines
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines: List[str] = []
+    for metric in (requests_total, request_duration, request_mongo_commands,
+                   request_mongo_seconds, requests_in_flight):
+        lines += metric.render()
+    lines += _mongo_lines()
+    return "\n".join(lines) + "\n"
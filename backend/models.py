@@ -106,6 +106,7 @@ class Booking(BaseModel):
     deposit_amount: float
     status: BookingStatus = BookingStatus.PENDING
     payment_status: PaymentStatus = PaymentStatus.PENDING
+    amount_paid: float = 0.0  # Running total of paid payments
     notes: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -152,6 +153,7 @@ class InstructorSchedule(BaseModel):
     available_slots: List[TimeSlot]
     spot: SpotLocation
     is_available: bool = True
+    rule_id: Optional[str] = None  # Set when expanded from an AvailabilityRule
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class InstructorScheduleCreate(BaseModel):
@@ -160,6 +162,44 @@ class InstructorScheduleCreate(BaseModel):
     available_slots: List[TimeSlot]
     spot: SpotLocation
 
+class ScheduleTemplate(BaseModel):
+    instructor_ids: List[str]
+    spots: List[SpotLocation]
+    start_date: str  # ISO date string (YYYY-MM-DD), inclusive
+    end_date: str    # ISO date string (YYYY-MM-DD), inclusive
+    weekdays: List[int] = [0, 1, 2, 3, 4, 5, 6]  # 0 = Monday
+    available_slots: List[TimeSlot]
+
+class InstructorScheduleBulk(BaseModel):
+    entries: List[InstructorScheduleCreate] = []
+    templates: List[ScheduleTemplate] = []
+
+class AvailabilityRule(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    instructor_id: str
+    spot: SpotLocation
+    start_date: str  # ISO date string (YYYY-MM-DD), inclusive
+    end_date: Optional[str] = None  # Inclusive; None repeats indefinitely
+    weekdays: List[int] = [0, 1, 2, 3, 4, 5, 6]  # 0 = Monday
+    available_slots: List[TimeSlot]
+    exceptions: List[str] = []  # Dates the rule does not apply (days off, closures)
+    is_active: bool = True
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class AvailabilityRuleCreate(BaseModel):
+    instructor_id: str
+    spot: SpotLocation
+    start_date: str
+    end_date: Optional[str] = None
+    weekdays: List[int] = [0, 1, 2, 3, 4, 5, 6]
+    available_slots: List[TimeSlot]
+    exceptions: List[str] = []
+
+class AvailabilityClosure(BaseModel):
+    dates: List[str]  # ISO date strings (YYYY-MM-DD)
+    spot: Optional[SpotLocation] = None  # None closes every spot
+    instructor_ids: Optional[List[str]] = None  # None closes every instructor
+
 # Response Models
 class BookingDetails(BaseModel):
     booking: Booking
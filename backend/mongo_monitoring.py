@@ -0,0 +1,132 @@
+"""
+MongoDB connection pool and command monitoring
+
+PyMongo listeners registered on the Motor client in database.py. They keep
+running totals in memory:
+
+    pool_stats      connections open and checked out per server, checkout
+                    wait time and failed checkouts
+    command_stats   count, failures and total / max latency per command name
+
+`snapshot()` on either returns a plain dict for health and metrics endpoints.
+Motor runs PyMongo in a thread pool, so the listeners are called from worker
+threads and guard their state with a lock.
+"""
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+from pymongo import monitoring
+
+def _server(address: Tuple[str, int]) -> str:
+    return f"{address[0]}:{address[1]}"
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool size and checkout wait time per server"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers: Dict[str, Dict[str, float]] = {}
+        # Checkouts in progress, keyed by (server, thread)
+        self._checkout_started: Dict[Tuple[str, int], float] = {}
+
+    def _stats(self, address) -> Dict[str, float]:
+        return self._servers.setdefault(_server(address), {
+            "open": 0,
+            "checked_out": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "checkout_wait_seconds_total": 0.0,
+            "checkout_wait_seconds_max": 0.0,
+            "cleared": 0,
+        })
+
+    def pool_created(self, event):
+        with self._lock:
+            self._stats(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._stats(event.address)["cleared"] += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._servers.pop(_server(event.address), None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._stats(event.address)["open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._stats(event.address)["open"] -= 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._checkout_started[(_server(event.address), threading.get_ident())] = time.perf_counter()
+
+    def _checkout_finished(self, event) -> float:
+        started = self._checkout_started.pop((_server(event.address), threading.get_ident()), None)
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._checkout_finished(event)
+            self._stats(event.address)["checkout_failures"] += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            waited = self._checkout_finished(event)
+            stats = self._stats(event.address)
+            stats["checked_out"] += 1
+            stats["checkouts"] += 1
+            stats["checkout_wait_seconds_total"] += waited
+            stats["checkout_wait_seconds_max"] = max(stats["checkout_wait_seconds_max"], waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._stats(event.address)["checked_out"] -= 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {server: dict(stats) for server, stats in self._servers.items()}
+
+class CommandStats(monitoring.CommandListener):
+    """Latency per command name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._commands: Dict[str, Dict[str, float]] = {}
+
+    def _record(self, event, failed: bool) -> None:
+        seconds = event.duration_micros / 1_000_000
+        with self._lock:
+            stats = self._commands.setdefault(event.command_name, {
+                "count": 0, "failures": 0, "seconds_total": 0.0, "seconds_max": 0.0
+            })
+            stats["count"] += 1
+            stats["failures"] += failed
+            stats["seconds_total"] += seconds
+            stats["seconds_max"] = max(stats["seconds_max"], seconds)
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._commands.items()}
+
+pool_stats = PoolStats()
+command_stats = CommandStats()
@@ -0,0 +1,120 @@
+"""
+Keyset pagination and NDJSON streaming for list endpoints
+
+Pages are ordered by `_id`, which is always indexed and increases with
+insertion order. A page is requested with `limit` and `after` (the cursor
+returned with the previous page); the cursor for the next page is sent in the
+`X-Next-Cursor` response header so list bodies keep their shape. With
+`stream=true` the Motor cursor is iterated directly and written out as
+newline-delimited JSON, so exports use constant memory and are never cut off.
+"""
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+
+from responses import dumps
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+class PageParams:
+    """Query parameters shared by paginated list endpoints"""
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+        stream: bool = Query(False, description="Stream every matching document as NDJSON"),
+    ):
+        self.limit = limit
+        self.after = after
+        self.stream = stream
+
+def _keyset_query(query: Dict[str, Any], after: Optional[str]) -> Dict[str, Any]:
+    if after is None:
+        return query
+    if not ObjectId.is_valid(after):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+    return {"$and": [query, {"_id": {"$gt": ObjectId(after)}}]}
+
+async def fetch_page(
+    collection,
+    query: Dict[str, Any],
+    params: PageParams,
+    projection: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Fetch one page of documents and the cursor for the next page (or None)"""
+    docs = await collection.find(
+        _keyset_query(query, params.after), projection
+    ).sort("_id", 1).limit(params.limit + 1).to_list(None)
+
+    next_cursor = None
+    if len(docs) > params.limit:
+        docs = docs[:params.limit]
+        next_cursor = str(docs[-1]['_id'])
+    return docs, next_cursor
+
+def cursor_headers(next_cursor: Optional[str]) -> Optional[Dict[str, str]]:
+    """Response headers exposing the next-page cursor, if there is one"""
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+
+def iterate(
+    collection,
+    query: Dict[str, Any],
+    after: Optional[str] = None,
+    projection: Optional[Dict[str, Any]] = None
+):
+    """Motor cursor over every matching document in `_id` order"""
+    return collection.find(
+        _keyset_query(query, after), projection
+    ).sort("_id", 1).batch_size(STREAM_BATCH_SIZE)
+
+def document_line(doc: Dict[str, Any]) -> bytes:
+    """Serialize a raw Mongo document as one NDJSON line"""
+    return dumps({key: value for key, value in doc.items() if key != '_id'})
+
+async def chunked(cursor, size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    chunk = []
+    async for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def stream_ndjson(
+    cursor,
+    serialize: Callable[[Dict[str, Any]], bytes] = document_line
+) -> StreamingResponse:
+    """Stream a Motor cursor as NDJSON, one serialized document per line"""
+    async def lines():
+        async for doc in cursor:
+            yield serialize(doc) + b"\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+def stream_ndjson_chunks(
+    cursor,
+    serialize_chunk,
+    chunk_size: int = STREAM_BATCH_SIZE
+) -> StreamingResponse:
+    """Stream a Motor cursor as NDJSON, serializing fixed-size chunks at a time
+
+    `serialize_chunk` is an async callable taking a list of documents and
+    returning their encoded lines; use it when each chunk needs batched lookups.
+    """
+    async def lines():
+        async for chunk in chunked(cursor, chunk_size):
+            for line in await serialize_chunk(chunk):
+                yield line + b"\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,148 @@
+"""
+Async payment provider client
+
+Talks to the Stripe REST API over a shared, pooled httpx.AsyncClient so a
+slow provider response never blocks the event loop. Every call has explicit
+timeouts; connection errors, 429s and 5xx responses are retried with
+exponential backoff and jitter, and POSTs carry an idempotency key so a retry
+cannot create a second PaymentIntent.
+
+Set STRIPE_API_BASE to point at another server (for example
+`uvicorn fake_stripe:app`), or STRIPE_FAKE=1 to route requests to the
+in-process fake in fake_stripe.py without any network access.
+"""
+import asyncio
+import os
+import random
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Any
+
+import httpx
+
+STRIPE_API_BASE = os.environ.get("STRIPE_API_BASE", "https://api.stripe.com")
+STRIPE_CONNECT_TIMEOUT = float(os.environ.get("STRIPE_CONNECT_TIMEOUT", "3"))
+STRIPE_READ_TIMEOUT = float(os.environ.get("STRIPE_READ_TIMEOUT", "10"))
+STRIPE_MAX_RETRIES = int(os.environ.get("STRIPE_MAX_RETRIES", "2"))
+STRIPE_BACKOFF_BASE = float(os.environ.get("STRIPE_BACKOFF_BASE", "0.25"))
+STRIPE_MAX_CONNECTIONS = int(os.environ.get("STRIPE_MAX_CONNECTIONS", "50"))
+
+RETRYABLE_STATUS_CODES = {409, 429, 500, 502, 503, 504}
+
+class PaymentProviderError(Exception):
+    """Raised when the provider rejects a request or cannot be reached"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+@dataclass
+class PaymentIntent:
+    id: str
+    status: str
+    amount: int
+    currency: str
+    client_secret: Optional[str] = None
+    metadata: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> "PaymentIntent":
+        return cls(
+            id=data["id"],
+            status=data["status"],
+            amount=data["amount"],
+            currency=data["currency"],
+            client_secret=data.get("client_secret"),
+            metadata=data.get("metadata") or {},
+        )
+
+class StripeClient:
+    """Minimal async Stripe client for the PaymentIntent calls the app makes"""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = STRIPE_API_BASE,
+        max_retries: int = STRIPE_MAX_RETRIES,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.max_retries = max_retries
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            auth=(api_key, ""),
+            timeout=httpx.Timeout(STRIPE_READ_TIMEOUT, connect=STRIPE_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=STRIPE_MAX_CONNECTIONS,
+                max_keepalive_connections=STRIPE_MAX_CONNECTIONS,
+            ),
+            transport=transport,
+        )
+
+    async def _request(self, method: str, path: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        headers = {}
+        if method == "POST":
+            # Same key on every attempt so retries are safe
+            headers["Idempotency-Key"] = str(uuid.uuid4())
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._client.request(method, path, data=data, headers=headers)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise PaymentProviderError(f"Payment provider unreachable: {e}")
+            else:
+                should_retry = response.headers.get("Stripe-Should-Retry")
+                retryable = (
+                    should_retry == "true"
+                    or (should_retry is None and response.status_code in RETRYABLE_STATUS_CODES)
+                )
+                if response.is_success:
+                    return response.json()
+                if not retryable or attempt == self.max_retries:
+                    try:
+                        message = response.json()["error"]["message"]
+                    except (ValueError, KeyError, TypeError):
+                        message = response.text
+                    raise PaymentProviderError(message, response.status_code)
+
+            # Exponential backoff with full jitter
+            await asyncio.sleep(random.uniform(0, STRIPE_BACKOFF_BASE * 2 ** attempt))
+
+    async def create_payment_intent(
+        self, amount: int, currency: str, metadata: Dict[str, str]
+    ) -> PaymentIntent:
+        """Create a PaymentIntent for `amount` in the currency's smallest unit"""
+        data = {"amount": amount, "currency": currency}
+        for key, value in metadata.items():
+            data[f"metadata[{key}]"] = value
+        return PaymentIntent.from_api(await self._request("POST", "/v1/payment_intents", data))
+
+    async def retrieve_payment_intent(self, intent_id: str) -> PaymentIntent:
+        return PaymentIntent.from_api(await self._request("GET", f"/v1/payment_intents/{intent_id}"))
+
+    async def close(self):
+        await self._client.aclose()
+
+_provider: Optional[StripeClient] = None
+
+def get_payment_provider() -> StripeClient:
+    """Shared provider client, created on first use"""
+    global _provider
+    if _provider is None:
+        transport = None
+        if os.environ.get("STRIPE_FAKE") == "1":
+            from fake_stripe import app as fake_stripe_app
+            transport = httpx.ASGITransport(app=fake_stripe_app)
+        _provider = StripeClient(
+            os.environ.get("STRIPE_SECRET_KEY", "sk_test_..."),
+            base_url="http://fake-stripe" if transport else STRIPE_API_BASE,
+            transport=transport,
+        )
+    return _provider
+
+async def close_payment_provider():
+    """Close pooled provider connections"""
+    global _provider
+    if _provider is not None:
+        await _provider.close()
+        _provider = None
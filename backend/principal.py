@@ -0,0 +1,96 @@
+"""
+Authenticated principal resolution with an in-process cache
+
+Protected routes only need the caller's id, role and active flag. The
+`get_principal` dependency resolves these once per request from a TTL + LRU
+cache, so role checks normally cost no Mongo round trip. The role is not
+taken from the JWT claim because tokens live for 30 days; the cache TTL bounds
+how stale a role can be in other worker processes, and writes in this
+process invalidate their entry immediately.
+"""
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status, Depends
+
+from auth import get_current_user_id
+from database import get_database
+
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.environ.get("PRINCIPAL_CACHE_TTL", "60"))
+
+ADMIN_ROLES = ("admin", "owner")
+
+@dataclass(frozen=True)
+class Principal:
+    id: str
+    role: str
+    is_active: bool = True
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role in ADMIN_ROLES
+
+class PrincipalCache:
+    """Size-limited LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+
+    def get(self, user_id: str) -> Optional[Principal]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return principal
+
+    def put(self, principal: Principal) -> None:
+        self._entries[principal.id] = (time.monotonic() + self.ttl, principal)
+        self._entries.move_to_end(principal.id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+async def get_principal(user_id: str = Depends(get_current_user_id)) -> Principal:
+    """Resolve the authenticated user's id and role"""
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        db = await get_database()
+        user_doc = await db.users.find_one(
+            {"id": user_id},
+            {"_id": 0, "id": 1, "role": 1, "is_active": 1}
+        )
+        if not user_doc:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+            )
+        principal = Principal(
+            id=user_doc['id'],
+            role=user_doc['role'],
+            is_active=user_doc.get('is_active', True),
+        )
+        principal_cache.put(principal)
+
+    if not principal.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Account is inactive",
+        )
+    return principal
@@ -0,0 +1,34 @@
+"""
+Read projections derived from models
+
+Reads ask Mongo for exactly the fields an endpoint uses instead of whole
+documents, which saves wire bytes and BSON decoding, and keeps fields such as
+`hashed_password` from ever reaching a response. Projections are built from
+the Pydantic model being returned (or an explicit field list) so they follow
+the models when fields are added.
+
+The returned dicts are cached and shared; do not modify them.
+"""
+from functools import lru_cache
+from typing import Dict, Type
+
+from pydantic import BaseModel
+
+@lru_cache(maxsize=None)
+def model_projection(model: Type[BaseModel], *extra: str, with_id: bool = False) -> Dict[str, int]:
+    """Projection of `model`'s fields plus `extra`
+
+    `_id` is excluded unless `with_id` is set (keyset pagination needs it).
+    """
+    return fields_projection(*model.model_fields, *extra, with_id=with_id)
+
+@lru_cache(maxsize=None)
+def fields_projection(*fields: str, with_id: bool = False) -> Dict[str, int]:
+    """Projection of the given (dotted) field paths"""
+    projection = {field: 1 for field in fields}
+    if not with_id:
+        projection["_id"] = 0
+    return projection
+
+# Existence checks only need the document's _id
+EXISTS = {"_id": 1}
@@ -0,0 +1,94 @@
+"""
+Atomic instructor slot reservations
+
+A booking holds its instructor's slot through a document in
+`slot_reservations`, which has a unique index on (instructor_id, date,
+start_time). Reserving is a single insert per candidate instructor: the
+first insert that does not hit the unique index wins, so two concurrent
+requests can never both take the same slot. The spot is stored but not part
+of the key, matching the booking conflict check (an instructor cannot teach
+at two spots at the same time).
+
+A reservation exists exactly while its booking is pending or confirmed.
+Reservations for bookings made before this collection existed can be created
+with:
+
+    python reservations.py --backfill
+"""
+import asyncio
+import sys
+from datetime import datetime
+from typing import Iterable, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from availability import ACTIVE_BOOKING_STATUSES
+
+async def reserve_slot(
+    db,
+    candidate_instructor_ids: Iterable[str],
+    booking_date: str,
+    spot: str,
+    start_time: str,
+    booking_id: str
+) -> Optional[str]:
+    """Reserve the slot with the first free candidate, returning its id or None"""
+    for instructor_id in candidate_instructor_ids:
+        try:
+            await db.slot_reservations.insert_one({
+                "instructor_id": instructor_id,
+                "date": booking_date,
+                "start_time": start_time,
+                "spot": spot,
+                "booking_id": booking_id,
+                "created_at": datetime.utcnow()
+            })
+            return instructor_id
+        except DuplicateKeyError:
+            continue
+    return None
+
+async def release_slot(db, booking_id: str) -> None:
+    """Free the slot held by a booking, if any"""
+    await db.slot_reservations.delete_one({"booking_id": booking_id})
+
+async def backfill_reservations(db) -> int:
+    """Create reservations for active bookings that do not have one yet"""
+    created = 0
+    async for booking in db.bookings.find(
+        {"status": {"$in": ACTIVE_BOOKING_STATUSES}, "instructor_id": {"$ne": None}},
+        {"_id": 0, "id": 1, "instructor_id": 1, "booking_date": 1, "spot": 1, "time_slot.start_time": 1}
+    ):
+        result = await db.slot_reservations.update_one(
+            {
+                "instructor_id": booking['instructor_id'],
+                "date": booking['booking_date'],
+                "start_time": booking['time_slot']['start_time']
+            },
+            {"$setOnInsert": {
+                "spot": booking['spot'],
+                "booking_id": booking['id'],
+                "created_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+        if result.upserted_id is not None:
+            created += 1
+    return created
+
+async def main():
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from database import connect_to_mongo, get_database, close_mongo_connection
+
+    load_dotenv(Path(__file__).parent / '.env')
+    await connect_to_mongo()
+    created = await backfill_reservations(await get_database())
+    print(f"✓ Created {created} slot reservations")
+    await close_mongo_connection()
+
+if __name__ == "__main__":
+    if "--backfill" not in sys.argv:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""
+Fast JSON responses for trusted documents
+
+Documents read from our own collections already match the response models,
+so building models from them, validating again against `response_model` and
+encoding with the stdlib json module repeats the same work three times.
+`shape` picks a model's fields out of a raw document instead (filling
+defaults for fields older documents lack and dropping anything else, such as
+`_id` or `hashed_password`), and `DocumentResponse` encodes the result in one
+pass with orjson, which handles datetime and enum values natively.
+
+Routes return the response object directly, so FastAPI skips validation;
+`response_model` stays on the route for the OpenAPI schema only.
+"""
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple, Type
+
+import orjson
+from bson import ObjectId
+from fastapi import Response
+from pydantic import BaseModel
+from pydantic.fields import FieldInfo
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(data: Any) -> bytes:
+    """Encode documents (and any models inside them) as JSON bytes"""
+    return orjson.dumps(data, default=_default)
+
+class DocumentResponse(Response):
+    """JSON response encoded with orjson, without response_model validation"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+@lru_cache(maxsize=None)
+def _fields(model: Type[BaseModel]) -> Tuple[Tuple[str, FieldInfo], ...]:
+    return tuple(model.model_fields.items())
+
+def shape(model: Type[BaseModel], doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """A trusted document reduced to `model`'s fields, without validation"""
+    if doc is None:
+        return None
+    shaped = {}
+    for name, field in _fields(model):
+        if name in doc:
+            shaped[name] = doc[name]
+        elif field.default_factory is not None:
+            shaped[name] = field.default_factory()
+        elif not field.is_required():
+            shaped[name] = field.default
+    return shaped
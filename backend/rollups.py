@@ -0,0 +1,241 @@
+"""
+Daily statistics rollups for the admin dashboard
+
+`daily_stats` holds one small document per calendar date, updated
+incrementally as bookings and payments change:
+
+    bookings_active   pending/confirmed bookings whose booking_date is this date
+    revenue           sum of payments marked paid on this date
+    payments_paid     number of payments marked paid on this date
+
+plus a single document with date "all" holding `payments_pending`, the
+number of payments currently pending. Every booking or payment change sets
+`updated_at` on its date's document, which analytics.py uses to tell when
+its cached figures for a month are out of date. The dashboard reads a month of these
+documents instead of scanning bookings and payments.
+
+A payment status change is written together with `previous_status` and
+`rolled_up: False`, and `record_payment_transition` counts it exactly once:
+each of its increments is guarded by the payment id in the document's
+`applying` list, so repeating it after a crash changes nothing, and the
+guards are dropped once the payment is marked rolled up.
+
+`compute_dashboard_totals` computes the same figures from source data in one
+aggregation; it is the fallback until rollups exist. Rebuild the rollups from
+source data with:
+
+    python rollups.py --rebuild
+"""
+import asyncio
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from availability import ACTIVE_BOOKING_STATUSES
+
+ALL_TIME = "all"
+
+def _day(value: Any) -> str:
+    """YYYY-MM-DD for a datetime or ISO string"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    return str(value)[:10]
+
+async def _inc(db, date: str, fields: Dict[str, float]) -> None:
+    await db.daily_stats.update_one(
+        {"date": date},
+        {"$inc": fields, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+async def record_booking_created(db, booking: Dict[str, Any]) -> None:
+    if booking['status'] in ACTIVE_BOOKING_STATUSES:
+        await _inc(db, booking['booking_date'], {"bookings_active": 1})
+
+async def record_booking_status_change(db, booking: Dict[str, Any], new_status: str) -> None:
+    """Adjust active booking counts for a status transition"""
+    was_active = booking['status'] in ACTIVE_BOOKING_STATUSES
+    is_active = new_status in ACTIVE_BOOKING_STATUSES
+    if was_active != is_active:
+        await _inc(db, booking['booking_date'], {"bookings_active": 1 if is_active else -1})
+    else:
+        # Counts are unchanged, but readers caching per date (analytics) must see the change
+        await db.daily_stats.update_one(
+            {"date": booking['booking_date']},
+            {"$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+async def record_payment_created(db, payment: Dict[str, Any]) -> None:
+    if payment['status'] == "pending":
+        await _inc(db, ALL_TIME, {"payments_pending": 1})
+
+async def _inc_once(db, date: str, fields: Dict[str, float], key: str) -> None:
+    try:
+        await db.daily_stats.update_one(
+            {"date": date, "applying": {"$ne": key}},
+            {"$inc": fields, "$push": {"applying": key}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The document exists and already holds this increment
+        pass
+
+async def record_payment_transition(db, payment: Dict[str, Any]) -> None:
+    """Count a payment's last status change (to paid or failed) exactly once"""
+    changes: Dict[str, Dict[str, float]] = {}
+    if payment['status'] == "paid":
+        changes[_day(payment['paid_at'])] = {"revenue": payment['amount'], "payments_paid": 1}
+    if payment.get('previous_status') == "pending":
+        changes[ALL_TIME] = {"payments_pending": -1}
+    for date, fields in changes.items():
+        await _inc_once(db, date, fields, payment['id'])
+    await db.payments.update_one({"id": payment['id']}, {"$set": {"rolled_up": True}})
+    if changes:
+        await db.daily_stats.update_many(
+            {"date": {"$in": list(changes)}}, {"$pull": {"applying": payment['id']}}
+        )
+
+async def read_dashboard_totals(db, today: str, month_start: str) -> Optional[Dict[str, Any]]:
+    """Dashboard figures from rollups, or None if rollups have not been built"""
+    docs = await db.daily_stats.find(
+        {"$or": [{"date": {"$gte": month_start, "$lte": today}}, {"date": ALL_TIME}]},
+        {"_id": 0}
+    ).to_list(None)
+    by_date = {doc['date']: doc for doc in docs}
+    if ALL_TIME not in by_date:
+        return None
+
+    return {
+        "total_bookings_today": by_date.get(today, {}).get('bookings_active', 0),
+        "total_revenue_month": sum(
+            doc.get('revenue', 0) for date, doc in by_date.items() if date != ALL_TIME
+        ),
+        "pending_payments": by_date[ALL_TIME].get('payments_pending', 0),
+    }
+
+async def compute_dashboard_totals(db, today: str, month_start: str) -> Dict[str, Any]:
+    """All dashboard figures from source data in a single aggregation"""
+    pipeline = [
+        {"$match": {"booking_date": today, "status": {"$in": ACTIVE_BOOKING_STATUSES}}},
+        {"$project": {"_id": 0, "kind": {"$literal": "booking"}}},
+        {"$unionWith": {"coll": "payments", "pipeline": [
+            {"$match": {"$or": [
+                {"status": "paid", "paid_at": {"$gte": month_start}},
+                {"status": "pending"}
+            ]}},
+            {"$project": {"_id": 0, "kind": "$status", "amount": 1}}
+        ]}},
+        {"$unionWith": {"coll": "users", "pipeline": [
+            {"$match": {"role": "instructor", "is_active": True}},
+            {"$project": {"_id": 0, "kind": {"$literal": "instructor"}}}
+        ]}},
+        {"$facet": {
+            "bookings_today": [{"$match": {"kind": "booking"}}, {"$count": "n"}],
+            "revenue": [
+                {"$match": {"kind": "paid"}},
+                {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+            ],
+            "pending": [{"$match": {"kind": "pending"}}, {"$count": "n"}],
+            "instructors": [{"$match": {"kind": "instructor"}}, {"$count": "n"}]
+        }}
+    ]
+    result = (await db.bookings.aggregate(pipeline).to_list(1))[0]
+
+    def first(facet, field):
+        return result[facet][0][field] if result[facet] else 0
+
+    return {
+        "total_bookings_today": first("bookings_today", "n"),
+        "total_revenue_month": first("revenue", "total"),
+        "active_instructors": first("instructors", "n"),
+        "pending_payments": first("pending", "n"),
+    }
+
+async def rebuild_daily_stats(db) -> int:
+    """Recompute every rollup document from bookings and payments"""
+    rollups: Dict[str, Dict[str, float]] = {}
+    # Payment changes not rolled up yet are part of the recount
+    await db.payments.update_many({"rolled_up": False}, {"$set": {"rolled_up": True}})
+
+    async for row in db.bookings.aggregate([
+        {"$match": {"status": {"$in": ACTIVE_BOOKING_STATUSES}}},
+        {"$group": {"_id": "$booking_date", "count": {"$sum": 1}}}
+    ]):
+        rollups.setdefault(row['_id'], {})['bookings_active'] = row['count']
+
+    async for row in db.payments.aggregate([
+        {"$match": {"status": "paid", "paid_at": {"$ne": None}}},
+        {"$group": {
+            "_id": {"$substrBytes": [{"$toString": "$paid_at"}, 0, 10]},
+            "revenue": {"$sum": "$amount"},
+            "count": {"$sum": 1}
+        }}
+    ]):
+        day = rollups.setdefault(row['_id'], {})
+        day['revenue'] = row['revenue']
+        day['payments_paid'] = row['count']
+
+    pending = await db.payments.count_documents({"status": "pending"})
+    rollups[ALL_TIME] = {"payments_pending": pending}
+
+    now = datetime.utcnow()
+    await db.daily_stats.delete_many({"date": {"$nin": list(rollups)}})
+    await db.daily_stats.bulk_write([
+        UpdateOne(
+            {"date": date},
+            {"$set": {
+                "bookings_active": fields.get('bookings_active', 0),
+                "revenue": fields.get('revenue', 0),
+                "payments_paid": fields.get('payments_paid', 0),
+                **({"payments_pending": fields['payments_pending']} if date == ALL_TIME else {}),
+                "applying": [],
+                "updated_at": now
+            }},
+            upsert=True
+        )
+        for date, fields in rollups.items()
+    ], ordered=False)
+    return len(rollups)
+
+async def refresh_booking_counts(db, dates: Iterable[str]) -> None:
+    """Recompute the active booking counts of some dates from bookings"""
+    counts = {date: 0 for date in dates}
+    if not counts:
+        return
+    async for row in db.bookings.aggregate([
+        {"$match": {"booking_date": {"$in": list(counts)}, "status": {"$in": ACTIVE_BOOKING_STATUSES}}},
+        {"$group": {"_id": "$booking_date", "count": {"$sum": 1}}}
+    ]):
+        counts[row['_id']] = row['count']
+
+    now = datetime.utcnow()
+    await db.daily_stats.bulk_write([
+        UpdateOne({"date": date}, {"$set": {"bookings_active": count, "updated_at": now}}, upsert=True)
+        for date, count in counts.items()
+    ], ordered=False)
+
+async def ensure_daily_stats(db) -> None:
+    """Build the rollups from source data if they have never been built"""
+    if not await db.daily_stats.find_one({"date": ALL_TIME}, {"_id": 1}):
+        await rebuild_daily_stats(db)
+
+async def main():
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from database import connect_to_mongo, get_database, close_mongo_connection
+
+    load_dotenv(Path(__file__).parent / '.env')
+    await connect_to_mongo()
+    count = await rebuild_daily_stats(await get_database())
+    print(f"✓ Rebuilt {count} daily_stats documents")
+    await close_mongo_connection()
+
+if __name__ == "__main__":
+    if "--rebuild" not in sys.argv:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(main())
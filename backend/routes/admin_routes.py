@@ -1,47 +1,54 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List, Dict, Any
-from datetime import datetime, timedelta
+from fastapi import APIRouter, File, HTTPException, Query, UploadFile, status, Depends
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List, Dict, Any, Optional
+from datetime import date, datetime, timedelta
 from models import (
     User, UserRole, DashboardStats, InstructorSchedule, 
-    InstructorScheduleCreate, TimeSlot, SpotLocation
+    InstructorScheduleCreate, InstructorScheduleBulk, TimeSlot, SpotLocation, Booking, Course,
+    AvailabilityRule, AvailabilityRuleCreate, AvailabilityClosure
 )
-from auth import get_current_user_id
 from database import get_database
+from principal import Principal, get_principal, principal_cache
+from loaders import BookingRelationsLoader
+from slot_inventory import refresh_instructor, rebuild
+from rollups import read_dashboard_totals, compute_dashboard_totals
+from pagination import PageParams, fetch_page, cursor_headers, iterate, stream_ndjson, stream_ndjson_chunks
+from responses import DocumentResponse, dumps, shape
+from projections import model_projection, fields_projection, EXISTS
+from analytics import AnalyticsError, date_range, instructor_report, parse_dimensions, sales_report
+from assignment import AssignmentError, reoptimize_day
+from data_transfer import FORMATS, DataTransferError, dataset, export_chunks, file_format, import_frames, read_frames
+from schedules import MAX_BULK_SCHEDULE_ENTRIES, ScheduleTemplateError, apply_schedules, expand
+from availability_rules import (
+    RULE_HORIZON_DAYS, AvailabilityRuleError, availability_rules, effective_schedules, rule_window,
+    validate_rule
+)
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-async def verify_admin_access(user_id: str):
-    """Helper to verify admin access"""
-    db = await get_database()
-    user = await db.users.find_one({"id": user_id})
-    if not user or user.get('role') not in ['admin', 'owner']:
+async def verify_admin_access(principal: Principal = Depends(get_principal)) -> Principal:
+    """Dependency verifying admin access"""
+    if not principal.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required"
         )
-    return user
+    return principal
 
 @router.get("/dashboard", response_model=DashboardStats)
-async def get_dashboard_stats(user_id: str = Depends(get_current_user_id)):
+async def get_dashboard_stats(admin: Principal = Depends(verify_admin_access)):
     """Get dashboard statistics"""
-    await verify_admin_access(user_id)
     db = await get_database()
     
     today = datetime.utcnow().date().isoformat()  # Convert to string
     month_start = today[:7] + "-01"  # Get YYYY-MM-01 format
     
-    # Count today's bookings
-    today_bookings = await db.bookings.count_documents({
-        "booking_date": today,  # today is already a string
-        "status": {"$in": ["confirmed", "pending"]}
-    })
-    
-    # Calculate month revenue
-    month_payments = await db.payments.find({
-        "status": "paid",
-        "paid_at": {"$gte": month_start}
-    }).to_list(1000)
-    month_revenue = sum(p['amount'] for p in month_payments)
+    # Today's bookings, month revenue and pending payments from the daily rollups
+    totals = await read_dashboard_totals(db, today, month_start)
+    if totals is None:
+        # Rollups not built yet: compute everything in one aggregation
+        return DashboardStats(**await compute_dashboard_totals(db, today, month_start))
     
     # Count active instructors
     active_instructors = await db.users.count_documents({
@@ -49,74 +56,128 @@ async def get_dashboard_stats(user_id: str = Depends(get_current_user_id)):
         "is_active": True
     })
     
-    # Count pending payments
-    pending_payments = await db.payments.count_documents({
-        "status": "pending"
-    })
+    return DashboardStats(active_instructors=active_instructors, **totals)
+
+@router.get("/analytics/revenue")
+async def get_revenue_analytics(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    by: str = "spot",
+    admin: Principal = Depends(verify_admin_access)
+):
+    """Revenue, bookings and no-show rates grouped by spot, course_type, day, week and/or month"""
+    db = await get_database()
     
-    return DashboardStats(
-        total_bookings_today=today_bookings,
-        total_revenue_month=month_revenue,
-        active_instructors=active_instructors,
-        pending_payments=pending_payments
-    )
+    try:
+        date_from, date_to = date_range(date_from, date_to)
+        dimensions = parse_dimensions(by)
+    except AnalyticsError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    
+    return await sales_report(db, date_from, date_to, dimensions)
+
+@router.get("/analytics/instructors")
+async def get_instructor_analytics(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    by: str = "",
+    admin: Principal = Depends(verify_admin_access)
+):
+    """Scheduled and booked hours, utilization and no-show rate per instructor"""
+    db = await get_database()
+    
+    try:
+        date_from, date_to = date_range(date_from, date_to)
+        dimensions = parse_dimensions(by, ("day", "week", "month"))
+    except AnalyticsError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    
+    return await instructor_report(db, date_from, date_to, dimensions)
 
 @router.get("/users", response_model=List[User])
-async def get_all_users(user_id: str = Depends(get_current_user_id)):
+async def get_all_users(
+    page: PageParams = Depends(),
+    admin: Principal = Depends(verify_admin_access)
+):
     """Get all users"""
-    await verify_admin_access(user_id)
     db = await get_database()
     
-    users = await db.users.find({}).to_list(1000)
-    # Remove sensitive data
-    for user in users:
-        user.pop('hashed_password', None)
+    # Public user fields only (no password hash), plus _id for the cursor
+    projection = model_projection(User, with_id=True)
     
-    return [User(**user) for user in users]
+    if page.stream:
+        return stream_ndjson(
+            iterate(db.users, {}, page.after, projection),
+            lambda user: dumps(shape(User, user))
+        )
+    
+    users, next_cursor = await fetch_page(db.users, {}, page, projection)
+    return DocumentResponse(
+        [shape(User, user) for user in users], headers=cursor_headers(next_cursor)
+    )
 
 @router.get("/instructors", response_model=List[User])
-async def get_instructors(user_id: str = Depends(get_current_user_id)):
+async def get_instructors(
+    page: PageParams = Depends(),
+    admin: Principal = Depends(verify_admin_access)
+):
     """Get all instructors"""
-    await verify_admin_access(user_id)
     db = await get_database()
     
-    instructors = await db.users.find({
-        "role": "instructor",
-        "is_active": True
-    }).to_list(1000)
+    query = {"role": "instructor", "is_active": True}
+    # Public user fields only (no password hash), plus _id for the cursor
+    projection = model_projection(User, with_id=True)
     
-    # Remove sensitive data
-    for instructor in instructors:
-        instructor.pop('hashed_password', None)
+    if page.stream:
+        return stream_ndjson(
+            iterate(db.users, query, page.after, projection),
+            lambda instructor: dumps(shape(User, instructor))
+        )
     
-    return [User(**instructor) for instructor in instructors]
+    instructors, next_cursor = await fetch_page(db.users, query, page, projection)
+    return DocumentResponse(
+        [shape(User, instructor) for instructor in instructors], headers=cursor_headers(next_cursor)
+    )
 
 @router.post("/instructor-schedule")
 async def create_instructor_schedule(
     schedule_data: InstructorScheduleCreate,
-    user_id: str = Depends(get_current_user_id)
+    admin: Principal = Depends(verify_admin_access)
 ):
     """Create instructor schedule"""
-    await verify_admin_access(user_id)
     db = await get_database()
     
     # Check if instructor exists
     instructor = await db.users.find_one({
         "id": schedule_data.instructor_id,
         "role": "instructor"
-    })
+    }, EXISTS)
     if not instructor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Instructor not found"
         )
     
+    try:
+        date.fromisoformat(schedule_data.date)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Date must be in YYYY-MM-DD format"
+        )
+    
     # Check if schedule already exists for this date/instructor/spot
     existing = await db.instructor_schedules.find_one({
         "instructor_id": schedule_data.instructor_id,
-        "date": schedule_data.date.isoformat(),
+        "date": schedule_data.date,
         "spot": schedule_data.spot.value
-    })
+    }, fields_projection("id"))
     
     if existing:
         # Update existing schedule
@@ -127,46 +188,283 @@ async def create_instructor_schedule(
                 "is_available": True
             }}
         )
+        await refresh_instructor(db, schedule_data.instructor_id, schedule_data.date)
         return {"message": "Schedule updated", "schedule_id": existing['id']}
     else:
         # Create new schedule
         schedule = InstructorSchedule(**schedule_data.dict())
         await db.instructor_schedules.insert_one(schedule.dict())
+        await refresh_instructor(db, schedule_data.instructor_id, schedule_data.date)
         return {"message": "Schedule created", "schedule_id": schedule.id}
 
+@router.post("/instructor-schedules/bulk")
+async def create_instructor_schedules_bulk(
+    bulk_data: InstructorScheduleBulk,
+    admin: Principal = Depends(verify_admin_access)
+):
+    """Create or update many instructor schedules at once"""
+    db = await get_database()
+    
+    try:
+        entries = expand(bulk_data)
+    except ScheduleTemplateError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    if not entries:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No schedule entries given"
+        )
+    if len(entries) > MAX_BULK_SCHEDULE_ENTRIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_SCHEDULE_ENTRIES} schedule entries per request"
+        )
+    
+    return await apply_schedules(db, entries)
+
 @router.get("/instructor-schedules/{instructor_id}")
 async def get_instructor_schedules(
     instructor_id: str,
     start_date: str,
     end_date: str,
-    user_id: str = Depends(get_current_user_id)
+    page: PageParams = Depends(),
+    admin: Principal = Depends(verify_admin_access)
 ):
-    """Get instructor schedules for date range"""
-    await verify_admin_access(user_id)
+    """Get instructor schedules for date range
+
+    Recurring rules are expanded for the range and per-day schedules override
+    them. Pages are ordered by date and spot; the cursor is "<date>|<spot>".
+    """
     db = await get_database()
     
-    schedules = await db.instructor_schedules.find({
-        "instructor_id": instructor_id,
-        "date": {
-            "$gte": start_date,
-            "$lte": end_date
-        }
-    }).to_list(1000)
+    try:
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Dates must be in YYYY-MM-DD format"
+        )
+    if end < start or (end - start).days >= RULE_HORIZON_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range must span 1 to {RULE_HORIZON_DAYS} days"
+        )
+    
+    schedules = await effective_schedules(
+        db, start_date, end_date, instructor_ids=[instructor_id], include_unavailable=True
+    )
+    if page.after is not None:
+        schedules = [
+            schedule for schedule in schedules if f"{schedule['date']}|{schedule['spot']}" > page.after
+        ]
+    
+    if page.stream:
+        async def rows():
+            for schedule in schedules:
+                yield schedule
+        return stream_ndjson(rows(), lambda schedule: dumps(shape(InstructorSchedule, schedule)))
     
-    return [InstructorSchedule(**schedule) for schedule in schedules]
+    next_cursor = None
+    if len(schedules) > page.limit:
+        schedules = schedules[:page.limit]
+        next_cursor = f"{schedules[-1]['date']}|{schedules[-1]['spot']}"
+    return DocumentResponse(
+        [shape(InstructorSchedule, schedule) for schedule in schedules], headers=cursor_headers(next_cursor)
+    )
+
+async def _refresh_rule_windows(db, *rules: Dict[str, Any]) -> None:
+    """Reload the rules and rebuild the slot inventory over their dates"""
+    availability_rules.invalidate()
+    today = datetime.utcnow().date().isoformat()
+    windows = [window for window in (rule_window(rule, today) for rule in rules) if window]
+    if windows:
+        await rebuild(db, min(first for first, _ in windows), to_date=max(last for _, last in windows))
+
+def _validated_rule(rule_data: AvailabilityRuleCreate) -> Dict[str, Any]:
+    rule = rule_data.model_dump(mode="json")
+    try:
+        validate_rule(rule)
+    except AvailabilityRuleError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    return rule
+
+async def _require_instructor(db, instructor_id: str) -> None:
+    instructor = await db.users.find_one({
+        "id": instructor_id,
+        "role": "instructor"
+    }, EXISTS)
+    if not instructor:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Instructor not found"
+        )
+
+@router.post("/availability-rules", response_model=AvailabilityRule)
+async def create_availability_rule(
+    rule_data: AvailabilityRuleCreate,
+    admin: Principal = Depends(verify_admin_access)
+):
+    """Create a recurring availability rule for an instructor"""
+    db = await get_database()
+    
+    _validated_rule(rule_data)
+    await _require_instructor(db, rule_data.instructor_id)
+    
+    rule = AvailabilityRule(**rule_data.model_dump())
+    await db.availability_rules.insert_one(rule.model_dump())
+    await _refresh_rule_windows(db, rule.model_dump())
+    return rule
+
+@router.get("/availability-rules", response_model=List[AvailabilityRule])
+async def get_availability_rules(
+    instructor_id: Optional[str] = None,
+    admin: Principal = Depends(verify_admin_access)
+):
+    """Get active availability rules, optionally for one instructor"""
+    db = await get_database()
+    
+    query: Dict[str, Any] = {"is_active": True}
+    if instructor_id is not None:
+        query["instructor_id"] = instructor_id
+    rules = await db.availability_rules.find(query, model_projection(AvailabilityRule)).to_list(None)
+    return DocumentResponse([shape(AvailabilityRule, rule) for rule in rules])
+
+@router.put("/availability-rules/{rule_id}", response_model=AvailabilityRule)
+async def update_availability_rule(
+    rule_id: str,
+    rule_data: AvailabilityRuleCreate,
+    admin: Principal = Depends(verify_admin_access)
+):
+    """Replace an availability rule's pattern"""
+    db = await get_database()
+    
+    rule = _validated_rule(rule_data)
+    await _require_instructor(db, rule_data.instructor_id)
+    previous = await db.availability_rules.find_one_and_update(
+        {"id": rule_id, "is_active": True},
+        {"$set": rule},
+        projection=model_projection(AvailabilityRule)
+    )
+    if not previous:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Availability rule not found"
+        )
+    
+    # Dates the old pattern covered lose its slots, new ones gain them
+    await _refresh_rule_windows(db, previous, rule)
+    return DocumentResponse(shape(AvailabilityRule, {**previous, **rule}))
+
+@router.delete("/availability-rules/{rule_id}")
+async def delete_availability_rule(
+    rule_id: str,
+    admin: Principal = Depends(verify_admin_access)
+):
+    """Deactivate an availability rule"""
+    db = await get_database()
+    
+    previous = await db.availability_rules.find_one_and_update(
+        {"id": rule_id, "is_active": True},
+        {"$set": {"is_active": False}},
+        projection=model_projection(AvailabilityRule)
+    )
+    if not previous:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Availability rule not found"
+        )
+    
+    await _refresh_rule_windows(db, previous)
+    return {"message": "Availability rule deactivated", "rule_id": rule_id}
+
+@router.post("/availability-rules/closures")
+async def close_availability(
+    closure: AvailabilityClosure,
+    admin: Principal = Depends(verify_admin_access)
+):
+    """Close dates (days off, storm closures) for some or all instructors and spots"""
+    db = await get_database()
+    
+    try:
+        dates = sorted({date.fromisoformat(day).isoformat() for day in closure.dates})
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Dates must be in YYYY-MM-DD format"
+        )
+    if not dates:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No dates given"
+        )
+    
+    scope: Dict[str, Any] = {}
+    if closure.spot is not None:
+        scope["spot"] = closure.spot.value
+    if closure.instructor_ids is not None:
+        scope["instructor_id"] = {"$in": closure.instructor_ids}
+    
+    # Rules skip the dates, and per-day schedules for them are switched off
+    rules = await db.availability_rules.update_many(
+        {**scope, "is_active": True},
+        {"$addToSet": {"exceptions": {"$each": dates}}}
+    )
+    schedules = await db.instructor_schedules.update_many(
+        {**scope, "date": {"$in": dates}, "is_available": True},
+        {"$set": {"is_available": False}}
+    )
+    
+    availability_rules.invalidate()
+    await rebuild(db, dates[0], to_date=dates[-1])
+    return {
+        "message": "Availability closed",
+        "dates": dates,
+        "rules_updated": rules.modified_count,
+        "schedules_closed": schedules.modified_count
+    }
+
+@router.post("/assignments/reoptimize")
+async def reoptimize_assignments(
+    day: str = Query(..., alias="date"),
+    apply: bool = False,
+    admin: Principal = Depends(verify_admin_access)
+):
+    """Rebalance instructor assignments for a day (dry run unless apply=true)"""
+    db = await get_database()
+    
+    try:
+        day = date.fromisoformat(day).isoformat()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Date must be in YYYY-MM-DD format"
+        )
+    
+    try:
+        return await reoptimize_day(db, day, apply=apply)
+    except AssignmentError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
 
 @router.patch("/users/{target_user_id}/role")
 async def update_user_role(
     target_user_id: str,
     new_role: UserRole,
-    user_id: str = Depends(get_current_user_id)
+    admin: Principal = Depends(verify_admin_access)
 ):
     """Update user role"""
-    user = await verify_admin_access(user_id)
     db = await get_database()
     
     # Only owners can promote to admin/owner
-    if new_role in [UserRole.ADMIN, UserRole.OWNER] and user.get('role') != 'owner':
+    if new_role in [UserRole.ADMIN, UserRole.OWNER] and admin.role != 'owner':
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only owners can assign admin/owner roles"
@@ -184,35 +482,126 @@ async def update_user_role(
             detail="User not found"
         )
     
+    principal_cache.invalidate(target_user_id)
+    # Instructors gain or lose their upcoming slots
+    today = datetime.utcnow().date().isoformat()
+    await refresh_instructor(db, target_user_id, {"$gte": today})
     return {"message": "User role updated", "new_role": new_role.value}
 
+@router.patch("/users/{target_user_id}/active")
+async def update_user_active(
+    target_user_id: str,
+    is_active: bool,
+    admin: Principal = Depends(verify_admin_access)
+):
+    """Activate or deactivate a user"""
+    db = await get_database()
+    
+    result = await db.users.update_one(
+        {"id": target_user_id},
+        {"$set": {"is_active": is_active}}
+    )
+    
+    if result.matched_count == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    principal_cache.invalidate(target_user_id)
+    # Instructors gain or lose their upcoming slots
+    today = datetime.utcnow().date().isoformat()
+    await refresh_instructor(db, target_user_id, {"$gte": today})
+    return {"message": "User updated", "is_active": is_active}
+
+async def _today_booking_documents(db, bookings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Bookings with customer, instructor and course, loaded in one batch"""
+    loader = BookingRelationsLoader(db)
+    await loader.load(bookings)
+    return [
+        {
+            "booking": shape(Booking, booking_doc),
+            "customer": shape(User, loader.user(booking_doc['customer_id'])),
+            "instructor": shape(User, loader.user(booking_doc.get('instructor_id'))),
+            "course": shape(Course, loader.course(booking_doc['course_id']))
+        }
+        for booking_doc in bookings
+    ]
+
 @router.get("/bookings/today")
-async def get_today_bookings(user_id: str = Depends(get_current_user_id)):
+async def get_today_bookings(page: PageParams = Depends(), admin: Principal = Depends(verify_admin_access)):
     """Get all bookings for today"""
-    await verify_admin_access(user_id)
     db = await get_database()
     
     today = datetime.utcnow().date().isoformat()  # Convert to string
-    bookings = await db.bookings.find({
+    query = {
         "booking_date": today,  # today is already a string
         "status": {"$in": ["confirmed", "pending"]}
-    }).to_list(1000)
-    
-    # Enrich with customer and instructor data
-    enriched_bookings = []
-    for booking_doc in bookings:
-        customer = await db.users.find_one({"id": booking_doc['customer_id']})
-        instructor = None
-        if booking_doc.get('instructor_id'):
-            instructor = await db.users.find_one({"id": booking_doc['instructor_id']})
-        
-        course = await db.courses.find_one({"id": booking_doc['course_id']})
+    }
+    
+    if page.stream:
+        async def serialize_chunk(bookings):
+            return [dumps(details) for details in await _today_booking_documents(db, bookings)]
         
-        enriched_bookings.append({
-            "booking": booking_doc,
-            "customer": customer,
-            "instructor": instructor,
-            "course": course
-        })
-    
-    return enriched_bookings
\ No newline at end of file
+        return stream_ndjson_chunks(
+            iterate(db.bookings, query, page.after, model_projection(Booking)), serialize_chunk
+        )
+    
+    bookings, next_cursor = await fetch_page(
+        db.bookings, query, page, model_projection(Booking, with_id=True)
+    )
+    return DocumentResponse(
+        await _today_booking_documents(db, bookings), headers=cursor_headers(next_cursor)
+    )
+
+@router.get("/bookings/export")
+async def export_bookings(after: Optional[str] = None, admin: Principal = Depends(verify_admin_access)):
+    """Stream every booking as NDJSON"""
+    db = await get_database()
+    
+    return stream_ndjson(iterate(db.bookings, {}, after, model_projection(Booking)))
+
+@router.get("/export/{name}")
+async def export_dataset(
+    name: str,
+    fmt: str = Query("csv", alias="format"),
+    admin: Principal = Depends(verify_admin_access)
+):
+    """Stream bookings, users or schedules as a CSV or Parquet file"""
+    db = await get_database()
+    
+    try:
+        dataset(name)
+        fmt = file_format(fmt)
+    except DataTransferError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    
+    return StreamingResponse(
+        export_chunks(db, name, fmt),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'}
+    )
+
+@router.post("/import/{name}")
+async def import_dataset(
+    name: str,
+    file: UploadFile = File(...),
+    fmt: Optional[str] = Query(None, alias="format"),
+    mode: str = "insert",
+    admin: Principal = Depends(verify_admin_access)
+):
+    """Import a CSV or Parquet file, reporting rows that could not be imported"""
+    db = await get_database()
+    
+    try:
+        dataset(name)
+        fmt = file_format(fmt, file.filename)
+        return await import_frames(db, name, read_frames(file.file, fmt), mode, run=run_in_threadpool)
+    except DataTransferError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
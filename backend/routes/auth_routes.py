@@ -1,8 +1,10 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from datetime import timedelta
 from models import User, UserCreate, UserLogin, UserRole
-from auth import verify_password, get_password_hash, create_access_token, get_current_user_id
+from auth import password_hasher, create_access_token, get_current_user_id
 from database import get_database
+from projections import model_projection, fields_projection, EXISTS
+from responses import DocumentResponse, shape
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
@@ -11,7 +13,7 @@ async def register(user_data: UserCreate):
     db = await get_database()
     
     # Check if user exists
-    existing_user = await db.users.find_one({"email": user_data.email})
+    existing_user = await db.users.find_one({"email": user_data.email}, EXISTS)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -19,7 +21,7 @@ async def register(user_data: UserCreate):
         )
     
     # Hash password and create user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     user_dict = user_data.dict()
     del user_dict['password']
     
@@ -53,13 +55,28 @@ async def login(login_data: UserLogin):
     db = await get_database()
     
     # Find user
-    user_doc = await db.users.find_one({"email": login_data.email})
-    if not user_doc or not verify_password(login_data.password, user_doc.get('hashed_password', '')):
+    user_doc = await db.users.find_one(
+        {"email": login_data.email},
+        fields_projection("id", "email", "first_name", "last_name", "role", "is_active", "hashed_password")
+    )
+    password_valid, upgraded_hash = False, None
+    if user_doc and user_doc.get('hashed_password'):
+        password_valid, upgraded_hash = await password_hasher.verify_and_update(
+            login_data.password, user_doc['hashed_password']
+        )
+    if not password_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    # Re-hash passwords stored with a lower bcrypt cost than configured
+    if upgraded_hash:
+        await db.users.update_one(
+            {"id": user_doc['id']},
+            {"$set": {"hashed_password": upgraded_hash}}
+        )
+    
     if not user_doc.get('is_active', True):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -89,19 +106,12 @@ async def login(login_data: UserLogin):
 async def get_current_user(user_id: str = Depends(get_current_user_id)):
     db = await get_database()
     
-    user_doc = await db.users.find_one({"id": user_id})
+    # Only the public user fields; never the password hash or ObjectId
+    user_doc = await db.users.find_one({"id": user_id}, model_projection(User))
     if not user_doc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Remove sensitive data and non-serializable fields
-    user_doc.pop('hashed_password', None)
-    user_doc.pop('_id', None)  # Remove MongoDB ObjectId
-    
-    # Convert datetime to string if present
-    if 'created_at' in user_doc and hasattr(user_doc['created_at'], 'isoformat'):
-        user_doc['created_at'] = user_doc['created_at'].isoformat()
-    
-    return user_doc
\ No newline at end of file
+    return DocumentResponse(shape(User, user_doc))
\ No newline at end of file
@@ -1,12 +1,23 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 from typing import List, Dict, Any
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from models import (
     Booking, BookingCreate, BookingDetails, BookingStatus, 
-    AvailabilityCheck, TimeSlot, SpotLocation, User, Course
+    AvailabilityCheck, TimeSlot, SpotLocation
 )
-from auth import get_current_user_id
+from principal import Principal, get_principal
 from database import get_database
+from availability import ACTIVE_BOOKING_STATUSES
+from availability_calendar import availability_calendar, MAX_CALENDAR_DAYS
+from slot_inventory import read_available_slots, mark_booked, refresh_instructor
+from assignment import occupancy_from_inventory, rank_candidates
+from reservations import reserve_slot, release_slot
+from rollups import record_booking_created, record_booking_status_change
+from loaders import BookingRelationsLoader
+from catalog import course_catalog
+from pagination import PageParams, fetch_page, cursor_headers, iterate, stream_ndjson_chunks
+from responses import DocumentResponse, dumps
+from projections import model_projection, fields_projection
 
 router = APIRouter(prefix="/bookings", tags=["bookings"])
 
@@ -16,46 +27,18 @@ async def check_availability(availability: AvailabilityCheck):
     db = await get_database()
     
     # Get course details
-    course = await db.courses.find_one({"id": availability.course_id})
+    await course_catalog.ensure_fresh(db)
+    course = course_catalog.get(availability.course_id)
     if not course:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Course not found"
         )
     
-    # Find available instructors for that date/spot
-    instructors = await db.users.find({
-        "role": "instructor",
-        "is_active": True
-    }).to_list(1000)
-    
-    # Check instructor schedules
-    available_slots = []
-    for instructor in instructors:
-        schedule = await db.instructor_schedules.find_one({
-            "instructor_id": instructor['id'],
-            "date": availability.booking_date,  # booking_date is already a string
-            "spot": availability.spot.value,
-            "is_available": True
-        })
-        
-        if schedule:
-            # Check for conflicts with existing bookings
-            for slot in schedule.get('available_slots', []):
-                existing_booking = await db.bookings.find_one({
-                    "instructor_id": instructor['id'],
-                    "booking_date": availability.booking_date,  # booking_date is already a string
-                    "time_slot.start_time": slot['start_time'],
-                    "status": {"$in": ["pending", "confirmed"]}
-                })
-                
-                if not existing_booking:
-                    available_slots.append({
-                        "instructor_id": instructor['id'],
-                        "instructor_name": f"{instructor['first_name']} {instructor['last_name']}",
-                        "time_slot": slot,
-                        "available": True
-                    })
+    # Free instructor slots for that date/spot from the slot inventory
+    available_slots = await read_available_slots(
+        db, availability.booking_date, availability.spot.value
+    )
     
     return {
         "available": len(available_slots) > 0,
@@ -63,21 +46,52 @@ async def check_availability(availability: AvailabilityCheck):
         "course": course
     }
 
-@router.post("/", response_model=Booking)
-async def create_booking(booking_data: BookingCreate, user_id: str = Depends(get_current_user_id)):
-    """Create a new booking"""
+@router.get("/availability-calendar")
+async def get_availability_calendar(
+    course_id: str,
+    spot: SpotLocation,
+    date_from: str = Query(..., alias="from"),
+    date_to: str = Query(..., alias="to")
+):
+    """Get free slot counts for every day in a date range"""
     db = await get_database()
-    
-    # Get customer info
-    customer = await db.users.find_one({"id": user_id})
-    if not customer:
+
+    await course_catalog.ensure_fresh(db)
+    if not course_catalog.get(course_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Customer not found"
+            detail="Course not found"
         )
+
+    try:
+        start, end = date.fromisoformat(date_from), date.fromisoformat(date_to)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Dates must be in YYYY-MM-DD format"
+        )
+    if end < start or (end - start).days >= MAX_CALENDAR_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range must span 1 to {MAX_CALENDAR_DAYS} days"
+        )
+
+    return {
+        "course_id": course_id,
+        "spot": spot,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "days": await availability_calendar(db, spot.value, start, end)
+    }
+
+@router.post("/", response_model=Booking)
+async def create_booking(booking_data: BookingCreate, principal: Principal = Depends(get_principal)):
+    """Create a new booking"""
+    db = await get_database()
     
     # Get course details
-    course = await db.courses.find_one({"id": booking_data.course_id})
+    await course_catalog.ensure_fresh(db)
+    course = course_catalog.get(booking_data.course_id)
     if not course:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -89,40 +103,35 @@ async def create_booking(booking_data: BookingCreate, user_id: str = Depends(get
     total_price = base_price * booking_data.number_of_students
     deposit_amount = total_price * 0.3  # 30% deposit
     
-    # Find available instructor
-    instructors = await db.users.find({
-        "role": "instructor",
-        "is_active": True
-    }).to_list(1000)
+    # Candidate instructors with a free slot at the requested start time
+    candidate_slots = await read_available_slots(
+        db,
+        booking_data.booking_date,
+        booking_data.spot.value,
+        start_time=booking_data.time_slot.start_time
+    )
     
-    assigned_instructor = None
-    for instructor in instructors:
-        schedule = await db.instructor_schedules.find_one({
-            "instructor_id": instructor['id'],
-            "date": booking_data.booking_date,  # booking_date is already a string
-            "spot": booking_data.spot.value,
-            "is_available": True
-        })
-        
-        if schedule:
-            # Check if time slot is available
-            slot_available = any(
-                slot['start_time'] == booking_data.time_slot.start_time
-                for slot in schedule.get('available_slots', [])
-            )
-            
-            if slot_available:
-                # Check for conflicts
-                existing_booking = await db.bookings.find_one({
-                    "instructor_id": instructor['id'],
-                    "booking_date": booking_data.booking_date,  # booking_date is already a string
-                    "time_slot.start_time": booking_data.time_slot.start_time,
-                    "status": {"$in": ["pending", "confirmed"]}
-                })
-                
-                if not existing_booking:
-                    assigned_instructor = instructor['id']
-                    break
+    booking = Booking(
+        customer_id=principal.id,
+        total_price=total_price,
+        deposit_amount=deposit_amount,
+        **booking_data.dict()
+    )
+    
+    # Cheapest candidate first (load balance, contiguous free time), then
+    # atomically reserve the slot with the first one still free
+    candidate_ids = [slot['instructor_id'] for slot in candidate_slots]
+    if len(candidate_ids) > 1:
+        occupancy = await occupancy_from_inventory(db, booking_data.booking_date, candidate_ids)
+        candidate_ids = rank_candidates(occupancy, candidate_ids, booking_data.time_slot.start_time)
+    assigned_instructor = await reserve_slot(
+        db,
+        candidate_ids,
+        booking_data.booking_date,
+        booking_data.spot.value,
+        booking_data.time_slot.start_time,
+        booking.id
+    )
     
     if not assigned_instructor:
         raise HTTPException(
@@ -131,127 +140,93 @@ async def create_booking(booking_data: BookingCreate, user_id: str = Depends(get
         )
     
     # Create booking
-    booking = Booking(
-        customer_id=user_id,
-        instructor_id=assigned_instructor,
-        total_price=total_price,
-        deposit_amount=deposit_amount,
-        **booking_data.dict()
-    )
+    booking.instructor_id = assigned_instructor
+    try:
+        await db.bookings.insert_one(booking.dict())
+    except Exception:
+        await release_slot(db, booking.id)
+        raise
     
-    await db.bookings.insert_one(booking.dict())
+    await mark_booked(db, assigned_instructor, booking.booking_date, booking.time_slot.start_time)
+    await record_booking_created(db, booking.dict())
     return booking
 
 @router.get("/my-bookings", response_model=List[BookingDetails])
-async def get_my_bookings(user_id: str = Depends(get_current_user_id)):
+async def get_my_bookings(
+    page: PageParams = Depends(),
+    principal: Principal = Depends(get_principal)
+):
     """Get current user's bookings"""
     db = await get_database()
     
-    # Get user to check role
-    user = await db.users.find_one({"id": user_id})
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
     # Query based on role
-    if user['role'] == 'customer':
-        bookings = await db.bookings.find({"customer_id": user_id}).to_list(1000)
-    elif user['role'] == 'instructor':
-        bookings = await db.bookings.find({"instructor_id": user_id}).to_list(1000)
+    if principal.role == 'customer':
+        query = {"customer_id": principal.id}
+    elif principal.role == 'instructor':
+        query = {"instructor_id": principal.id}
     else:  # admin/owner
-        bookings = await db.bookings.find({}).to_list(1000)
+        query = {}
     
-    # Enrich bookings with related data
-    enriched_bookings = []
-    for booking_doc in bookings:
-        booking = Booking(**booking_doc)
-        
-        # Get course
-        course_doc = await db.courses.find_one({"id": booking.course_id})
-        course = Course(**course_doc) if course_doc else None
-        
-        # Get customer
-        customer_doc = await db.users.find_one({"id": booking.customer_id})
-        customer = User(**customer_doc) if customer_doc else None
+    if page.stream:
+        async def serialize_chunk(bookings):
+            loader = BookingRelationsLoader(db)
+            return [dumps(details) for details in await loader.booking_documents(bookings)]
         
-        # Get instructor
-        instructor = None
-        if booking.instructor_id:
-            instructor_doc = await db.users.find_one({"id": booking.instructor_id})
-            instructor = User(**instructor_doc) if instructor_doc else None
-        
-        # Get payments
-        payments = await db.payments.find({"booking_id": booking.id}).to_list(1000)
-        
-        enriched_bookings.append(BookingDetails(
-            booking=booking,
-            course=course,
-            customer=customer,
-            instructor=instructor,
-            payments=payments
-        ))
+        return stream_ndjson_chunks(
+            iterate(db.bookings, query, page.after, model_projection(Booking)), serialize_chunk
+        )
+    
+    bookings, next_cursor = await fetch_page(
+        db.bookings, query, page, model_projection(Booking, with_id=True)
+    )
+    
+    # Enrich bookings with related data, one query per collection
+    loader = BookingRelationsLoader(db)
+    enriched_bookings = await loader.booking_documents(bookings)
     
-    return enriched_bookings
+    return DocumentResponse(enriched_bookings, headers=cursor_headers(next_cursor))
 
 @router.get("/{booking_id}", response_model=BookingDetails)
-async def get_booking(booking_id: str, user_id: str = Depends(get_current_user_id)):
+async def get_booking(booking_id: str, principal: Principal = Depends(get_principal)):
     """Get specific booking details"""
     db = await get_database()
     
-    booking_doc = await db.bookings.find_one({"id": booking_id})
+    booking_doc = await db.bookings.find_one({"id": booking_id}, model_projection(Booking))
     if not booking_doc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Booking not found"
         )
     
-    booking = Booking(**booking_doc)
-    
     # Check access permissions
-    user = await db.users.find_one({"id": user_id})
-    if (user['role'] == 'customer' and booking.customer_id != user_id) or \
-       (user['role'] == 'instructor' and booking.instructor_id != user_id):
+    if (principal.role == 'customer' and booking_doc['customer_id'] != principal.id) or \
+       (principal.role == 'instructor' and booking_doc.get('instructor_id') != principal.id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
     
     # Get related data
-    course_doc = await db.courses.find_one({"id": booking.course_id})
-    course = Course(**course_doc) if course_doc else None
-    
-    customer_doc = await db.users.find_one({"id": booking.customer_id})
-    customer = User(**customer_doc) if customer_doc else None
-    
-    instructor = None
-    if booking.instructor_id:
-        instructor_doc = await db.users.find_one({"id": booking.instructor_id})
-        instructor = User(**instructor_doc) if instructor_doc else None
-    
-    payments = await db.payments.find({"booking_id": booking.id}).to_list(1000)
-    
-    return BookingDetails(
-        booking=booking,
-        course=course,
-        customer=customer,
-        instructor=instructor,
-        payments=payments
-    )
+    loader = BookingRelationsLoader(db)
+    details = await loader.booking_documents([booking_doc])
+    return DocumentResponse(details[0])
 
 @router.patch("/{booking_id}/status")
 async def update_booking_status(
     booking_id: str, 
-    status: BookingStatus,
-    user_id: str = Depends(get_current_user_id)
+    new_status: BookingStatus = Query(..., alias="status"),
+    principal: Principal = Depends(get_principal)
 ):
     """Update booking status"""
     db = await get_database()
     
     # Check permissions (admin, instructor, or customer can cancel their own)
-    user = await db.users.find_one({"id": user_id})
-    booking = await db.bookings.find_one({"id": booking_id})
+    booking = await db.bookings.find_one(
+        {"id": booking_id},
+        fields_projection(
+            "customer_id", "instructor_id", "status", "booking_date", "spot", "time_slot.start_time"
+        )
+    )
     
     if not booking:
         raise HTTPException(
@@ -259,20 +234,47 @@ async def update_booking_status(
             detail="Booking not found"
         )
     
-    if user['role'] not in ['admin', 'owner'] and \
-       user['id'] not in [booking['customer_id'], booking.get('instructor_id')]:
+    if not principal.is_admin and \
+       principal.id not in [booking['customer_id'], booking.get('instructor_id')]:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
     
+    # Keep the slot reservation in step with whether the booking is active
+    was_active = booking['status'] in ACTIVE_BOOKING_STATUSES
+    is_active = new_status.value in ACTIVE_BOOKING_STATUSES
+    if is_active and not was_active and booking.get('instructor_id'):
+        reserved = await reserve_slot(
+            db,
+            [booking['instructor_id']],
+            booking['booking_date'],
+            booking['spot'],
+            booking['time_slot']['start_time'],
+            booking_id
+        )
+        if not reserved:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Instructor slot is no longer available"
+            )
+        await mark_booked(
+            db, booking['instructor_id'], booking['booking_date'], booking['time_slot']['start_time']
+        )
+    
     # Update status
     await db.bookings.update_one(
         {"id": booking_id},
         {"$set": {
-            "status": status.value,
+            "status": new_status.value,
             "updated_at": datetime.utcnow().isoformat()
         }}
     )
     
-    return {"message": "Booking status updated", "new_status": status.value}
\ No newline at end of file
+    if was_active and not is_active:
+        await release_slot(db, booking_id)
+        if booking.get('instructor_id'):
+            await refresh_instructor(db, booking['instructor_id'], booking['booking_date'])
+    await record_booking_status_change(db, booking, new_status.value)
+    
+    return {"message": "Booking status updated", "new_status": new_status.value}
\ No newline at end of file
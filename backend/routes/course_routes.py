@@ -1,63 +1,75 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request
 from typing import List
 from models import Course, CourseCreate, CourseType, SpotLocation
-from auth import get_current_user_id
+from principal import Principal, get_principal
 from database import get_database
+from pagination import PageParams, iterate, stream_ndjson, cursor_headers
+from responses import dumps, shape
+from projections import model_projection
+from catalog import (
+    course_catalog, cached_response, render_object, ACTIVE_VIEW, type_view, spot_view
+)
 
 router = APIRouter(prefix="/courses", tags=["courses"])
 
 @router.get("/", response_model=List[Course])
-async def get_courses():
+async def get_courses(request: Request, page: PageParams = Depends()):
     """Get all active courses"""
     db = await get_database()
-    courses = await db.courses.find({"is_active": True}).to_list(1000)
-    return [Course(**course) for course in courses]
+    
+    if page.stream:
+        return stream_ndjson(
+            iterate(db.courses, {"is_active": True}, page.after, model_projection(Course)),
+            lambda course: dumps(shape(Course, course))
+        )
+    
+    await course_catalog.ensure_fresh(db)
+    body, etag, next_cursor = course_catalog.render(ACTIVE_VIEW, page.after, page.limit)
+    return cached_response(request, body, etag, cursor_headers(next_cursor))
 
 @router.get("/{course_id}", response_model=Course)
-async def get_course(course_id: str):
+async def get_course(course_id: str, request: Request):
     """Get specific course by ID"""
     db = await get_database()
-    course = await db.courses.find_one({"id": course_id})
+    await course_catalog.ensure_fresh(db)
+    course = course_catalog.get(course_id)
     if not course:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Course not found"
         )
-    return Course(**course)
+    body, etag = render_object(course)
+    return cached_response(request, body, etag)
 
 @router.post("/", response_model=Course)
-async def create_course(course_data: CourseCreate, user_id: str = Depends(get_current_user_id)):
+async def create_course(course_data: CourseCreate, principal: Principal = Depends(get_principal)):
     """Create new course (Admin only)"""
     db = await get_database()
     
     # Check user role (should be admin)
-    user = await db.users.find_one({"id": user_id})
-    if not user or user.get('role') not in ['admin', 'owner']:
+    if not principal.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only admins can create courses"
         )
     
     course = Course(**course_data.dict())
-    await db.courses.insert_one(course.dict())
+    result = await db.courses.insert_one(course.dict())
+    course_catalog.add(course, result.inserted_id)
     return course
 
 @router.get("/by-type/{course_type}", response_model=List[Course])
-async def get_courses_by_type(course_type: CourseType):
+async def get_courses_by_type(course_type: CourseType, request: Request):
     """Get courses filtered by type"""
     db = await get_database()
-    courses = await db.courses.find({
-        "course_type": course_type.value,
-        "is_active": True
-    }).to_list(1000)
-    return [Course(**course) for course in courses]
+    await course_catalog.ensure_fresh(db)
+    body, etag, _ = course_catalog.render(type_view(course_type.value))
+    return cached_response(request, body, etag)
 
 @router.get("/by-spot/{spot}", response_model=List[Course])
-async def get_courses_by_spot(spot: SpotLocation):
+async def get_courses_by_spot(spot: SpotLocation, request: Request):
     """Get courses available at specific spot"""
     db = await get_database()
-    courses = await db.courses.find({
-        "spots": {"$in": [spot.value]},
-        "is_active": True
-    }).to_list(1000)
-    return [Course(**course) for course in courses]
\ No newline at end of file
+    await course_catalog.ensure_fresh(db)
+    body, etag, _ = course_catalog.render(spot_view(spot.value))
+    return cached_response(request, body, etag)
\ No newline at end of file
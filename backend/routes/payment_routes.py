@@ -1,34 +1,35 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Response
 from typing import List
-import stripe
 import os
-from models import Payment, PaymentCreate, PaymentStatus, Booking
-from auth import get_current_user_id
+from models import Payment, PaymentCreate, PaymentStatus
+from principal import Principal, get_principal
 from database import get_database
-
-# Configure Stripe (using test keys for development)
-stripe.api_key = os.environ.get("STRIPE_SECRET_KEY", "sk_test_...")
+from payment_provider import get_payment_provider, PaymentProviderError
+from rollups import record_payment_created
+from responses import DocumentResponse, dumps, shape
+from pagination import PageParams, fetch_page, cursor_headers, iterate, stream_ndjson
+from projections import model_projection, fields_projection
+from stripe_events import verify_event, store_event, stripe_event_worker, WebhookSignatureError
 
 router = APIRouter(prefix="/payments", tags=["payments"])
 
 @router.post("/create-payment-intent")
-async def create_payment_intent(payment_data: PaymentCreate, user_id: str = Depends(get_current_user_id)):
+async def create_payment_intent(payment_data: PaymentCreate, principal: Principal = Depends(get_principal)):
     """Create Stripe payment intent for a booking"""
     db = await get_database()
     
     # Get booking
-    booking_doc = await db.bookings.find_one({"id": payment_data.booking_id})
-    if not booking_doc:
+    booking = await db.bookings.find_one(
+        {"id": payment_data.booking_id}, fields_projection("customer_id")
+    )
+    if not booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Booking not found"
         )
     
-    booking = Booking(**booking_doc)
-    
     # Check if user owns this booking or is admin
-    user = await db.users.find_one({"id": user_id})
-    if user['role'] not in ['admin', 'owner'] and booking.customer_id != user_id:
+    if not principal.is_admin and booking['customer_id'] != principal.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
@@ -36,12 +37,12 @@ async def create_payment_intent(payment_data: PaymentCreate, user_id: str = Depe
     
     try:
         # Create Stripe payment intent
-        intent = stripe.PaymentIntent.create(
+        intent = await get_payment_provider().create_payment_intent(
             amount=int(payment_data.amount * 100),  # Convert to cents
             currency=payment_data.currency.lower(),
             metadata={
                 "booking_id": payment_data.booking_id,
-                "customer_id": booking.customer_id,
+                "customer_id": booking['customer_id'],
                 "payment_type": payment_data.payment_type
             }
         )
@@ -57,6 +58,7 @@ async def create_payment_intent(payment_data: PaymentCreate, user_id: str = Depe
         )
         
         await db.payments.insert_one(payment.dict())
+        await record_payment_created(db, payment.dict())
         
         return {
             "client_secret": intent.client_secret,
@@ -64,123 +66,119 @@ async def create_payment_intent(payment_data: PaymentCreate, user_id: str = Depe
             "amount": payment_data.amount
         }
         
-    except stripe.error.StripeError as e:
+    except PaymentProviderError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Payment processing error: {str(e)}"
         )
 
 @router.post("/confirm-payment/{payment_id}")
-async def confirm_payment(payment_id: str, user_id: str = Depends(get_current_user_id)):
-    """Confirm payment success and update booking status"""
+async def confirm_payment(
+    payment_id: str,
+    response: Response,
+    principal: Principal = Depends(get_principal)
+):
+    """Report whether a payment has been confirmed"""
     db = await get_database()
     
     # Get payment
-    payment_doc = await db.payments.find_one({"id": payment_id})
-    if not payment_doc:
+    payment = await db.payments.find_one(
+        {"id": payment_id}, fields_projection("booking_id", "status")
+    )
+    if not payment:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Payment not found"
         )
     
-    payment = Payment(**payment_doc)
-    
     # Get booking to verify ownership
-    booking_doc = await db.bookings.find_one({"id": payment.booking_id})
-    if not booking_doc:
+    booking = await db.bookings.find_one(
+        {"id": payment['booking_id']}, fields_projection("customer_id")
+    )
+    if not booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Booking not found"
         )
     
-    booking = Booking(**booking_doc)
-    
     # Check permissions
-    user = await db.users.find_one({"id": user_id})
-    if user['role'] not in ['admin', 'owner'] and booking.customer_id != user_id:
+    if not principal.is_admin and booking['customer_id'] != principal.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
     
-    try:
-        # Verify payment with Stripe
-        if payment.stripe_payment_intent_id:
-            intent = stripe.PaymentIntent.retrieve(payment.stripe_payment_intent_id)
-            
-            if intent.status == 'succeeded':
-                # Update payment status
-                await db.payments.update_one(
-                    {"id": payment_id},
-                    {"$set": {
-                        "status": PaymentStatus.PAID.value,
-                        "paid_at": datetime.utcnow().isoformat()
-                    }}
-                )
-                
-                # Update booking payment status
-                total_paid = 0
-                all_payments = await db.payments.find({"booking_id": payment.booking_id}).to_list(1000)
-                for p in all_payments:
-                    if p.get('status') == PaymentStatus.PAID.value:
-                        total_paid += p['amount']
-                
-                # Determine booking payment status
-                if total_paid >= booking.total_price:
-                    payment_status = "paid"
-                    booking_status = "confirmed"
-                elif total_paid >= booking.deposit_amount:
-                    payment_status = "partial"
-                    booking_status = "confirmed"
-                else:
-                    payment_status = "pending"
-                    booking_status = "pending"
-                
-                await db.bookings.update_one(
-                    {"id": payment.booking_id},
-                    {"$set": {
-                        "payment_status": payment_status,
-                        "status": booking_status
-                    }}
-                )
-                
-                return {"message": "Payment confirmed", "status": "success"}
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Payment not completed"
-                )
+    # Payment state is driven by Stripe webhooks; this only reports it
+    if payment['status'] == PaymentStatus.PAID.value:
+        return {"message": "Payment confirmed", "status": "success"}
+    if payment['status'] == PaymentStatus.FAILED.value:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Payment failed"
+        )
+    response.status_code = status.HTTP_202_ACCEPTED
+    return {"message": "Payment is being processed", "status": "processing"}
+
+@router.post("/webhook")
+async def stripe_webhook(request: Request):
+    """Receive Stripe webhook events"""
+    secret = os.environ.get("STRIPE_WEBHOOK_SECRET")
+    if not secret:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Webhook secret not configured"
+        )
     
-    except stripe.error.StripeError as e:
+    payload = await request.body()
+    try:
+        event = verify_event(payload, request.headers.get("Stripe-Signature"), secret)
+    except WebhookSignatureError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Payment verification error: {str(e)}"
+            detail=f"Invalid webhook: {str(e)}"
         )
+    
+    db = await get_database()
+    stored = await store_event(db, event)
+    if stored:
+        stripe_event_worker.enqueue(stored)
+    
+    return {"received": True}
 
 @router.get("/booking/{booking_id}", response_model=List[Payment])
-async def get_booking_payments(booking_id: str, user_id: str = Depends(get_current_user_id)):
+async def get_booking_payments(
+    booking_id: str,
+    page: PageParams = Depends(),
+    principal: Principal = Depends(get_principal)
+):
     """Get all payments for a booking"""
     db = await get_database()
     
     # Get booking to verify ownership
-    booking_doc = await db.bookings.find_one({"id": booking_id})
-    if not booking_doc:
+    booking = await db.bookings.find_one({"id": booking_id}, fields_projection("customer_id"))
+    if not booking:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Booking not found"
         )
     
-    booking = Booking(**booking_doc)
-    
     # Check permissions
-    user = await db.users.find_one({"id": user_id})
-    if user['role'] not in ['admin', 'owner'] and booking.customer_id != user_id:
+    if not principal.is_admin and booking['customer_id'] != principal.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
     
-    payments = await db.payments.find({"booking_id": booking_id}).to_list(1000)
-    return [Payment(**payment) for payment in payments]
-
-from datetime import datetime
\ No newline at end of file
+    query = {"booking_id": booking_id}
+    if page.stream:
+        return stream_ndjson(
+            iterate(db.payments, query, page.after, model_projection(Payment)),
+            lambda payment: dumps(shape(Payment, payment))
+        )
+    
+    payments, next_cursor = await fetch_page(
+        db.payments, query, page, model_projection(Payment, with_id=True)
+    )
+    return DocumentResponse(
+        [shape(Payment, payment) for payment in payments], headers=cursor_headers(next_cursor)
+    )
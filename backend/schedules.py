@@ -0,0 +1,172 @@
+"""
+Bulk instructor scheduling
+
+Sets up many instructor schedules in one request, either as explicit
+(instructor, date, spot, slots) entries or as templates that expand to every
+matching weekday in a date range for a set of instructors and spots. All
+entries are written with a single unordered `bulk_write` of upserts keyed on
+(instructor_id, date, spot), the unique key of instructor_schedules, so
+existing days are overwritten and new ones are created without reading them
+first. The slot inventory is then rebuilt once for the affected date range.
+
+`apply_schedules` returns a summary plus one result per entry, in request
+order (entries first, then expanded templates):
+
+    {"instructor_id": ..., "date": ..., "spot": ..., "status": "created",
+     "schedule_id": ...}
+
+with status "created", "updated", "superseded" (a later entry in the same
+request has the same key), "rejected" (invalid date or unknown instructor,
+not written) or "failed" (write error, see "error").
+"""
+import os
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from models import InstructorScheduleBulk, ScheduleTemplate
+from slot_inventory import rebuild
+
+MAX_BULK_SCHEDULE_ENTRIES = int(os.environ.get("MAX_BULK_SCHEDULE_ENTRIES", "20000"))
+MAX_TEMPLATE_DAYS = 366
+
+ScheduleKey = Tuple[str, str, str]  # (instructor_id, date, spot)
+
+class ScheduleTemplateError(ValueError):
+    """A template that cannot be expanded"""
+
+def _parse_date(value: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+def expand_template(template: ScheduleTemplate) -> List[Dict[str, Any]]:
+    """One entry per instructor, spot and matching weekday in the range"""
+    start, end = _parse_date(template.start_date), _parse_date(template.end_date)
+    if start is None or end is None:
+        raise ScheduleTemplateError("Template dates must be in YYYY-MM-DD format")
+    if end < start or (end - start).days >= MAX_TEMPLATE_DAYS:
+        raise ScheduleTemplateError(f"Template date range must span 1 to {MAX_TEMPLATE_DAYS} days")
+    if any(weekday not in range(7) for weekday in template.weekdays):
+        raise ScheduleTemplateError("Template weekdays must be 0 (Monday) to 6 (Sunday)")
+
+    weekdays = set(template.weekdays)
+    days = [
+        day.isoformat()
+        for day in (start + timedelta(days=n) for n in range((end - start).days + 1))
+        if day.weekday() in weekdays
+    ]
+    slots = [slot.model_dump() for slot in template.available_slots]
+    return [
+        {"instructor_id": instructor_id, "date": day, "spot": spot.value, "available_slots": slots}
+        for instructor_id in template.instructor_ids
+        for spot in template.spots
+        for day in days
+    ]
+
+def expand(request: InstructorScheduleBulk) -> List[Dict[str, Any]]:
+    """All entries of a bulk request, explicit entries first
+
+    Raises ScheduleTemplateError for an invalid template.
+    """
+    entries = [
+        {
+            "instructor_id": entry.instructor_id,
+            "date": entry.date,
+            "spot": entry.spot.value,
+            "available_slots": [slot.model_dump() for slot in entry.available_slots]
+        }
+        for entry in request.entries
+    ]
+    for template in request.templates:
+        entries += expand_template(template)
+    return entries
+
+async def apply_schedules(db, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Upsert schedule entries with one unordered bulk_write"""
+    results: List[Dict[str, Any]] = [
+        {"instructor_id": entry['instructor_id'], "date": entry['date'], "spot": entry['spot']}
+        for entry in entries
+    ]
+
+    instructor_ids = {entry['instructor_id'] for entry in entries}
+    known = {
+        instructor['id']
+        async for instructor in db.users.find(
+            {"id": {"$in": list(instructor_ids)}, "role": "instructor"}, {"_id": 0, "id": 1}
+        )
+    }
+
+    # Last entry per key wins, as if the entries had been applied one by one
+    latest: Dict[ScheduleKey, int] = {}
+    for i, entry in enumerate(entries):
+        if _parse_date(entry['date']) is None:
+            results[i].update(status="rejected", error="Date must be in YYYY-MM-DD format")
+        elif entry['instructor_id'] not in known:
+            results[i].update(status="rejected", error="Instructor not found")
+        else:
+            key = (entry['instructor_id'], entry['date'], entry['spot'])
+            if key in latest:
+                results[latest[key]]['status'] = "superseded"
+            latest[key] = i
+
+    now = datetime.utcnow()
+    indexes = sorted(latest.values())
+    new_ids = {i: str(uuid.uuid4()) for i in indexes}
+    operations = [
+        UpdateOne(
+            {"instructor_id": entries[i]['instructor_id'], "date": entries[i]['date'], "spot": entries[i]['spot']},
+            {
+                "$set": {"available_slots": entries[i]['available_slots'], "is_available": True},
+                "$setOnInsert": {"id": new_ids[i], "created_at": now}
+            },
+            upsert=True
+        )
+        for i in indexes
+    ]
+
+    errors: Dict[int, str] = {}
+    if operations:
+        try:
+            await db.instructor_schedules.bulk_write(operations, ordered=False)
+        except BulkWriteError as exc:
+            # Unordered: everything but the failed operations was applied
+            errors = {item['index']: item['errmsg'] for item in exc.details.get('writeErrors', [])}
+
+    for position, i in enumerate(indexes):
+        if position in errors:
+            results[i].update(status="failed", error=errors[position])
+
+    written = [i for position, i in enumerate(indexes) if position not in errors]
+    if written:
+        dates = [entries[i]['date'] for i in written]
+        first, last = min(dates), max(dates)
+        # Read back the schedule ids in one query over the written range; a
+        # schedule carrying the id generated here was created by this request
+        schedule_ids = {
+            (schedule['instructor_id'], schedule['date'], schedule['spot']): schedule['id']
+            async for schedule in db.instructor_schedules.find(
+                {
+                    "instructor_id": {"$in": list({entries[i]['instructor_id'] for i in written})},
+                    "date": {"$gte": first, "$lte": last}
+                },
+                {"_id": 0, "id": 1, "instructor_id": 1, "date": 1, "spot": 1}
+            )
+        }
+        for i in written:
+            entry = entries[i]
+            schedule_id = schedule_ids.get((entry['instructor_id'], entry['date'], entry['spot']))
+            results[i].update(
+                status="created" if schedule_id == new_ids[i] else "updated", schedule_id=schedule_id
+            )
+
+        await rebuild(db, first, to_date=last)
+
+    summary = {status: 0 for status in ("created", "updated", "superseded", "rejected", "failed")}
+    for result in results:
+        summary[result['status']] += 1
+    return {**summary, "results": results}
@@ -2,22 +2,16 @@
 Initial data seeding for KiteSchool Pro
 """
 import asyncio
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
+from typing import List
 from database import connect_to_mongo, get_database, close_mongo_connection
-from models import Course, CourseType, SpotLocation, User, UserRole, InstructorSchedule, TimeSlot
+from models import Course, CourseType, SpotLocation, User, UserRole, AvailabilityRule, TimeSlot
 from auth import get_password_hash
+from projections import EXISTS
 
-async def seed_courses():
-    """Seed initial courses"""
-    db = await get_database()
-    
-    # Check if courses already exist
-    existing_courses = await db.courses.count_documents({})
-    if existing_courses > 0:
-        print("Courses already seeded, skipping...")
-        return
-    
-    courses = [
+def default_courses() -> List[Course]:
+    """The school's course catalog"""
+    return [
         Course(
             name="Private Kitesurfing Lesson",
             course_type=CourseType.PRIVATE_KITESURF,
@@ -63,6 +57,18 @@ async def seed_courses():
             equipment_included=["efoil_board", "safety_gear", "wetsuit"]
         )
     ]
+
+async def seed_courses():
+    """Seed initial courses"""
+    db = await get_database()
+    
+    # Check if courses already exist
+    existing_courses = await db.courses.count_documents({})
+    if existing_courses > 0:
+        print("Courses already seeded, skipping...")
+        return
+    
+    courses = default_courses()
     
     for course in courses:
         await db.courses.insert_one(course.model_dump())
@@ -73,7 +79,7 @@ async def seed_admin_user():
     db = await get_database()
     
     # Check if admin exists
-    existing_admin = await db.users.find_one({"role": "owner"})
+    existing_admin = await db.users.find_one({"role": "owner"}, EXISTS)
     if existing_admin:
         print("Admin user already exists, skipping...")
         return
@@ -98,7 +104,7 @@ async def seed_instructor():
     db = await get_database()
     
     # Check if instructor exists
-    existing_instructor = await db.users.find_one({"role": "instructor"})
+    existing_instructor = await db.users.find_one({"role": "instructor"}, EXISTS)
     if existing_instructor:
         print("Instructor already exists, skipping...")
         return
@@ -118,42 +124,32 @@ async def seed_instructor():
     await db.users.insert_one(instructor_doc)
     print(f"✓ Added instructor: {instructor.first_name} {instructor.last_name}")
     
-    # Add some sample schedules for next 7 days
-    today = date.today()
-    for i in range(7):
-        schedule_date = today + timedelta(days=i)
-        
-        # Morning slots
-        morning_slots = [
-            TimeSlot(start_time="09:00", end_time="11:00"),
-            TimeSlot(start_time="11:30", end_time="13:30")
-        ]
-        
-        # Afternoon slots  
-        afternoon_slots = [
-            TimeSlot(start_time="14:00", end_time="16:00"),
-            TimeSlot(start_time="16:30", end_time="18:30")
-        ]
-        
-        # Create schedules for both spots
-        for spot in [SpotLocation.SYLT, SpotLocation.ROMO]:
-            schedule = InstructorSchedule(
-                instructor_id=instructor.id,
-                date=schedule_date.isoformat(),  # Convert to string
-                available_slots=morning_slots + afternoon_slots,
-                spot=spot
-            )
-            
-            await db.instructor_schedules.insert_one(schedule.model_dump())
-    
-    print(f"✓ Added 14 instructor schedules (7 days × 2 spots)")
+    # Recurring availability at both spots, every day from today
+    morning_slots = [
+        TimeSlot(start_time="09:00", end_time="11:00"),
+        TimeSlot(start_time="11:30", end_time="13:30")
+    ]
+    afternoon_slots = [
+        TimeSlot(start_time="14:00", end_time="16:00"),
+        TimeSlot(start_time="16:30", end_time="18:30")
+    ]
+    for spot in [SpotLocation.SYLT, SpotLocation.ROMO]:
+        rule = AvailabilityRule(
+            instructor_id=instructor.id,
+            spot=spot,
+            start_date=date.today().isoformat(),
+            available_slots=morning_slots + afternoon_slots
+        )
+        await db.availability_rules.insert_one(rule.model_dump())
+    
+    print(f"✓ Added 2 availability rules (daily at both spots)")
 
 async def seed_demo_customer():
     """Seed demo customer for testing"""
     db = await get_database()
     
     # Check if demo customer exists
-    existing_customer = await db.users.find_one({"email": "demo@customer.com"})
+    existing_customer = await db.users.find_one({"email": "demo@customer.com"}, EXISTS)
     if existing_customer:
         print("Demo customer already exists, skipping...")
         return
@@ -1,30 +1,52 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
 import os
 import logging
+import time
 from pathlib import Path
 
+# Before our modules, which read their settings on import
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
 # Import our modules
-from database import connect_to_mongo, close_mongo_connection
+from database import connect_to_mongo, close_mongo_connection, get_database
+from mongo_monitoring import pool_stats
+import metrics
+from indexes import ensure_indexes
+from rollups import ensure_daily_stats
+from slot_inventory import ensure_slot_inventory, inventory_horizon
+from pagination import NEXT_CURSOR_HEADER
+from auth import password_hasher
+from payment_provider import close_payment_provider
+from stripe_events import stripe_event_worker
 from routes.auth_routes import router as auth_router
 from routes.course_routes import router as course_router  
 from routes.booking_routes import router as booking_router
 from routes.payment_routes import router as payment_router
 from routes.admin_routes import router as admin_router
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
 # Lifespan context manager for startup/shutdown
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    await ensure_indexes(await get_database())
+    await ensure_daily_stats(await get_database())
+    await ensure_slot_inventory(await get_database())
+    await inventory_horizon.start(await get_database())
+    await stripe_event_worker.start(await get_database())
     yield
     # Shutdown
+    await stripe_event_worker.stop()
+    await inventory_horizon.stop()
     await close_mongo_connection()
+    password_hasher.shutdown()
+    await close_payment_provider()
 
 # Create the main app
 app = FastAPI(
@@ -46,6 +68,31 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "kiteschool-pro-api"}
 
+READINESS_TIMEOUT = float(os.environ.get("READINESS_TIMEOUT", "2"))
+
+@api_router.get("/health/ready")
+async def readiness_check():
+    """Ready when the database answers a ping; reports the connection pool"""
+    started = time.perf_counter()
+    try:
+        db = await get_database()
+        await asyncio.wait_for(db.command("ping"), READINESS_TIMEOUT)
+        database_status = "ok"
+    except Exception as e:
+        database_status = f"unavailable: {e.__class__.__name__}"
+    ready = database_status == "ok"
+    
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "status": "ready" if ready else "not ready",
+            "service": "kiteschool-pro-api",
+            "database": database_status,
+            "ping_ms": round((time.perf_counter() - started) * 1000, 2),
+            "pool": pool_stats.snapshot()
+        }
+    )
+
 # Include all route modules
 api_router.include_router(auth_router)
 api_router.include_router(course_router)
@@ -56,6 +103,11 @@ api_router.include_router(admin_router)
 # Include the main API router in the app
 app.include_router(api_router)
 
+# Prometheus scrape endpoint (outside /api, like the scraper expects)
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -63,8 +115,12 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Per-route latency, status and Mongo command counts (outermost middleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
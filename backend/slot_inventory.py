@@ -0,0 +1,358 @@
+"""
+Materialized slot inventory
+
+`slot_inventory` holds one document per (spot, date, start_time) listing the
+instructors still free for that slot:
+
+    {"spot": "sylt", "date": "2025-07-01", "start_time": "09:00",
+     "free_instructors": [{"id": ..., "name": ..., "end_time": "11:00"}],
+     "capacity_remaining": 1}
+
+It is kept up to date incrementally by the write paths that change
+availability (schedules and availability rules, bookings, instructor
+activation), so availability reads are a single indexed query. Every update
+recomputes the `free_instructors` entry for one instructor with a pipeline
+update, which is atomic per document and idempotent, so concurrent refreshes
+cannot leave duplicates behind.
+
+Open-ended availability rules reach RULE_HORIZON_DAYS ahead. How far the
+view has been built is recorded in `slot_inventory_meta`, and
+`InventoryHorizon` extends it as days pass: on startup and then every
+SLOT_INVENTORY_HORIZON_INTERVAL seconds it builds the days between the last
+built date and today + RULE_HORIZON_DAYS, which is a no-op most of the time.
+
+Recompute the view from the effective schedules (availability rules plus
+per-day instructor_schedules overrides) and bookings, reporting drift:
+
+    python slot_inventory.py --rebuild [--from YYYY-MM-DD]
+    python slot_inventory.py --check [--from YYYY-MM-DD]
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+from availability import ACTIVE_BOOKING_STATUSES
+from availability_rules import RULE_HORIZON_DAYS, effective_schedules
+
+logger = logging.getLogger(__name__)
+
+SLOT_INVENTORY_HORIZON_INTERVAL = float(os.environ.get("SLOT_INVENTORY_HORIZON_INTERVAL", "3600"))
+HORIZON = "horizon"
+
+SlotKey = Tuple[str, str, str]  # (spot, date, start_time)
+
+def _without(instructor_id: str) -> Dict[str, Any]:
+    return {"$filter": {
+        "input": {"$ifNull": ["$free_instructors", []]},
+        "as": "instructor",
+        "cond": {"$ne": ["$$instructor.id", instructor_id]}
+    }}
+
+def _set_capacity() -> Dict[str, Any]:
+    return {"$set": {"capacity_remaining": {"$size": "$free_instructors"}}}
+
+async def _remove_instructor(db, instructor_id: str, query: Dict[str, Any]) -> None:
+    await db.slot_inventory.update_many(
+        {**query, "free_instructors.id": instructor_id},
+        [{"$set": {"free_instructors": _without(instructor_id)}}, _set_capacity()]
+    )
+
+async def _add_instructor(db, key: SlotKey, entry: Dict[str, Any]) -> None:
+    spot, date, start_time = key
+    pipeline = [
+        {"$set": {"free_instructors": {"$concatArrays": [_without(entry['id']), [entry]]}}},
+        _set_capacity()
+    ]
+    for attempt in range(2):
+        try:
+            await db.slot_inventory.update_one(
+                {"spot": spot, "date": date, "start_time": start_time}, pipeline, upsert=True
+            )
+            return
+        except DuplicateKeyError:
+            # Lost an upsert race for a new document; it exists now, so retry
+            if attempt:
+                raise
+
+async def mark_booked(db, instructor_id: str, date: str, start_time: str) -> None:
+    """Take an instructor out of a slot at every spot once booked"""
+    await _remove_instructor(db, instructor_id, {"date": date, "start_time": start_time})
+
+async def refresh_instructor(db, instructor_id: str, date_query: Any) -> None:
+    """Recompute an instructor's free slots for dates matching `date_query`
+
+    `date_query` is a value or condition on the date field, e.g.
+    "2025-07-01" or {"$gte": "2025-07-01"}.
+    """
+    await _remove_instructor(db, instructor_id, {"date": date_query})
+
+    instructor = await db.users.find_one(
+        {"id": instructor_id, "role": "instructor", "is_active": True},
+        {"_id": 0, "id": 1, "first_name": 1, "last_name": 1}
+    )
+    if not instructor:
+        return
+
+    desired = await _compute(
+        db,
+        {"instructor_id": instructor_id, "date": date_query},
+        {"instructor_id": instructor_id, "booking_date": date_query},
+        {instructor_id: instructor}
+    )
+    # A booking committing after _compute read bookings has reserved its
+    # slot first, so reserved slots are never added back
+    reserved = await _reserved_slots(db, instructor_id, date_query)
+    for key, entries in desired.items():
+        if (key[1], key[2]) in reserved:
+            continue
+        for entry in entries:
+            await _add_instructor(db, key, entry)
+
+    # A booking reserving after that read runs mark_booked after this
+    # re-add; one that reserved in between is taken out here
+    for day, start_time in await _reserved_slots(db, instructor_id, date_query) - reserved:
+        await mark_booked(db, instructor_id, day, start_time)
+
+async def _reservations(db, date_query: Any) -> Set[Tuple[str, str, str]]:
+    """(instructor_id, date, start_time) of every reserved slot on matching dates"""
+    return {
+        (reservation['instructor_id'], reservation['date'], reservation['start_time'])
+        async for reservation in db.slot_reservations.find(
+            {"date": date_query}, {"_id": 0, "instructor_id": 1, "date": 1, "start_time": 1}
+        )
+    }
+
+async def _reserved_slots(db, instructor_id: str, date_query: Any) -> Set[Tuple[str, str]]:
+    return {
+        (reservation['date'], reservation['start_time'])
+        async for reservation in db.slot_reservations.find(
+            {"instructor_id": instructor_id, "date": date_query}, {"_id": 0, "date": 1, "start_time": 1}
+        )
+    }
+
+def _date_bounds(date_query: Any) -> Tuple[str, Optional[str]]:
+    """(first, last or None) dates of a date value or $gte / $lte condition"""
+    if isinstance(date_query, str):
+        return date_query, date_query
+    return date_query['$gte'], date_query.get('$lte')
+
+async def _compute(
+    db,
+    schedule_query: Dict[str, Any],
+    booking_query: Dict[str, Any],
+    instructors: Optional[Dict[str, Dict[str, Any]]] = None
+) -> Dict[SlotKey, List[Dict[str, Any]]]:
+    """Free instructors per slot from source collections"""
+    if instructors is None:
+        instructors = {
+            instructor['id']: instructor
+            async for instructor in db.users.find(
+                {"role": "instructor", "is_active": True},
+                {"_id": 0, "id": 1, "first_name": 1, "last_name": 1}
+            )
+        }
+
+    taken = set()
+    async for booking in db.bookings.find(
+        {**booking_query, "status": {"$in": ACTIVE_BOOKING_STATUSES}},
+        {"_id": 0, "instructor_id": 1, "booking_date": 1, "time_slot.start_time": 1}
+    ):
+        taken.add((booking['instructor_id'], booking['booking_date'], booking['time_slot']['start_time']))
+
+    desired: Dict[SlotKey, List[Dict[str, Any]]] = {}
+    date_from, date_to = _date_bounds(schedule_query['date'])
+    instructor_ids = [schedule_query['instructor_id']] if 'instructor_id' in schedule_query else None
+    for schedule in await effective_schedules(db, date_from, date_to, instructor_ids=instructor_ids):
+        instructor = instructors.get(schedule['instructor_id'])
+        if not instructor:
+            continue
+        for slot in schedule.get('available_slots', []):
+            if (instructor['id'], schedule['date'], slot['start_time']) in taken:
+                continue
+            desired.setdefault((schedule['spot'], schedule['date'], slot['start_time']), []).append({
+                "id": instructor['id'],
+                "name": f"{instructor['first_name']} {instructor['last_name']}",
+                "end_time": slot['end_time']
+            })
+    return desired
+
+async def read_available_slots(
+    db, date: str, spot: str, start_time: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Free slots for a date and spot, in the check-availability response shape"""
+    query = {"spot": spot, "date": date, "capacity_remaining": {"$gt": 0}}
+    if start_time is not None:
+        query["start_time"] = start_time
+
+    available_slots = []
+    async for doc in db.slot_inventory.find(query, {"_id": 0}).sort("start_time", 1):
+        for instructor in doc['free_instructors']:
+            available_slots.append({
+                "instructor_id": instructor['id'],
+                "instructor_name": instructor['name'],
+                "time_slot": {"start_time": doc['start_time'], "end_time": instructor['end_time']},
+                "available": True
+            })
+    return available_slots
+
+async def rebuild(
+    db, from_date: str, apply: bool = True, to_date: Optional[str] = None
+) -> Dict[str, int]:
+    """Recompute the view for dates >= from_date (and <= to_date) and report drift"""
+    date_query = {"$gte": from_date}
+    if to_date is not None:
+        date_query["$lte"] = to_date
+    desired = await _compute(db, {"date": date_query}, {"booking_date": date_query})
+    # As in refresh_instructor: slots reserved by bookings committing after
+    # _compute read bookings are never written back
+    reserved = await _reservations(db, date_query)
+    for key in list(desired):
+        desired[key] = [
+            entry for entry in desired[key] if (entry['id'], key[1], key[2]) not in reserved
+        ]
+        if not desired[key]:
+            del desired[key]
+
+    drift = {"missing": 0, "extra": 0, "mismatched": 0}
+    current = {}
+    async for doc in db.slot_inventory.find({"date": date_query}, {"_id": 0}):
+        current[(doc['spot'], doc['date'], doc['start_time'])] = doc
+
+    for key, entries in desired.items():
+        doc = current.get(key)
+        if doc is None:
+            drift["missing"] += 1
+        elif sorted(i['id'] for i in doc['free_instructors']) != sorted(e['id'] for e in entries) \
+                or doc.get('capacity_remaining') != len(entries):
+            drift["mismatched"] += 1
+    drift["extra"] = sum(
+        1 for key, doc in current.items() if key not in desired and doc['free_instructors']
+    )
+
+    if apply:
+        # Replace in place rather than delete-and-insert so readers never see
+        # an empty inventory mid-rebuild
+        now = datetime.utcnow()
+        operations = [
+            ReplaceOne(
+                {"spot": spot, "date": date, "start_time": start_time},
+                {
+                    "spot": spot,
+                    "date": date,
+                    "start_time": start_time,
+                    "free_instructors": entries,
+                    "capacity_remaining": len(entries),
+                    "rebuilt_at": now
+                },
+                upsert=True
+            )
+            for (spot, date, start_time), entries in desired.items()
+        ]
+        operations += [
+            DeleteOne({"spot": spot, "date": date, "start_time": start_time})
+            for (spot, date, start_time) in current if (spot, date, start_time) not in desired
+        ]
+        for i in range(0, len(operations), 1000):
+            await db.slot_inventory.bulk_write(operations[i:i + 1000], ordered=False)
+        # Bookings reserving after that read run mark_booked after these
+        # writes or before them; the latter are taken out here
+        for instructor_id, day, start_time in await _reservations(db, date_query) - reserved:
+            await mark_booked(db, instructor_id, day, start_time)
+        if to_date is None:
+            # An open-ended rebuild covers the rules' whole horizon
+            await _record_horizon(db, _horizon(from_date))
+
+    return drift
+
+def _horizon(day: str) -> str:
+    return (date.fromisoformat(day) + timedelta(days=RULE_HORIZON_DAYS)).isoformat()
+
+async def _record_horizon(db, built_to: str) -> None:
+    await db.slot_inventory_meta.update_one(
+        {"id": HORIZON}, {"$max": {"built_to": built_to}}, upsert=True
+    )
+
+async def extend_horizon(db, today: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """Build the days up to today + RULE_HORIZON_DAYS not built yet
+
+    Returns the (first, last) dates built, or None if already up to date.
+    """
+    today = today or datetime.utcnow().date().isoformat()
+    target = _horizon(today)
+    meta = await db.slot_inventory_meta.find_one({"id": HORIZON}, {"_id": 0, "built_to": 1})
+    built_to = meta['built_to'] if meta else None
+    if built_to is not None and built_to >= target:
+        return None
+    first = today
+    if built_to is not None:
+        first = max(today, (date.fromisoformat(built_to) + timedelta(days=1)).isoformat())
+    await rebuild(db, first, to_date=target)
+    await _record_horizon(db, target)
+    return first, target
+
+class InventoryHorizon:
+    """Background task moving the built horizon forward as days pass"""
+
+    def __init__(self, interval: float = SLOT_INVENTORY_HORIZON_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, db) -> None:
+        await extend_horizon(db)
+        self._task = asyncio.create_task(self._run(db))
+
+    async def _run(self, db) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                extended = await extend_horizon(db)
+                if extended:
+                    logger.info("Slot inventory extended over %s to %s", *extended)
+            except Exception:
+                logger.exception("Failed to extend the slot inventory horizon")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+inventory_horizon = InventoryHorizon()
+
+async def ensure_slot_inventory(db) -> None:
+    """Build the view on first start if it has never been built"""
+    if await db.slot_inventory.estimated_document_count() == 0:
+        await rebuild(db, datetime.utcnow().date().isoformat())
+
+async def main(apply: bool, from_date: str) -> int:
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from database import connect_to_mongo, get_database, close_mongo_connection
+
+    load_dotenv(Path(__file__).parent / '.env')
+    await connect_to_mongo()
+    drift = await rebuild(await get_database(), from_date, apply=apply)
+    print(f"Drift since {from_date}: " + ", ".join(f"{k}={v}" for k, v in drift.items()))
+    if apply:
+        print("✓ slot_inventory rebuilt")
+    await close_mongo_connection()
+    return 1 if any(drift.values()) and not apply else 0
+
+if __name__ == "__main__":
+    if "--rebuild" not in sys.argv and "--check" not in sys.argv:
+        print(__doc__)
+        sys.exit(1)
+    from_date = datetime.utcnow().date().isoformat()
+    if "--from" in sys.argv:
+        from_date = sys.argv[sys.argv.index("--from") + 1]
+    sys.exit(asyncio.run(main("--rebuild" in sys.argv, from_date)))
@@ -0,0 +1,326 @@
+"""
+Stripe webhook ingestion
+
+The webhook route verifies each event's `Stripe-Signature`, stores it once in
+`stripe_events` (unique on the event id, so Stripe's redeliveries are no-ops)
+and hands it to `StripeEventWorker`. The worker drains its queue in batches
+and applies them with `process_events`: one read for the batch's payments,
+one bulk write for their statuses, then the booking totals through
+booking_payments.apply_payment and the rollups through
+rollups.record_payment_transition. Both are guarded per payment id rather
+than on the payment's status, so replaying an event after a crash between
+these steps finishes the booking total and the rollup without counting
+anything twice. An event is marked processed only after it has been applied.
+A batch that fails, and a payment event that arrives before its payment is
+stored, stay unprocessed and are retried every STRIPE_EVENT_RETRY_DELAY
+seconds, up to STRIPE_EVENT_MAX_ATTEMPTS attempts; anything still
+unprocessed (a crash, a full queue) is picked up again on the next startup.
+
+Processing is idempotent, so stored events can be reprocessed at any time:
+
+    python stripe_events.py --replay                   # unprocessed events
+    python stripe_events.py --replay --all [--since YYYY-MM-DD]
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from projections import fields_projection
+from booking_payments import apply_payment, status_after_payment
+from rollups import record_payment_transition, record_booking_status_change
+
+logger = logging.getLogger(__name__)
+
+STRIPE_WEBHOOK_TOLERANCE = int(os.environ.get("STRIPE_WEBHOOK_TOLERANCE", "300"))
+STRIPE_EVENT_BATCH_SIZE = int(os.environ.get("STRIPE_EVENT_BATCH_SIZE", "100"))
+STRIPE_EVENT_BATCH_WAIT = float(os.environ.get("STRIPE_EVENT_BATCH_WAIT", "0.05"))
+STRIPE_EVENT_QUEUE_SIZE = int(os.environ.get("STRIPE_EVENT_QUEUE_SIZE", "10000"))
+STRIPE_EVENT_RETRY_DELAY = float(os.environ.get("STRIPE_EVENT_RETRY_DELAY", "30"))
+STRIPE_EVENT_MAX_ATTEMPTS = int(os.environ.get("STRIPE_EVENT_MAX_ATTEMPTS", "10"))
+
+SUCCEEDED = "payment_intent.succeeded"
+FAILED = "payment_intent.payment_failed"
+HANDLED_EVENT_TYPES = (SUCCEEDED, FAILED)
+
+class WebhookSignatureError(Exception):
+    """Raised when a webhook payload does not carry a valid signature"""
+
+def sign_payload(payload: bytes, secret: str, timestamp: Optional[int] = None) -> str:
+    """`Stripe-Signature` header value for a payload"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signature = hmac.new(
+        secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256
+    ).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+def verify_event(payload: bytes, header: Optional[str], secret: str,
+                 tolerance: int = STRIPE_WEBHOOK_TOLERANCE) -> Dict[str, Any]:
+    """Check the signature header and return the decoded event"""
+    if not header:
+        raise WebhookSignatureError("Missing signature header")
+
+    timestamp, signatures = None, []
+    for item in header.split(","):
+        key, _, value = item.strip().partition("=")
+        if key == "t":
+            timestamp = value
+        elif key == "v1":
+            signatures.append(value)
+    if not timestamp or not timestamp.isdigit() or not signatures:
+        raise WebhookSignatureError("Malformed signature header")
+    if abs(time.time() - int(timestamp)) > tolerance:
+        raise WebhookSignatureError("Timestamp outside the tolerance zone")
+
+    expected = sign_payload(payload, secret, int(timestamp)).split("v1=", 1)[1]
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise WebhookSignatureError("No signature matches the payload")
+
+    try:
+        return json.loads(payload)
+    except ValueError:
+        raise WebhookSignatureError("Payload is not valid JSON")
+
+async def store_event(db, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Store a verified event, returning the stored document or None if seen before"""
+    doc = {
+        "id": event["id"],
+        "type": event.get("type"),
+        "created": event.get("created"),
+        "data": event.get("data", {}),
+        "received_at": datetime.utcnow(),
+        "processed_at": None,
+        "attempts": 0
+    }
+    try:
+        await db.stripe_events.insert_one(doc)
+    except DuplicateKeyError:
+        return None
+    doc.pop("_id", None)
+    return doc
+
+async def process_events(db, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Apply stored events to payments and bookings
+
+    Returns the payment events whose payment does not exist (yet); they are
+    left unprocessed with their attempt counted.
+    """
+    intent_ids = {
+        event["data"]["object"]["id"] for event in events if event["type"] in HANDLED_EVENT_TYPES
+    }
+    payments = {}
+    if intent_ids:
+        async for payment in db.payments.find(
+            {"stripe_payment_intent_id": {"$in": list(intent_ids)}},
+            fields_projection("id", "booking_id", "amount", "status", "stripe_payment_intent_id")
+        ):
+            payments[payment["stripe_payment_intent_id"]] = payment
+
+    now = datetime.utcnow()
+    paid_at = now.isoformat()
+    operations, paid, unmatched = [], [], []
+    for event in events:
+        if event["type"] not in HANDLED_EVENT_TYPES:
+            continue
+        payment = payments.get(event["data"]["object"]["id"])
+        if payment is None:
+            unmatched.append(event)
+            continue
+        # Events for the same payment later in the batch see the updated status
+        if event["type"] == SUCCEEDED:
+            if payment["status"] != "paid":
+                operations.append(UpdateOne(
+                    {"id": payment["id"], "status": {"$ne": "paid"}},
+                    [{"$set": {
+                        "previous_status": "$status", "status": "paid", "paid_at": paid_at, "rolled_up": False
+                    }}]
+                ))
+                payment["status"] = "paid"
+            # Applied even if already paid, in case an earlier attempt
+            # stopped before crediting the booking
+            paid.append(payment)
+        elif event["type"] == FAILED and payment["status"] == "pending":
+            operations.append(UpdateOne(
+                {"id": payment["id"], "status": "pending"},
+                {"$set": {"previous_status": "pending", "status": "failed", "rolled_up": False}}
+            ))
+            payment["status"] = "failed"
+
+    if operations:
+        await db.payments.bulk_write(operations, ordered=True)
+
+    for payment in {payment["id"]: payment for payment in paid}.values():
+        booking_before = await apply_payment(db, payment["booking_id"], payment["id"], payment["amount"])
+        if booking_before:
+            await record_booking_status_change(
+                db, booking_before, status_after_payment(booking_before, payment["amount"])
+            )
+    # Status changes of this batch, and of earlier attempts that stopped
+    # before their rollup, are counted now
+    matched_ids = list({payment["id"] for payment in payments.values()})
+    if matched_ids:
+        async for payment in db.payments.find(
+            {"id": {"$in": matched_ids}, "rolled_up": False},
+            {"_id": 0, "id": 1, "amount": 1, "status": 1, "previous_status": 1, "paid_at": 1}
+        ):
+            await record_payment_transition(db, payment)
+
+    unmatched_ids = {event["id"] for event in unmatched}
+    await db.stripe_events.update_many(
+        {"id": {"$in": [event["id"] for event in events if event["id"] not in unmatched_ids]}},
+        {"$set": {"processed_at": now}, "$inc": {"attempts": 1}}
+    )
+    if unmatched:
+        await db.stripe_events.update_many(
+            {"id": {"$in": list(unmatched_ids)}}, {"$inc": {"attempts": 1}}
+        )
+        for event in unmatched:
+            event["attempts"] = event.get("attempts", 0) + 1
+    return unmatched
+
+class StripeEventWorker:
+    """Background task applying stored events in batches"""
+
+    def __init__(self, batch_size: int = STRIPE_EVENT_BATCH_SIZE,
+                 batch_wait: float = STRIPE_EVENT_BATCH_WAIT,
+                 queue_size: int = STRIPE_EVENT_QUEUE_SIZE,
+                 retry_delay: float = STRIPE_EVENT_RETRY_DELAY,
+                 max_attempts: int = STRIPE_EVENT_MAX_ATTEMPTS):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.queue_size = queue_size
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._retries: Set[asyncio.TimerHandle] = set()
+        self._db = None
+
+    async def start(self, db) -> None:
+        """Start the worker and queue events left unprocessed by a previous run"""
+        self._db = db
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+        async for event in db.stripe_events.find(
+            {"processed_at": None}, {"_id": 0}
+        ).sort("received_at", 1).limit(self.queue_size):
+            self.enqueue(event)
+
+    def enqueue(self, event: Dict[str, Any]) -> None:
+        if self._queue is None:
+            logger.warning("Stripe event worker not running; %s left for replay", event["id"])
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Stored anyway; the next startup or a replay applies it
+            logger.warning("Stripe event queue full; %s left for replay", event["id"])
+
+    def _retry_later(self, event: Dict[str, Any]) -> None:
+        if event.get("attempts", 0) >= self.max_attempts:
+            logger.warning("Stripe event %s not applied after %d attempts; left for replay",
+                           event["id"], event["attempts"])
+            return
+
+        def retry():
+            self._retries.discard(handle)
+            self.enqueue(event)
+
+        handle = asyncio.get_running_loop().call_later(self.retry_delay, retry)
+        self._retries.add(handle)
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - asyncio.get_running_loop().time()
+            try:
+                batch.append(self._queue.get_nowait() if remaining <= 0 else
+                             await asyncio.wait_for(self._queue.get(), remaining))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                for event in await process_events(self._db, batch):
+                    self._retry_later(event)
+            except Exception:
+                # Events stay unprocessed; processing is idempotent, so the
+                # whole batch is retried
+                logger.exception("Failed to process %d Stripe events", len(batch))
+                for event in batch:
+                    event["attempts"] = event.get("attempts", 0) + 1
+                    self._retry_later(event)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Drain queued events (up to `timeout` seconds) and stop"""
+        if self._task is None:
+            return
+        # Pending retries are still unprocessed and queued again on startup
+        for handle in self._retries:
+            handle.cancel()
+        self._retries.clear()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Stopping with %d Stripe events queued", self._queue.qsize())
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = self._queue = None
+
+stripe_event_worker = StripeEventWorker()
+
+async def replay_events(db, include_processed: bool = False, since: Optional[str] = None) -> int:
+    """Reprocess stored events in the order they were received"""
+    query: Dict[str, Any] = {} if include_processed else {"processed_at": None}
+    if since:
+        query["received_at"] = {"$gte": datetime.fromisoformat(since)}
+
+    replayed = 0
+    batch: List[Dict[str, Any]] = []
+    async for event in db.stripe_events.find(query, {"_id": 0}).sort("received_at", 1):
+        batch.append(event)
+        if len(batch) == STRIPE_EVENT_BATCH_SIZE:
+            await process_events(db, batch)
+            replayed += len(batch)
+            batch = []
+    if batch:
+        await process_events(db, batch)
+        replayed += len(batch)
+    return replayed
+
+async def main(include_processed: bool, since: Optional[str]):
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from database import connect_to_mongo, get_database, close_mongo_connection
+
+    load_dotenv(Path(__file__).parent / '.env')
+    await connect_to_mongo()
+    replayed = await replay_events(await get_database(), include_processed, since)
+    print(f"✓ Replayed {replayed} Stripe events")
+    await close_mongo_connection()
+
+if __name__ == "__main__":
+    if "--replay" not in sys.argv:
+        print(__doc__)
+        sys.exit(1)
+    since = sys.argv[sys.argv.index("--since") + 1] if "--since" in sys.argv else None
+    asyncio.run(main("--all" in sys.argv, since))
@@ -0,0 +1,453 @@
+"""
+Synthetic season data for load and index testing
+
+Builds on seed_data: the school's courses from `seed_data.default_courses()`
+(or the courses already in the database) plus generated customers,
+instructors, an admin, per-day instructor schedules, bookings, payments and the slot
+reservations of active bookings, in the shapes the application writes them:
+
+    schedules     each instructor works one spot on five or six days a week,
+                  on a full-day, morning or afternoon shift
+    bookings      spread over the season with a summer and weekend peak, each
+                  in a free scheduled slot (no instructor is double-booked);
+                  past bookings are completed, cancelled or no-shows, future
+                  ones pending, confirmed or cancelled
+    payments      deposit and balance payments consistent with each booking's
+                  status, `amount_paid` and `paid_payment_ids` (see
+                  booking_payments.py), plus some pending and failed ones
+
+The same --seed and arguments always produce the same documents, ids
+included; pass --start and --today to reproduce a data set on a later day.
+The season is extended if the instructors' slots cannot hold --bookings at a
+realistic fill rate.
+
+Documents are generated lazily and written with unordered `insert_many` in
+--batch-size chunks; bookings, payments and reservations of a chunk are
+written in parallel, with up to --workers chunks in flight per collection.
+Documents that already exist (same id or email) are skipped. Afterwards the
+daily rollups and the slot inventory are rebuilt. Shared password hashing is
+done once, so every generated user can log in with --password when given.
+
+    python synthetic_data.py --customers 50000 --instructors 200 --bookings 1000000
+        [--seed 42] [--start YYYY-MM-DD] [--days 180] [--today YYYY-MM-DD]
+        [--batch-size 10000] [--workers 4] [--password PASSWORD] [--db NAME] [--drop]
+"""
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from models import TimeSlot
+
+BATCH_SIZE = 10_000
+WORKERS = 4
+SEASON_DAYS = 180
+# Highest average share of scheduled slots that bookings fill
+MAX_FILL = 0.6
+
+FIRST_NAMES = ["Anna", "Lars", "Mette", "Jonas", "Sofie", "Lukas", "Emma", "Finn", "Ida", "Noah",
+               "Clara", "Mads", "Lena", "Oskar", "Freja", "Paul", "Maja", "Emil", "Greta", "Ben"]
+LAST_NAMES = ["Jensen", "Mueller", "Nielsen", "Schmidt", "Hansen", "Schneider", "Pedersen", "Fischer",
+              "Andersen", "Weber", "Christensen", "Meyer", "Larsen", "Wagner", "Sorensen", "Becker"]
+LANGUAGES = (["en"] * 3) + (["de"] * 5) + (["dk"] * 2)
+SPOTS = ["sylt", "romo"]
+SHIFTS = [
+    [TimeSlot(start_time="09:00", end_time="11:00"), TimeSlot(start_time="11:30", end_time="13:30"),
+     TimeSlot(start_time="14:00", end_time="16:00"), TimeSlot(start_time="16:30", end_time="18:30")],
+    [TimeSlot(start_time="09:00", end_time="11:00"), TimeSlot(start_time="11:30", end_time="13:30")],
+    [TimeSlot(start_time="14:00", end_time="16:00"), TimeSlot(start_time="16:30", end_time="18:30")],
+]
+SHIFT_WEIGHTS = [0.6, 0.2, 0.2]
+PAST_STATUSES = {"completed": 0.8, "cancelled": 0.13, "no_show": 0.07}
+FUTURE_STATUSES = {"confirmed": 0.55, "pending": 0.3, "cancelled": 0.15}
+
+class Generator:
+    """Deterministic documents for one data set
+
+    Every collection draws from its own random stream, so changing the
+    number of one kind of document does not change the others.
+    """
+
+    def __init__(self, seed: int, customers: int, instructors: int, bookings: int,
+                 start: date, days: int, today: date, hashed_password: Optional[str] = None):
+        self.seed = seed
+        self.customers = customers
+        self.instructors = instructors
+        self.bookings = bookings
+        self.start = start
+        self.today = today
+        self.hashed_password = hashed_password
+        self._instructors = [self._instructor_plan(n) for n in range(instructors)]
+        slots_per_day = sum(len(plan['slots']) * len(plan['weekdays']) for plan in self._instructors) / 7
+        # Enough days for the bookings at no more than MAX_FILL of the slots
+        self.days = max(days, math.ceil(bookings / max(slots_per_day * MAX_FILL, 1)))
+
+    def _rng(self, stream: str) -> random.Random:
+        return random.Random(f"{self.seed}:{stream}")
+
+    @staticmethod
+    def _uuid(rng: random.Random) -> str:
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    def _instructor_plan(self, n: int) -> Dict[str, Any]:
+        rng = self._rng(f"instructor:{n}")
+        off = rng.sample(range(7), rng.choice((1, 2)))
+        return {
+            "id": self._uuid(rng),
+            "spot": SPOTS[n % len(SPOTS)],
+            "weekdays": [weekday for weekday in range(7) if weekday not in off],
+            "slots": rng.choices(SHIFTS, SHIFT_WEIGHTS)[0]
+        }
+
+    def _user(self, rng: random.Random, role: str, email: str, user_id: str) -> Dict[str, Any]:
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        user = {
+            "id": user_id,
+            "email": email,
+            "first_name": first_name,
+            "last_name": last_name,
+            "phone": f"+49{rng.randrange(10**9, 10**10)}",
+            "role": role,
+            "language_preference": rng.choice(LANGUAGES),
+            "created_at": datetime.combine(self.start, datetime.min.time()) - timedelta(minutes=rng.randrange(525600)),
+            "is_active": True
+        }
+        if self.hashed_password:
+            user['hashed_password'] = self.hashed_password
+        return user
+
+    def courses(self, templates) -> List[Dict[str, Any]]:
+        rng = self._rng("courses")
+        return [{**course.model_dump(), "id": self._uuid(rng), "created_at": datetime.combine(self.start, datetime.min.time())}
+                for course in templates]
+
+    def instructor_users(self) -> Iterator[Dict[str, Any]]:
+        for n, plan in enumerate(self._instructors):
+            yield self._user(self._rng(f"instructor-profile:{n}"), "instructor", f"instructor{n}@synthetic.kiteschoolpro.com", plan['id'])
+
+    def instructor_spots(self) -> Dict[str, str]:
+        """Home spot per instructor id"""
+        return {plan['id']: plan['spot'] for plan in self._instructors}
+
+    def admin_user(self) -> Dict[str, Any]:
+        rng = self._rng("admin")
+        return self._user(rng, "admin", "admin@synthetic.kiteschoolpro.com", self._uuid(rng))
+
+    def customer_ids(self) -> List[str]:
+        rng = self._rng("customers")
+        return [self._uuid(rng) for _ in range(self.customers)]
+
+    def customer_users(self, ids: List[str]) -> Iterator[Dict[str, Any]]:
+        rng = self._rng("customer-profiles")
+        for n, customer_id in enumerate(ids):
+            yield self._user(rng, "customer", f"customer{n}@synthetic.kiteschoolpro.com", customer_id)
+
+    def season(self) -> Iterator[date]:
+        for n in range(self.days):
+            yield self.start + timedelta(days=n)
+
+    def schedules(self) -> Iterator[Dict[str, Any]]:
+        rng = self._rng("schedules")
+        for day in self.season():
+            created = datetime.combine(day, datetime.min.time()) - timedelta(days=30)
+            for plan in self._instructors:
+                if day.weekday() in plan['weekdays']:
+                    yield {
+                        "id": self._uuid(rng),
+                        "instructor_id": plan['id'],
+                        "date": day.isoformat(),
+                        "available_slots": [slot.model_dump() for slot in plan['slots']],
+                        "spot": plan['spot'],
+                        "is_available": True,
+                        "rule_id": None,
+                        "created_at": created
+                    }
+
+    @staticmethod
+    def _demand(day: date) -> float:
+        """Relative bookings per day: peaks mid-July and at weekends"""
+        season = 1 + 0.8 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 196) / 365)
+        return season * (1.3 if day.weekday() >= 5 else 1.0)
+
+    def _daily_targets(self) -> List[int]:
+        """Bookings per season day, summing to self.bookings"""
+        weights = [self._demand(day) for day in self.season()]
+        total = sum(weights)
+        targets, assigned, cumulative = [], 0, 0.0
+        for weight in weights:
+            cumulative += weight
+            target = round(self.bookings * cumulative / total) - assigned
+            targets.append(target)
+            assigned += target
+        return targets
+
+    def booking_chunks(self, courses: List[Dict[str, Any]], customer_ids: List[str], size: int
+                       ) -> Iterator[Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """(bookings, payments, reservations) in chunks of about `size` bookings"""
+        rng = self._rng("bookings")
+        bookings, payments, reservations = [], [], []
+        carry = 0
+        for day, target in zip(self.season(), self._daily_targets()):
+            free = [
+                (plan, slot) for plan in self._instructors if day.weekday() in plan['weekdays']
+                for slot in plan['slots']
+            ]
+            wanted = target + carry
+            taken = rng.sample(free, min(wanted, len(free)))
+            carry = wanted - len(taken)
+            past = day < self.today
+            statuses = PAST_STATUSES if past else FUTURE_STATUSES
+            for plan, slot in taken:
+                booking, booking_payments = self._booking(
+                    rng, day, plan, slot, rng.choice(courses), rng.choice(customer_ids),
+                    rng.choices(list(statuses), list(statuses.values()))[0]
+                )
+                bookings.append(booking)
+                payments += booking_payments
+                if booking['status'] in ("pending", "confirmed"):
+                    reservations.append({
+                        "instructor_id": plan['id'], "date": booking['booking_date'],
+                        "start_time": slot.start_time, "spot": plan['spot'],
+                        "booking_id": booking['id'], "created_at": booking['created_at']
+                    })
+            if len(bookings) >= size:
+                yield bookings, payments, reservations
+                bookings, payments, reservations = [], [], []
+        if bookings:
+            yield bookings, payments, reservations
+        if carry:
+            print(f"! {carry} bookings did not fit into the season's free slots")
+
+    def _booking(self, rng: random.Random, day: date, plan: Dict[str, Any], slot: TimeSlot,
+                 course: Dict[str, Any], customer_id: str, status: str
+                 ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        students = rng.randint(1, course['max_students'])
+        total = round(course['base_price'] * students, 2)
+        deposit = round(total * 0.3, 2)
+        created = datetime.combine(day, datetime.min.time()) - timedelta(
+            days=rng.randrange(1, 60), minutes=rng.randrange(1440)
+        )
+        booking = {
+            "id": self._uuid(rng),
+            "customer_id": customer_id,
+            "course_id": course['id'],
+            "instructor_id": plan['id'],
+            "booking_date": day.isoformat(),
+            "time_slot": slot.model_dump(),
+            "spot": plan['spot'],
+            "number_of_students": students,
+            "student_names": [f"Student {n + 1}" for n in range(students)],
+            "student_details": {},
+            "total_price": total,
+            "deposit_amount": deposit,
+            "status": status,
+            "payment_status": "pending",
+            "amount_paid": 0.0,
+            "paid_payment_ids": [],
+            "notes": None,
+            "created_at": created,
+            "updated_at": created
+        }
+
+        # What has been paid so far follows from the status (booking_payments.py)
+        if status in ("completed",) or (status in ("confirmed", "no_show") and rng.random() < 0.4):
+            paid = [("deposit", deposit), ("balance", round(total - deposit, 2))]
+        elif status in ("confirmed", "no_show") or (status == "cancelled" and rng.random() < 0.4):
+            paid = [("deposit", deposit)]
+        else:
+            paid = []
+
+        payments = []
+        paid_at = created
+        for payment_type, amount in paid:
+            paid_at += timedelta(minutes=rng.randrange(5, 7 * 1440))
+            payments.append(self._payment(rng, booking['id'], payment_type, amount, "paid", created, paid_at))
+            booking['amount_paid'] = round(booking['amount_paid'] + amount, 2)
+            booking['paid_payment_ids'].append(payments[-1]['id'])
+            booking['updated_at'] = paid_at
+        if booking['amount_paid'] >= total:
+            booking['payment_status'] = "paid"
+        elif booking['amount_paid'] >= deposit:
+            booking['payment_status'] = "partial"
+        elif status == "pending" and rng.random() < 0.6:
+            # Checkout started but not (yet) paid
+            payment_status = "failed" if rng.random() < 0.1 else "pending"
+            payments.append(self._payment(rng, booking['id'], "deposit", deposit, payment_status, created, None))
+        return booking, payments
+
+    def _payment(self, rng: random.Random, booking_id: str, payment_type: str, amount: float,
+                 status: str, created: datetime, paid_at: Optional[datetime]) -> Dict[str, Any]:
+        return {
+            "id": self._uuid(rng),
+            "booking_id": booking_id,
+            "stripe_payment_intent_id": f"pi_synthetic_{rng.getrandbits(64):016x}",
+            "amount": amount,
+            "currency": "EUR",
+            "payment_type": payment_type,
+            "status": status,
+            "created_at": created,
+            "paid_at": paid_at.isoformat() if paid_at else None
+        }
+
+def _chunks(documents: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk = []
+    for document in documents:
+        chunk.append(document)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class Writer:
+    """Unordered insert_many with a bounded number of batches in flight"""
+
+    def __init__(self, db, workers: int = WORKERS):
+        self.db = db
+        self.workers = workers
+        self.inserted: Dict[str, int] = {}
+        self.skipped: Dict[str, int] = {}
+        self._pending: Dict[str, set] = {}
+
+    async def _insert(self, name: str, documents: List[Dict[str, Any]]) -> None:
+        try:
+            result = await self.db[name].insert_many(documents, ordered=False)
+            inserted = len(result.inserted_ids)
+        except BulkWriteError as exc:
+            inserted = exc.details['nInserted']
+        self.inserted[name] = self.inserted.get(name, 0) + inserted
+        self.skipped[name] = self.skipped.get(name, 0) + len(documents) - inserted
+
+    async def write(self, name: str, documents: List[Dict[str, Any]]) -> None:
+        """Queue a batch, waiting while `workers` batches of the collection are in flight"""
+        if not documents:
+            return
+        pending = self._pending.setdefault(name, set())
+        while len(pending) >= self.workers:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pending -= done
+            for task in done:
+                task.result()
+        pending.add(asyncio.ensure_future(self._insert(name, documents)))
+
+    async def write_all(self, name: str, documents: Iterable[Dict[str, Any]], size: int) -> None:
+        for chunk in _chunks(documents, size):
+            await self.write(name, chunk)
+
+    async def flush(self) -> None:
+        tasks = [task for pending in self._pending.values() for task in pending]
+        self._pending = {}
+        await asyncio.gather(*tasks)
+
+async def generate(
+    db, generator: Generator, batch_size: int = BATCH_SIZE, workers: int = WORKERS
+) -> Dict[str, Dict[str, int]]:
+    """Write the generator's documents
+
+    Returns the documents inserted and skipped (already present) per
+    collection.
+    """
+    from seed_data import default_courses
+
+    writer = Writer(db, workers)
+    courses = await db.courses.find({"is_active": True}, {"_id": 0}).to_list(None)
+    if not courses:
+        courses = generator.courses(default_courses())
+        await writer.write("courses", courses)
+
+    customer_ids = generator.customer_ids()
+    # Collections are independent, so their writes overlap
+    await asyncio.gather(
+        writer.write("users", [generator.admin_user()]),
+        writer.write_all("users", generator.instructor_users(), batch_size),
+        writer.write_all("users", generator.customer_users(customer_ids), batch_size),
+        writer.write_all("instructor_schedules", generator.schedules(), batch_size),
+    )
+    for bookings, payments, reservations in generator.booking_chunks(courses, customer_ids, batch_size):
+        await asyncio.gather(
+            writer.write("bookings", bookings),
+            writer.write("payments", payments),
+            writer.write("slot_reservations", reservations),
+        )
+    await writer.flush()
+    return {"inserted": writer.inserted, "skipped": writer.skipped}
+
+async def refresh_derived(db, generator: Generator) -> None:
+    """Rollups over everything, slot inventory from today to the season's end"""
+    from rollups import rebuild_daily_stats
+    from slot_inventory import rebuild
+
+    await rebuild_daily_stats(db)
+    last = (generator.start + timedelta(days=generator.days - 1)).isoformat()
+    first = max(generator.today.isoformat(), generator.start.isoformat())
+    if first <= last:
+        await rebuild(db, first, to_date=last)
+
+def _option(args: List[str], name: str, default: Any, parse=str) -> Any:
+    return parse(args[args.index(name) + 1]) if name in args else default
+
+async def main(args: List[str]) -> int:
+    from pathlib import Path
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    if "--db" in args:
+        os.environ['DB_NAME'] = _option(args, "--db", None)
+    from auth import get_password_hash
+    from database import connect_to_mongo, get_database, close_mongo_connection
+    from indexes import ensure_indexes
+
+    today = _option(args, "--today", date.today(), date.fromisoformat)
+    days = _option(args, "--days", SEASON_DAYS, int)
+    password = _option(args, "--password", None)
+    generator = Generator(
+        seed=_option(args, "--seed", 42, int),
+        customers=_option(args, "--customers", 1000, int),
+        instructors=_option(args, "--instructors", 10, int),
+        bookings=_option(args, "--bookings", 10_000, int),
+        start=_option(args, "--start", today - timedelta(days=days * 2 // 3), date.fromisoformat),
+        days=days,
+        today=today,
+        hashed_password=get_password_hash(password) if password else None
+    )
+    if generator.days > days:
+        print(f"Season extended to {generator.days} days to fit {generator.bookings} bookings")
+
+    await connect_to_mongo()
+    db = await get_database()
+    if "--drop" in args:
+        for name in ("users", "instructor_schedules", "bookings", "payments", "slot_reservations",
+                     "slot_inventory", "daily_stats"):
+            await db.drop_collection(name)
+    await ensure_indexes(db)
+
+    started = time.perf_counter()
+    counts = await generate(
+        db, generator,
+        batch_size=_option(args, "--batch-size", BATCH_SIZE, int),
+        workers=_option(args, "--workers", WORKERS, int)
+    )
+    written = time.perf_counter() - started
+    await refresh_derived(db, generator)
+    await close_mongo_connection()
+
+    for name, inserted in counts['inserted'].items():
+        skipped = counts['skipped'].get(name, 0)
+        print(f"✓ {name}: {inserted} inserted" + (f", {skipped} already present" if skipped else ""))
+    total = sum(counts['inserted'].values())
+    print(f"✓ {total} documents in {written:.1f} s ({total / max(written, 1e-9):.0f}/s), "
+          f"derived data rebuilt in {time.perf_counter() - started - written:.1f} s")
+    return 0
+
+if __name__ == "__main__":
+    if not any(arg in sys.argv for arg in ("--customers", "--instructors", "--bookings")):
+        print(__doc__)
+        sys.exit(1)
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -33,6 +33,13 @@ export const bookingApi = {
     return response.data;
   },
   
+  getAvailabilityCalendar: async ({ courseId, spot, from, to }) => {
+    const response = await axios.get(`${API}/bookings/availability-calendar`, {
+      params: { course_id: courseId, spot, from, to }
+    });
+    return response.data;
+  },
+  
   create: async (bookingData) => {
     const response = await axios.post(`${API}/bookings/`, bookingData);
     return response.data;
@@ -94,11 +101,30 @@ export const adminApi = {
     return response.data;
   },
   
+  createInstructorSchedulesBulk: async ({ entries = [], templates = [] }) => {
+    const response = await axios.post(`${API}/admin/instructor-schedules/bulk`, { entries, templates });
+    return response.data;
+  },
+  
   getInstructorSchedules: async (instructorId, startDate, endDate) => {
     const response = await axios.get(`${API}/admin/instructor-schedules/${instructorId}?start_date=${startDate}&end_date=${endDate}`);
     return response.data;
   },
   
+  getRevenueAnalytics: async ({ dateFrom, dateTo, by = 'spot' } = {}) => {
+    const response = await axios.get(`${API}/admin/analytics/revenue`, {
+      params: { date_from: dateFrom, date_to: dateTo, by }
+    });
+    return response.data;
+  },
+  
+  getInstructorAnalytics: async ({ dateFrom, dateTo, by = '' } = {}) => {
+    const response = await axios.get(`${API}/admin/analytics/instructors`, {
+      params: { date_from: dateFrom, date_to: dateTo, by }
+    });
+    return response.data;
+  },
+  
   getTodayBookings: async () => {
     const response = await axios.get(`${API}/admin/bookings/today`);
     return response.data;
@@ -107,5 +133,17 @@ export const adminApi = {
   updateUserRole: async (userId, role) => {
     const response = await axios.patch(`${API}/admin/users/${userId}/role?new_role=${role}`);
     return response.data;
+  },
+
+  exportDataset: async (dataset, format = 'csv') => {
+    const response = await axios.get(`${API}/admin/export/${dataset}?format=${format}`, { responseType: 'blob' });
+    return response.data;
+  },
+
+  importDataset: async (dataset, file, mode = 'insert') => {
+    const formData = new FormData();
+    formData.append('file', file);
+    const response = await axios.post(`${API}/admin/import/${dataset}?mode=${mode}`, formData);
+    return response.data;
   }
 };
\ No newline at end of file
@@ -0,0 +1,28 @@
+import sys
+from pathlib import Path
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from availability_rules import availability_rules  # noqa: E402
+from catalog import course_catalog  # noqa: E402
+from database import database  # noqa: E402
+from indexes import ensure_indexes  # noqa: E402
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def db():
+    """A fresh in-memory database with the declared indexes, used by the app"""
+    test_db = AsyncMongoMockClient()["kiteschool_test"]
+    await ensure_indexes(test_db)
+    database.db = test_db
+    course_catalog.invalidate()
+    availability_rules.invalidate()
+    yield test_db
+    database.db = None
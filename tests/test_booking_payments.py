@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from booking_payments import apply_payment, status_after_payment
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+async def booking(db):
+    doc = {
+        "id": "b1", "booking_date": "2030-07-01", "status": "pending", "payment_status": "pending",
+        "total_price": 100.0, "deposit_amount": 30.0
+    }
+    await db.bookings.insert_one(dict(doc))
+    return doc
+
+async def test_deposit_confirms_the_booking(db, booking):
+    before = await apply_payment(db, "b1", "deposit", 30.0)
+
+    assert before["status"] == "pending"
+    assert status_after_payment(before, 30.0) == "confirmed"
+    stored = await db.bookings.find_one({"id": "b1"})
+    assert stored["amount_paid"] == 30.0
+    assert stored["paid_payment_ids"] == ["deposit"]
+    assert (stored["status"], stored["payment_status"]) == ("confirmed", "partial")
+
+async def test_replayed_payment_is_counted_once(db, booking):
+    assert await apply_payment(db, "b1", "deposit", 30.0) is not None
+
+    assert await apply_payment(db, "b1", "deposit", 30.0) is None
+
+    stored = await db.bookings.find_one({"id": "b1"})
+    assert stored["amount_paid"] == 30.0
+    assert stored["paid_payment_ids"] == ["deposit"]
+
+async def test_concurrent_payments_each_count_once(db, booking):
+    results = await asyncio.gather(
+        apply_payment(db, "b1", "deposit", 30.0),
+        apply_payment(db, "b1", "balance", 70.0),
+        apply_payment(db, "b1", "deposit", 30.0),
+        apply_payment(db, "b1", "balance", 70.0),
+    )
+
+    assert sum(result is not None for result in results) == 2
+    stored = await db.bookings.find_one({"id": "b1"})
+    assert stored["amount_paid"] == 100.0
+    assert sorted(stored["paid_payment_ids"]) == ["balance", "deposit"]
+    assert (stored["status"], stored["payment_status"]) == ("confirmed", "paid")
+
+async def test_late_payment_keeps_a_cancelled_booking_cancelled(db, booking):
+    await db.bookings.update_one({"id": "b1"}, {"$set": {"status": "cancelled"}})
+
+    before = await apply_payment(db, "b1", "deposit", 30.0)
+
+    assert status_after_payment(before, 30.0) == "cancelled"
+    stored = await db.bookings.find_one({"id": "b1"})
+    assert stored["status"] == "cancelled"
+    assert stored["amount_paid"] == 30.0
+
+async def test_unknown_booking_returns_none(db):
+    assert await apply_payment(db, "missing", "deposit", 30.0) is None
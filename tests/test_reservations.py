@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from models import BookingCreate, BookingStatus, Course, InstructorSchedule, TimeSlot, User
+from principal import Principal
+from routes.booking_routes import create_booking, update_booking_status
+from slot_inventory import rebuild
+
+pytestmark = pytest.mark.anyio
+
+DAY = "2030-07-01"
+SLOTS = [{"start_time": "09:00", "end_time": "11:00"}, {"start_time": "11:00", "end_time": "13:00"}]
+ADMIN = Principal(id="admin", role="admin")
+
+@pytest.fixture
+async def school(db):
+    """Two instructors free on DAY at sylt, one course and a customer"""
+    course = Course(
+        name="Private lesson", course_type="private_kitesurf", description="",
+        duration_hours=2, max_students=1, base_price=100, spots=["sylt"]
+    )
+    await db.courses.insert_one(course.dict())
+    for name in ("anna", "ben"):
+        await db.users.insert_one(User(
+            id=name, email=f"{name}@example.com", first_name=name, last_name="Test", role="instructor"
+        ).dict())
+        await db.instructor_schedules.insert_one(InstructorSchedule(
+            instructor_id=name, date=DAY, spot="sylt", available_slots=SLOTS
+        ).dict())
+    await rebuild(db, DAY)
+    return {"course_id": course.id, "customer": Principal(id="carla", role="customer")}
+
+def booking_request(school, start_time="09:00"):
+    return BookingCreate(
+        course_id=school["course_id"], booking_date=DAY, spot="sylt", number_of_students=1,
+        time_slot=TimeSlot(start_time=start_time, end_time="11:00")
+    )
+
+async def test_concurrent_bookings_never_share_an_instructor(db, school):
+    results = await asyncio.gather(
+        *(create_booking(booking_request(school), school["customer"]) for _ in range(6)),
+        return_exceptions=True
+    )
+
+    booked = [result for result in results if not isinstance(result, Exception)]
+    rejected = [result for result in results if isinstance(result, HTTPException)]
+    assert len(booked) == 2
+    assert len(rejected) == 4
+    assert {booking.instructor_id for booking in booked} == {"anna", "ben"}
+    assert await db.bookings.count_documents({}) == 2
+    assert await db.slot_reservations.count_documents({"date": DAY, "start_time": "09:00"}) == 2
+
+async def test_cancelling_releases_the_slot(db, school):
+    first = await create_booking(booking_request(school), school["customer"])
+    await create_booking(booking_request(school), school["customer"])
+
+    await update_booking_status(first.id, BookingStatus.CANCELLED, ADMIN)
+
+    assert await db.slot_reservations.find_one({"booking_id": first.id}) is None
+    rebooked = await create_booking(booking_request(school), school["customer"])
+    assert rebooked.instructor_id == first.instructor_id
+
+async def test_reactivating_reserves_the_slot_again(db, school):
+    booking = await create_booking(booking_request(school), school["customer"])
+    await update_booking_status(booking.id, BookingStatus.CANCELLED, ADMIN)
+
+    await update_booking_status(booking.id, BookingStatus.CONFIRMED, ADMIN)
+
+    reservation = await db.slot_reservations.find_one({"booking_id": booking.id})
+    assert reservation["instructor_id"] == booking.instructor_id
+    assert (await db.bookings.find_one({"id": booking.id}))["status"] == "confirmed"
+
+async def test_reactivating_a_taken_slot_conflicts(db, school):
+    first = await create_booking(booking_request(school), school["customer"])
+    await create_booking(booking_request(school), school["customer"])
+    await update_booking_status(first.id, BookingStatus.CANCELLED, ADMIN)
+    taken = await create_booking(booking_request(school), school["customer"])
+    assert taken.instructor_id == first.instructor_id
+
+    with pytest.raises(HTTPException) as exc_info:
+        await update_booking_status(first.id, BookingStatus.PENDING, ADMIN)
+
+    assert exc_info.value.status_code == 409
+    assert (await db.bookings.find_one({"id": first.id}))["status"] == "cancelled"
+    assert await db.slot_reservations.count_documents({"start_time": "09:00"}) == 2
+
+async def test_status_changes_between_active_states_keep_the_reservation(db, school):
+    booking = await create_booking(booking_request(school), school["customer"])
+
+    await update_booking_status(booking.id, BookingStatus.CONFIRMED, ADMIN)
+
+    reservation = await db.slot_reservations.find_one({"booking_id": booking.id})
+    assert reservation["instructor_id"] == booking.instructor_id